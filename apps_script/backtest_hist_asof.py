@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
-import os, math, itertools, json
+import os, sys, json, pathlib, time, datetime, collections, itertools
 import psycopg2
 import pandas as pd
-from sklearn.metrics import log_loss, roc_auc_score, accuracy_score
+
+try:
+    from utils import backtest_core as BC
+except ImportError:
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from utils import backtest_core as BC
+from utils import asof_builder as AB
+from utils import grid_search as GS
 
 def env_int(name: str, default: int) -> int:
     v = os.getenv(name, "")
@@ -20,7 +27,21 @@ def env_float(name: str, default: float) -> float:
 
 DATABASE_URL = os.environ["DATABASE_URL"]
 YEARS_BACK   = env_int("BT_YEARS", 3)         # ventana histórica
-MAX_ROWS     = env_int("BT_MAX", 1500)        # límite CI
+
+# Constructor de features: "stream" (una pasada en Python sobre todo
+# fs_matches_long, utils/asof_builder.py) o "sql" (self-join as-of de abajo)
+BUILDER      = os.getenv("BT_BUILDER", "stream").strip().lower() or "stream"
+# Límite de partidos (los más recientes). En "stream" 0 = todos; el SQL
+# necesita un LIMIT y sigue usando 1500 por defecto.
+MAX_ROWS     = env_int("BT_MAX", 0 if BUILDER == "stream" else 1500)
+BT_FROM      = os.getenv("BT_FROM", "").strip()   # "stream": solo partidos desde esta fecha
+FETCH_ROWS   = env_int("BT_FETCH", 20000)         # filas por viaje del cursor de servidor
+
+# Modo streaming (BT_STREAM=1): bloques de BT_CHUNK partidos, métricas
+# incrementales y CSV escrito por bloques; sin límite de filas en memoria
+STREAM       = os.getenv("BT_STREAM", "0") == "1"
+CHUNK_ROWS   = env_int("BT_CHUNK", 5000)
+AUC_BINS     = env_int("BT_AUC_BINS", BC.AUC_BINS)
 
 # Pesos (si GRID=0, se usan estos)
 W_MONTH      = env_float("W_MONTH", 1.0)
@@ -32,8 +53,23 @@ K_MONTH      = env_int("K_MONTH", 8)          # pseudo-partidos para mes
 K_SURF       = env_int("K_SURF",  8)          # pseudo-partidos para superficie
 K_SPEED      = env_int("K_SPEED", 8)          # pseudo-partidos para velocidad
 
-# Grid search (si GRID=1 se exploran combinaciones de pesos)
+# Grid search (si GRID=1 se exploran combinaciones de pesos y, opcionalmente, de K).
+# GRID_WEIGHTS / GRID_K: "0.5,1,1.5" o "inicio:fin:paso" (p. ej. "0:3:0.1");
+# cada lista se combina consigo misma en las 3 dimensiones.
 GRID         = os.getenv("GRID", "0") == "1"
+GRID_WEIGHTS = os.getenv("GRID_WEIGHTS", "")
+GRID_K       = os.getenv("GRID_K", "")
+
+# Búsqueda en paralelo (utils/grid_search.py): los conteos van a memoria
+# compartida y las combinaciones W×K se reparten entre GRID_WORKERS procesos.
+# GRID_SEARCH: grid (W×K completo), random (GRID_SAMPLES pesos al azar × K) o
+# refine (rejilla gruesa + GRID_ROUNDS rondas alrededor de los GRID_TOP mejores)
+GRID_SEARCH  = os.getenv("GRID_SEARCH", "grid").strip().lower() or "grid"
+GRID_WORKERS = env_int("GRID_WORKERS", os.cpu_count() or 1)
+GRID_SAMPLES = env_int("GRID_SAMPLES", 10000)
+GRID_ROUNDS  = env_int("GRID_ROUNDS", 3)
+GRID_TOP     = env_int("GRID_TOP", 10)
+GRID_SEED    = env_int("GRID_SEED", 0)
 
 SQL = f"""
 WITH uniq AS (
@@ -44,32 +80,22 @@ WITH uniq AS (
     f.surface,
     LEAST(f.player_id, f.opponent_id) AS p_low,
     GREATEST(f.player_id, f.opponent_id) AS p_high,
-    MAX(f.winner_id) AS winner_id
+    MAX(f.winner_id) AS winner_id,
+    MAX(f.speed_bucket) AS speed_bucket
   FROM public.fs_matches_long f
   WHERE f.match_date BETWEEN (current_date - interval '3 years') AND current_date
   GROUP BY 1,2,3,4,5
   ORDER BY match_date DESC
-  LIMIT {MAX_ROWS}
+  LIMIT {MAX_ROWS or 1500}
 ),
 meta AS (
   SELECT
     row_number() OVER () AS rid,
     u.*,
     EXTRACT(MONTH FROM u.match_date)::int AS mon,
-    -- Resolver de velocidad + fallback por superficie (sube cobertura)
-    COALESCE(
-      c.speed_bucket,
-      CASE
-        WHEN lower(u.surface) = 'grass' THEN 'Fast'
-        WHEN lower(u.surface) IN ('indoor hard','indoor') THEN 'Fast'
-        WHEN lower(u.surface) = 'clay' THEN 'Slow'
-        WHEN lower(u.surface) = 'hard' THEN 'Medium'
-        ELSE NULL
-      END
-    ) AS sb_meta
+    -- Velocidad resuelta al ingerir + fallback por superficie (sube cobertura)
+    COALESCE(u.speed_bucket, public.speed_bucket_from_surface(u.surface)) AS sb_meta
   FROM uniq u
-  LEFT JOIN public.tourney_speed_resolved c
-    ON public.norm_tourney(u.tournament_name) = c.tourney_key
 ),
 part AS (
   -- Explode each match into two participants (player/opponent)
@@ -87,44 +113,22 @@ hist AS (
     COUNT(*) FILTER (WHERE EXTRACT(MONTH FROM f2.match_date) = p.mon) AS played_m,
     COUNT(*) FILTER (WHERE EXTRACT(MONTH FROM f2.match_date) = p.mon AND f2.winner_id = p.pid) AS wins_m,
 
-    -- Surface counts (coalesce f2.surface con la del resolver)
+    -- Surface counts (coalesce f2.surface con la del resolver, guardada en la fila)
     COUNT(*) FILTER (
-      WHERE lower(COALESCE(f2.surface, c2.surface)) = lower(p.meta_surf)
+      WHERE lower(COALESCE(f2.surface, f2.tourney_surface)) = lower(p.meta_surf)
     ) AS played_surf,
     COUNT(*) FILTER (
-      WHERE lower(COALESCE(f2.surface, c2.surface)) = lower(p.meta_surf)
+      WHERE lower(COALESCE(f2.surface, f2.tourney_surface)) = lower(p.meta_surf)
         AND f2.winner_id = p.pid
     ) AS wins_surf,
 
-    -- Speed counts: compara bucket historial vs sb_meta (resolver/fallback)
+    -- Speed counts: bucket del historial (resuelto al ingerir o por superficie) vs sb_meta
     COUNT(*) FILTER (
-      WHERE lower(
-        COALESCE(
-          c2.speed_bucket,
-          CASE
-            WHEN lower(COALESCE(f2.surface,'')) = 'grass' THEN 'Fast'
-            WHEN lower(COALESCE(f2.surface,'')) IN ('indoor hard','indoor') THEN 'Fast'
-            WHEN lower(COALESCE(f2.surface,'')) = 'clay'  THEN 'Slow'
-            WHEN lower(COALESCE(f2.surface,'')) = 'hard'  THEN 'Medium'
-            ELSE NULL
-          END
-        )
-      ) = lower(p.sb_meta)
+      WHERE lower(COALESCE(f2.speed_bucket, public.speed_bucket_from_surface(f2.surface))) = lower(p.sb_meta)
     ) AS played_spd,
     COUNT(*) FILTER (
-      WHERE lower(
-        COALESCE(
-          c2.speed_bucket,
-          CASE
-            WHEN lower(COALESCE(f2.surface,'')) = 'grass' THEN 'Fast'
-            WHEN lower(COALESCE(f2.surface,'')) IN ('indoor hard','indoor') THEN 'Fast'
-            WHEN lower(COALESCE(f2.surface,'')) = 'clay'  THEN 'Slow'
-            WHEN lower(COALESCE(f2.surface,'')) = 'hard'  THEN 'Medium'
-            ELSE NULL
-          END
-        )
-      ) = lower(p.sb_meta)
-      AND f2.winner_id = p.pid
+      WHERE lower(COALESCE(f2.speed_bucket, public.speed_bucket_from_surface(f2.surface))) = lower(p.sb_meta)
+        AND f2.winner_id = p.pid
     ) AS wins_spd
 
   FROM part p
@@ -132,8 +136,6 @@ hist AS (
     ON f2.player_id = p.pid
    AND f2.match_date >= (p.match_date - make_interval(years => {YEARS_BACK}))
    AND f2.match_date <  p.match_date
-  LEFT JOIN public.tourney_speed_resolved c2
-    ON public.norm_tourney(f2.tournament_name) = c2.tourney_key
   GROUP BY p.rid, p.is_player
 ),
 pivot AS (
@@ -167,70 +169,133 @@ JOIN pivot p USING (rid)
 ORDER BY m.match_date DESC;
 """
 
-def sigmoid(x: float) -> float:
-    try:
-        return 1.0/(1.0+math.exp(-x))
-    except OverflowError:
-        return 0.0 if x < 0 else 1.0
+def evaluate(df, w_month, w_surf, w_speed, k_month, k_surf, k_speed):
+    data = df if isinstance(df, BC.BacktestData) else BC.BacktestData(df)
+    return BC.evaluate_grid(data, [(w_month, w_surf, w_speed)], [(k_month, k_surf, k_speed)])[0]
 
-def smooth(wins, played, k):
-    # (wins + k*0.5)/(played + k)
-    return (wins + 0.5*k) / (played + k) if (played is not None and played >= 0) else 0.5
+def _connect():
+    conn = psycopg2.connect(DATABASE_URL)
+    if BUILDER == "sql":
+        # Connect and relax statement_timeout a bit
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = '120s';")
+        conn.autocommit = False
+    return conn
 
-def evaluate(df, w_month, w_surf, w_speed, k_month, k_surf, k_speed):
-    # winrates suavizadas
-    wr_m_p = df.apply(lambda r: smooth(r["wins_m_p"] or 0, r["played_m_p"] or 0, k_month), axis=1)
-    wr_m_o = df.apply(lambda r: smooth(r["wins_m_o"] or 0, r["played_m_o"] or 0, k_month), axis=1)
-    wr_s_p = df.apply(lambda r: smooth(r["wins_surf_p"] or 0, r["played_surf_p"] or 0, k_surf), axis=1)
-    wr_s_o = df.apply(lambda r: smooth(r["wins_surf_o"] or 0, r["played_surf_o"] or 0, k_surf), axis=1)
-    wr_v_p = df.apply(lambda r: smooth(r["wins_spd_p"] or 0, r["played_spd_p"] or 0, k_speed), axis=1)
-    wr_v_o = df.apply(lambda r: smooth(r["wins_spd_o"] or 0, r["played_spd_o"] or 0, k_speed), axis=1)
+def _named_cursor(conn, name, query):
+    """Cursor de servidor: las filas llegan en bloques de FETCH_ROWS, no todas a la vez."""
+    cur = conn.cursor(name=name)
+    cur.itersize = FETCH_ROWS
+    cur.execute(query)
+    return cur
 
-    d_month   = wr_m_p - wr_m_o
-    d_surface = wr_s_p - wr_s_o
-    d_speed   = wr_v_p - wr_v_o
+def _asof_rows(conn):
+    since = datetime.date.fromisoformat(BT_FROM) if BT_FROM else None
+    return AB.build_asof(_named_cursor(conn, "bt_matches_long", AB.STREAM_SQL), YEARS_BACK, since=since)
 
-    denom = max(1.0, (abs(w_month)+abs(w_surf)+abs(w_speed)))
-    z = (w_month*d_month + w_surf*d_surface + w_speed*d_speed) / denom
-    p_hat = z.apply(sigmoid)
+def load_asof_stream(conn):
+    """Features as-of con una sola lectura ordenada de fs_matches_long."""
+    t0 = time.perf_counter()
+    rows = _asof_rows(conn)
+    if MAX_ROWS > 0:
+        rows = collections.deque(rows, maxlen=MAX_ROWS)
+    df = pd.DataFrame(list(rows))
+    print(f"As-of (stream): {len(df)} partidos en {time.perf_counter() - t0:.2f}s")
+    if df.empty:
+        return df
+    return df.iloc[::-1].reset_index(drop=True)   # como el SQL: más recientes primero
 
-    y = (df["winner_id"] == df["player_id"]).astype(int)
+def iter_feature_chunks(conn, size):
+    """Features as-of en DataFrames de `size` filas, sin cargar el resultado entero."""
+    if BUILDER == "sql":
+        cur = _named_cursor(conn, "bt_asof_sql", SQL)
+        while True:
+            rows = cur.fetchmany(size)
+            if not rows:
+                return
+            yield pd.DataFrame(rows, columns=[c[0] for c in cur.description])
+    else:
+        it = _asof_rows(conn)
+        while True:
+            batch = list(itertools.islice(it, size))
+            if not batch:
+                return
+            yield pd.DataFrame(batch)
 
-    # métricas
-    try:
-        ll = log_loss(y, p_hat, labels=[0,1])
-    except ValueError:
-        ll = float('nan')
-    try:
-        auc = roc_auc_score(y, p_hat)
-    except ValueError:
-        auc = float('nan')
-    acc = (p_hat>=0.5).astype(int).mean()
+def _grid_axes():
+    weight_grid = BC.parse_grid(GRID_WEIGHTS, [0.5, 1.0, 1.5, 2.0])
+    k_grid = (BC.product3(BC.parse_grid(GRID_K, []))
+              if GRID_K.strip() else [(K_MONTH, K_SURF, K_SPEED)])
+    return weight_grid, k_grid
 
-    return {
-        "W_MONTH": w_month, "W_SURF": w_surf, "W_SPEED": w_speed,
-        "K_MONTH": k_month, "K_SURF": k_surf, "K_SPEED": k_speed,
-        "rows": int(len(df)), "log_loss": float(ll),
-        "auc": float(auc), "accuracy@0.5": float(acc), "avg_p": float(p_hat.mean())
-    }
+def grid_configs():
+    if not GRID:
+        return [(W_MONTH, W_SURF, W_SPEED)], [(K_MONTH, K_SURF, K_SPEED)]
+    weight_grid, k_grid = _grid_axes()
+    if GRID_SEARCH == "random":
+        return GS.random_weights(weight_grid, GRID_SAMPLES, GRID_SEED), k_grid
+    return BC.product3(weight_grid), k_grid
 
-def main():
-    # Connect and relax statement_timeout a bit
-    conn = psycopg2.connect(DATABASE_URL)
-    conn.autocommit = True
-    with conn.cursor() as cur:
-        cur.execute("SET statement_timeout = '120s';")
-    conn.autocommit = False
+def run_grid_search(df, out_csv):
+    """
+    GRID en paralelo. Las filas se van añadiendo a out_csv según terminan
+    los bloques (un corte a medias deja resultados); al final se reescribe
+    ordenado.
+    """
+    weight_grid, k_grid = _grid_axes()
+    header = [True]
+
+    def on_rows(rows):
+        pd.DataFrame(rows).to_csv(out_csv, mode="w" if header[0] else "a",
+                                  header=header[0], index=False)
+        header[0] = False
 
-    df = pd.read_sql(SQL, conn)
-    conn.close()
+    print(f"Grid ({GRID_SEARCH}): {GRID_WORKERS} procesos")
+    return GS.search(BC.BacktestData(df), weight_grid, k_grid, strategy=GRID_SEARCH,
+                     workers=GRID_WORKERS, samples=GRID_SAMPLES, rounds=GRID_ROUNDS,
+                     top=GRID_TOP, seed=GRID_SEED, on_rows=on_rows)
+
+def run_streaming(conn, out_csv=None):
+    """
+    Backtest por bloques de CHUNK_ROWS: métricas acumuladas (AUC por
+    histograma) y CSV por fila escrito bloque a bloque. Memoria constante.
+    """
+    if MAX_ROWS > 0 and BUILDER != "sql":
+        print("[WARN] BT_MAX se ignora en BT_STREAM=1 (usa BT_FROM para acotar)")
+    if GRID and GRID_SEARCH == "refine":
+        print("[WARN] GRID_SEARCH=refine necesita varias pasadas; en BT_STREAM=1 se evalúa la rejilla gruesa")
+    weights, ks = grid_configs()
+    acc = BC.GridAccumulator(weights, ks, bins=AUC_BINS)
+    f = open(out_csv, "w", newline="", encoding="utf-8") if out_csv else None
+    try:
+        for i, chunk in enumerate(iter_feature_chunks(conn, CHUNK_ROWS)):
+            acc.update(BC.BacktestData(chunk))
+            if f is not None:
+                chunk.to_csv(f, header=(i == 0), index=False)
+    finally:
+        if f is not None:
+            f.close()
+    return acc.rows()
+
+def main():
+    conn = _connect()
+    t0 = time.perf_counter()
+    if STREAM:
+        rows = run_streaming(conn, out_csv=None if GRID else "backtest_hist_asof.csv")
+        conn.close()
+    else:
+        df = pd.read_sql(SQL, conn) if BUILDER == "sql" else load_asof_stream(conn)
+        conn.close()
+        t0 = time.perf_counter()
+        if GRID:
+            rows = run_grid_search(df, "backtest_hist_grid.csv")
+        else:
+            weights, ks = grid_configs()
+            rows = BC.evaluate_grid(BC.BacktestData(df), weights, ks)
 
     if GRID:
-        weight_grid = [0.5, 1.0, 1.5, 2.0]
-        rows = []
-        for wm, ws, wv in itertools.product(weight_grid, weight_grid, weight_grid):
-            res = evaluate(df, wm, ws, wv, K_MONTH, K_SURF, K_SPEED)
-            rows.append(res)
+        print(f"Grid: {len(rows)} combinaciones en {time.perf_counter() - t0:.2f}s")
         res_df = pd.DataFrame(rows).sort_values(by=["log_loss","auc"], ascending=[True, False])
 
         # Mejor combinación
@@ -242,12 +307,13 @@ def main():
         res_df.to_csv(out_csv, index=False)
         print(f"Saved: {out_csv}")
     else:
-        res = evaluate(df, W_MONTH, W_SURF, W_SPEED, K_MONTH, K_SURF, K_SPEED)
+        res = rows[0]
         print("== SUMMARY ==")
         for k,v in res.items():
             print(f"{k}: {v}")
         out_csv = "backtest_hist_asof.csv"
-        df.to_csv(out_csv, index=False)
+        if not STREAM:
+            df.to_csv(out_csv, index=False)
         print(f"Saved: {out_csv}")
 
 if __name__ == "__main__":
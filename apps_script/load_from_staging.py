@@ -1,9 +1,16 @@
 import os
 import sys
+import pathlib
 import requests
 import json
 from datetime import datetime
 
+try:
+    from services.player_index import PlayerIndex
+except ImportError:
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from services.player_index import PlayerIndex
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 HEADERS = {
@@ -11,6 +18,9 @@ HEADERS = {
     "Authorization": f"Bearer {SUPABASE_KEY}",
     "Content-Type": "application/json"
 }
+PAGE_SIZE = 1000
+
+_PLAYERS_MIN = None
 
 
 def fetch_staging(tourney_id):
@@ -52,23 +62,47 @@ def normalize_name(name: str) -> str:
 
     return name
 
-def resolve_player_id(player_name):
-    if not player_name:
-        return None, "nombre vacío"
+def load_players_min():
+    """players_min completo (paginado) en un PlayerIndex para resolver por nombre sin red."""
+    rows, offset = [], 0
+    url = f"{SUPABASE_URL}/rest/v1/players_min"
+    while True:
+        params = {"select": "player_id,name", "order": "player_id", "limit": PAGE_SIZE, "offset": offset}
+        res = requests.get(url, headers=HEADERS, params=params)
+        if not res.ok:
+            print("Error al cargar players_min:", res.status_code, res.text)
+            res.raise_for_status()
+        page = res.json()
+        rows.extend((p["player_id"], p.get("name")) for p in page)
+        if len(page) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    print(f"👥 players_min en memoria: {len(rows)} jugadores")
+    return PlayerIndex.from_rows(players_min=rows)
+
+
+def players_min_index():
+    global _PLAYERS_MIN
+    if _PLAYERS_MIN is None:
+        _PLAYERS_MIN = load_players_min()
+    return _PLAYERS_MIN
 
+
+def name_variants(player_name):
+    """Patrones ilike a probar, en orden (el primero con una sola coincidencia gana)."""
     raw_has_comma = "," in player_name
     name_clean = normalize_name(player_name)
 
-    name_variants = []
+    variants = []
 
     def add_variant(variant):
         if not variant:
             return
-        name_variants.append(variant)
+        variants.append(variant)
         if "%" not in variant:
-            name_variants.append(f"%{variant}")
-            name_variants.append(f"{variant}%")
-            name_variants.append(f"%{variant}%")
+            variants.append(f"%{variant}")
+            variants.append(f"{variant}%")
+            variants.append(f"%{variant}%")
 
     add_variant(name_clean)
     if "," in name_clean:
@@ -112,17 +146,21 @@ def resolve_player_id(player_name):
             add_variant(f"{surname}, {firstname}")
             add_variant(f"{firstname} {surname}")
 
+    return variants
+
+
+def resolve_player_id(player_name, index=None):
+    if not player_name:
+        return None, "nombre vacío"
+
+    index = index or players_min_index()
     multi_match_variants = []
-    for variant in name_variants:
-        url = f"{SUPABASE_URL}/rest/v1/players_min"
-        params = {"select": "player_id", "name": f"ilike.{variant}"}
-        res = requests.get(url, headers=HEADERS, params=params)
-        if res.ok:
-            matches = res.json()
-            if len(matches) == 1:
-                return matches[0]["player_id"], None
-            if len(matches) > 1:
-                multi_match_variants.append((variant, len(matches)))
+    for variant in name_variants(player_name):
+        matches = index.ilike(variant)
+        if len(matches) == 1:
+            return matches[0], None
+        if len(matches) > 1:
+            multi_match_variants.append((variant, len(matches)))
 
     if multi_match_variants:
         sample = ", ".join(f"{variant} ({count})" for variant, count in multi_match_variants[:3])
@@ -132,28 +170,73 @@ def resolve_player_id(player_name):
 
 
 
-def insert_draw_entry(tourney_id, row, player_id):
-    payload = {
+def draw_entry_payload(tourney_id, row, player_id):
+    return {
         "tourney_id": tourney_id,
         "pos": row["pos"],
         "player_id": player_id,
         "seed": row.get("seed"),
         "tag": row.get("tag") or ("UNRESOLVED" if not player_id else None)
     }
+
+
+def resolve_rows(tourney_id, staging_rows, index=None):
+    """
+    Resuelve todas las filas en local. Devuelve (payloads de draw_entries,
+    resumen) con los fallos por fila (pos, nombre, motivo).
+    """
+    payloads, unresolved = [], []
+    for row in staging_rows:
+        player_id, resolve_reason = resolve_player_id(row.get("player_name"), index)
+        payloads.append(draw_entry_payload(tourney_id, row, player_id))
+        if not player_id and not row.get("tag"):
+            unresolved.append({"pos": row["pos"], "player_name": row.get("player_name"),
+                               "reason": resolve_reason})
+    summary = {
+        "tourney_id": tourney_id,
+        "rows": len(staging_rows),
+        "resolved": sum(1 for p in payloads if p["player_id"]),
+        "tagged": sum(1 for r in staging_rows if r.get("tag")),
+        "unresolved": unresolved,
+    }
+    return payloads, summary
+
+
+def insert_draw_entries(payloads):
+    """Un solo POST con el array de filas (troceado en PAGE_SIZE por si acaso)."""
     url = f"{SUPABASE_URL}/rest/v1/draw_entries"
-    res = requests.post(url, headers=HEADERS, data=json.dumps(payload))
-    if not res.ok:
-        print(f"Error insertando draw_entry en pos {row['pos']}: {res.status_code} {res.text}")
-        res.raise_for_status()
+    headers = {**HEADERS, "Prefer": "return=minimal"}
+    for i in range(0, len(payloads), PAGE_SIZE):
+        chunk = payloads[i:i + PAGE_SIZE]
+        res = requests.post(url, headers=headers, data=json.dumps(chunk))
+        if not res.ok:
+            print(f"Error insertando draw_entries (pos {chunk[0]['pos']}..{chunk[-1]['pos']}): {res.status_code} {res.text}")
+            res.raise_for_status()
 
 
-def mark_as_processed(tourney_id, pos):
+def mark_as_processed(tourney_id, positions):
+    """Un solo PATCH de processed_at para todas las posiciones migradas."""
+    if not positions:
+        return
     now = datetime.utcnow().isoformat()
-    url = f"{SUPABASE_URL}/rest/v1/stg_draw_entries_by_name?tourney_id=eq.{tourney_id}&pos=eq.{pos}"
+    in_list = ",".join(str(p) for p in positions)
+    url = f"{SUPABASE_URL}/rest/v1/stg_draw_entries_by_name?tourney_id=eq.{tourney_id}&pos=in.({in_list})"
     payload = {"processed_at": now}
     res = requests.patch(url, headers=HEADERS, data=json.dumps(payload))
     if not res.ok:
-        print(f"Error marcando como procesado (tourney={tourney_id}, pos={pos}):", res.text)
+        print(f"Error marcando como procesado (tourney={tourney_id}, {len(positions)} posiciones):", res.text)
+
+
+def print_summary(summary):
+    print(f"📊 {summary['resolved']}/{summary['rows']} resueltos, {summary['tagged']} con tag, "
+          f"{len(summary['unresolved'])} sin resolver")
+    for u in summary["unresolved"]:
+        detail = f" -> {u['reason']}" if u["reason"] else ""
+        print(f"[!] No se pudo resolver: {u['player_name']} (pos {u['pos']}){detail}")
+    path = os.getenv("DRAW_SUMMARY_JSON")
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
 
 
 def main():
@@ -167,14 +250,10 @@ def main():
 
     print(f"📥 Filas a procesar para torneo {tourney_id}: {len(staging_rows)}")
 
-    for row in staging_rows:
-        player_id, resolve_reason = resolve_player_id(row.get("player_name"))
-        insert_draw_entry(tourney_id, row, player_id)
-        mark_as_processed(tourney_id, row["pos"])
-
-        if not player_id and not row.get("tag"):
-            detail = f" -> {resolve_reason}" if resolve_reason else ""
-            print(f"[!] No se pudo resolver: {row['player_name']} (pos {row['pos']}){detail}")
+    payloads, summary = resolve_rows(tourney_id, staging_rows)
+    insert_draw_entries(payloads)
+    mark_as_processed(tourney_id, [row["pos"] for row in staging_rows])
+    print_summary(summary)
 
     print("✅ Migración completada.")
 
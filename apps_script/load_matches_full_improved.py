@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
-import argparse, csv, os
+import argparse, csv, os, sys
 import logging
+import pathlib
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import execute_values
 from datetime import datetime
 
+try:
+    from services.player_index import PlayerIndex
+except ImportError:
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from services.player_index import PlayerIndex
+
 DDL_SCHEMA = "estratego_v1"
 IGNORED_OUTPUT = "ignored_matches.csv"
 
@@ -42,45 +50,39 @@ def norm_surface(s):
         return v.capitalize()
     return "Unknown"
 
-def load_player_name_id_map(cur):
-    cur.execute(f"SELECT player_id, name FROM {DDL_SCHEMA}.players ORDER BY player_id")
-    name_to_ids = {}
-    for pid, name in cur.fetchall():
-        if pid is None or not name:
-            continue
-        name_to_ids.setdefault(name.strip(), []).append(pid)
-    name_id_map = {}
-    for name, ids in name_to_ids.items():
-        if len(ids) > 1:
-            logging.warning("Nombre ambiguo en %s.players para %r: ids %s (se ignora, no se resolvera por nombre)",
-                             DDL_SCHEMA, name, ids)
-            continue
-        name_id_map[name] = ids[0]
-    return name_id_map
-
-def resolve_from_mapping(cur, raw_id, name):
+def load_player_index(cur):
+    """players + player_name_map en memoria (dos SELECT por ejecucion)."""
+    index = PlayerIndex.from_pg(cur, DDL_SCHEMA)
+    for name, ids in index.ambiguous_names().items():
+        logging.warning("Nombre ambiguo en %s.players para %r: ids %s (se ignora, no se resolvera por nombre)",
+                         DDL_SCHEMA, name, ids)
+    logging.info("Indice de jugadores: %s", index.stats())
+    return index
+
+def resolve_from_mapping(cur, raw_id, name, index):
+    """
+    Misma cascada que antes, pero las lecturas salen de `index`; solo se va a
+    la BD para las escrituras (player_name_map / ext_atp_id), que tambien se
+    reflejan en el indice.
+    """
     csv_id = str(raw_id).strip() if raw_id not in (None, "") else None
 
     # 1) ext_atp_id: id oficial de la ATP (ej. "DH50"), permanente y sin
     #    ambiguedad - es la fuente de verdad una vez rellenado.
     if csv_id is not None:
-        cur.execute(f"SELECT player_id FROM {DDL_SCHEMA}.players WHERE ext_atp_id = %s", (csv_id,))
-        row = cur.fetchone()
-        if row:
-            return row[0]
+        pid = index.ext(csv_id)
+        if pid is not None:
+            return pid
 
         # 2) cache historico (csv_id -> player_id) de resoluciones por nombre previas
-        cur.execute(f"""
-            SELECT resolved_player_id FROM {DDL_SCHEMA}.player_name_map
-            WHERE csv_id = %s
-        """, (csv_id,))
-        row = cur.fetchone()
-        if row:
-            resolved_id = row[0]
-            cur.execute(f"""
-                UPDATE {DDL_SCHEMA}.players SET ext_atp_id = %s
-                WHERE player_id = %s AND ext_atp_id IS NULL
-            """, (csv_id, resolved_id))
+        found, resolved_id = index.mapping(csv_id)
+        if found:
+            if resolved_id is not None:
+                cur.execute(f"""
+                    UPDATE {DDL_SCHEMA}.players SET ext_atp_id = %s
+                    WHERE player_id = %s AND ext_atp_id IS NULL
+                """, (csv_id, resolved_id))
+                index.set_ext(csv_id, resolved_id)
             return resolved_id
 
     # 3) fallback: match exacto por nombre (solo si no es ambiguo). Se trata el
@@ -89,22 +91,14 @@ def resolve_from_mapping(cur, raw_id, name):
     #    los tiene guardados con espacio ("Auger Aliassime"), y un match exacto
     #    sin esta normalizacion falla en silencio para siempre (el jugador nunca
     #    consigue ext_atp_id y sus partidos quedan en ignored_matches.csv).
-    cur.execute(
-        f"""
-        SELECT player_id FROM {DDL_SCHEMA}.players
-        WHERE lower(replace(name, '-', ' ')) = lower(replace(%s, '-', ' '))
-        ORDER BY player_id
-        """,
-        (name.strip(),),
-    )
-    rows = cur.fetchall()
-    if not rows:
+    ids = index.by_name(name.strip())
+    if not ids:
         return None
-    if len(rows) > 1:
+    if len(ids) > 1:
         logging.warning("Nombre ambiguo %r: ids %s (no se crea mapping automatico, requiere resolucion manual)",
-                         name.strip(), [r[0] for r in rows])
+                         name.strip(), ids)
         return None
-    resolved_id = rows[0][0]
+    resolved_id = ids[0]
     if csv_id is not None:
         cur.execute(f"""
             INSERT INTO {DDL_SCHEMA}.player_name_map (csv_id, player_name, resolved_player_id)
@@ -115,22 +109,24 @@ def resolve_from_mapping(cur, raw_id, name):
             UPDATE {DDL_SCHEMA}.players SET ext_atp_id = %s
             WHERE player_id = %s AND ext_atp_id IS NULL
         """, (csv_id, resolved_id))
+        index.add_mapping(csv_id, resolved_id)
+        index.set_ext(csv_id, resolved_id)
     return resolved_id
 
-def resolve_player_id(raw_id, name, name_id_map, cur):
+def resolve_player_id(raw_id, name, index, cur):
     try:
         int_id = int(str(raw_id))
-        if int_id in name_id_map.values():
+        if index.is_unique_name_id(int_id):
             return int_id
     except:
         pass
-    return resolve_from_mapping(cur, raw_id, name)
+    return resolve_from_mapping(cur, raw_id, name, index)
 
 def new_player_id(cur):
     cur.execute(f"SELECT nextval('{DDL_SCHEMA}.players_player_id_seq')")
     return cur.fetchone()[0]
 
-def upsert_players(cur, rows):
+def upsert_players(cur, rows, index):
     seen = set()
     batch = []
     # csv_id (o nombre normalizado si no hay csv_id) -> pid recien creado en
@@ -151,7 +147,7 @@ def upsert_players(cur, rows):
             if dedupe_key in pending_new_by_key:
                 pid = pending_new_by_key[dedupe_key]
             else:
-                pid = resolve_from_mapping(cur, raw_id, name)
+                pid = resolve_from_mapping(cur, raw_id, name, index)
                 is_new = pid is None
                 if is_new:
                     pid = new_player_id(cur)
@@ -180,8 +176,21 @@ def upsert_players(cur, rows):
                 ext_atp_id = COALESCE({DDL_SCHEMA}.players.ext_atp_id, EXCLUDED.ext_atp_id)
         """
         execute_values(cur, sql, batch, page_size=1000)
+        for pid, name, _hand, _ht, _ioc, csv_id in batch:
+            index.add_player(pid, name, csv_id)
 
-def upsert_matches_full(cur, rows, name_id_map, dry_run=False):
+# Columnas de matches_full en el orden de las tuplas de upsert_matches_full
+MATCHES_FULL_COLUMNS = [
+    "tourney_id", "tourney_name", "surface", "draw_size", "tourney_level", "tourney_date", "match_num",
+    "winner_id", "winner_seed", "winner_entry", "winner_name", "winner_hand", "winner_ht", "winner_ioc", "winner_age",
+    "loser_id", "loser_seed", "loser_entry", "loser_name", "loser_hand", "loser_ht", "loser_ioc", "loser_age",
+    "score", "best_of", "round", "minutes",
+    "w_ace", "w_df", "w_svpt", "w_1stIn", "w_1stWon", "w_2ndWon", "w_SvGms", "w_bpSaved", "w_bpFaced",
+    "l_ace", "l_df", "l_svpt", "l_1stIn", "l_1stWon", "l_2ndWon", "l_SvGms", "l_bpSaved", "l_bpFaced",
+    "winner_rank", "winner_rank_points", "loser_rank", "loser_rank_points",
+]
+
+def upsert_matches_full(cur, rows, index, dry_run=False):
     m_rows, snapshot_rows, ignored = [], [], []
     skipped = 0
     already_loaded = 0
@@ -205,8 +214,8 @@ def upsert_matches_full(cur, rows, name_id_map, dry_run=False):
             if tid and (tid, mnum) in existing:
                 already_loaded += 1
                 continue
-            wid = resolve_player_id(r.get("winner_id"), r.get("winner_name"), name_id_map, cur)
-            lid = resolve_player_id(r.get("loser_id"), r.get("loser_name"), name_id_map, cur)
+            wid = resolve_player_id(r.get("winner_id"), r.get("winner_name"), index, cur)
+            lid = resolve_player_id(r.get("loser_id"), r.get("loser_name"), index, cur)
             reason = None
             if not tid:
                 reason = "tourney_id missing"
@@ -250,15 +259,7 @@ def upsert_matches_full(cur, rows, name_id_map, dry_run=False):
 
     if not dry_run and m_rows:
         execute_values(cur, f"""
-            INSERT INTO {DDL_SCHEMA}.matches_full (
-              tourney_id, tourney_name, surface, draw_size, tourney_level, tourney_date, match_num,
-              winner_id, winner_seed, winner_entry, winner_name, winner_hand, winner_ht, winner_ioc, winner_age,
-              loser_id, loser_seed, loser_entry, loser_name, loser_hand, loser_ht, loser_ioc, loser_age,
-              score, best_of, round, minutes,
-              w_ace, w_df, w_svpt, w_1stIn, w_1stWon, w_2ndWon, w_SvGms, w_bpSaved, w_bpFaced,
-              l_ace, l_df, l_svpt, l_1stIn, l_1stWon, l_2ndWon, l_SvGms, l_bpSaved, l_bpFaced,
-              winner_rank, winner_rank_points, loser_rank, loser_rank_points
-            )
+            INSERT INTO {DDL_SCHEMA}.matches_full ({", ".join(MATCHES_FULL_COLUMNS)})
             VALUES %s
             ON CONFLICT DO NOTHING;
         """, m_rows, page_size=1000)
@@ -281,20 +282,326 @@ def upsert_matches_full(cur, rows, name_id_map, dry_run=False):
 
     return len(m_rows), skipped, already_loaded
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Modo --bulk: COPY del CSV a una tabla temporal y resolución por conjuntos.
+# Mismas reglas que upsert_players/upsert_matches_full (ext_atp_id ->
+# player_name_map -> nombre exacto no ambiguo -> jugador nuevo), pero en una
+# veintena de sentencias para todo el CSV en vez de varias por fila.
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Columnas del CSV que usa la carga (si faltan en la cabecera quedan a NULL)
+BULK_CSV_COLUMNS = [
+    "tourney_id", "tourney_name", "surface", "draw_size", "tourney_level", "tourney_date", "match_num",
+    "winner_id", "winner_seed", "winner_entry", "winner_name", "winner_hand", "winner_ht", "winner_ioc", "winner_age",
+    "loser_id", "loser_seed", "loser_entry", "loser_name", "loser_hand", "loser_ht", "loser_ioc", "loser_age",
+    "score", "best_of", "round", "minutes",
+    "w_ace", "w_df", "w_svpt", "w_1stin", "w_1stwon", "w_2ndwon", "w_svgms", "w_bpsaved", "w_bpfaced",
+    "l_ace", "l_df", "l_svpt", "l_1stin", "l_1stwon", "l_2ndwon", "l_svgms", "l_bpsaved", "l_bpfaced",
+    "winner_rank", "winner_rank_points", "loser_rank", "loser_rank_points",
+]
+
+# Réplicas SQL de as_int / as_float / norm_hand / norm_surface
+BULK_FUNCS_SQL = r"""
+CREATE OR REPLACE FUNCTION pg_temp.as_int(t text) RETURNS int LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE WHEN btrim(t) ~ '^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$'
+              THEN trunc(btrim(t)::numeric)::int END
+$$;
+CREATE OR REPLACE FUNCTION pg_temp.as_float(t text) RETURNS float8 LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE WHEN btrim(t) ~ '^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$'
+              THEN btrim(t)::float8 END
+$$;
+CREATE OR REPLACE FUNCTION pg_temp.norm_hand(t text) RETURNS text LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE
+    WHEN upper(btrim(t)) IN ('RIGHT', 'R', 'RH') THEN 'R'
+    WHEN upper(btrim(t)) IN ('LEFT', 'L', 'LH') THEN 'L'
+    WHEN upper(btrim(t)) IN ('AMBIDEXTROUS', 'AMBIDEXTROXO', 'AMBIDEXTRO', 'A') THEN 'A'
+    WHEN upper(btrim(t)) IN ('U', 'UNKNOWN', 'NA', 'N/A') THEN 'U'
+  END
+$$;
+CREATE OR REPLACE FUNCTION pg_temp.norm_surface(t text) RETURNS text LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE
+    WHEN t IS NULL OR t = '' THEN NULL
+    WHEN lower(btrim(t)) IN ('indoor hard', 'hard indoor') THEN 'Hard'
+    WHEN lower(btrim(t)) IN ('hard', 'clay', 'grass', 'carpet', 'unknown') THEN initcap(lower(btrim(t)))
+    ELSE 'Unknown'
+  END
+$$;
+"""
+
+# Columna de matches_full -> expresión sobre stg_matches m / stg_resolved r
+BULK_MATCH_EXPRS = {
+    "tourney_id": "r.tid", "tourney_name": "m.tourney_name",
+    "surface": "pg_temp.norm_surface(m.surface)", "draw_size": "pg_temp.as_int(m.draw_size)",
+    "tourney_level": "m.tourney_level", "tourney_date": "r.tdate", "match_num": "r.mnum",
+    "winner_id": "r.wid", "winner_seed": "m.winner_seed", "winner_entry": "m.winner_entry",
+    "winner_name": "m.winner_name", "winner_hand": "pg_temp.norm_hand(m.winner_hand)",
+    "winner_ht": "pg_temp.as_int(m.winner_ht)", "winner_ioc": "m.winner_ioc",
+    "winner_age": "pg_temp.as_float(m.winner_age)",
+    "loser_id": "r.lid", "loser_seed": "m.loser_seed", "loser_entry": "m.loser_entry",
+    "loser_name": "m.loser_name", "loser_hand": "pg_temp.norm_hand(m.loser_hand)",
+    "loser_ht": "pg_temp.as_int(m.loser_ht)", "loser_ioc": "m.loser_ioc",
+    "loser_age": "pg_temp.as_float(m.loser_age)",
+    "score": "m.score", "best_of": "pg_temp.as_int(m.best_of)", "round": "m.round",
+    "minutes": "pg_temp.as_int(m.minutes)",
+    **{c: f"pg_temp.as_int(m.{c})" for c in (
+        "w_ace", "w_df", "w_svpt", "w_1stin", "w_1stwon", "w_2ndwon", "w_svgms", "w_bpsaved", "w_bpfaced",
+        "l_ace", "l_df", "l_svpt", "l_1stin", "l_1stwon", "l_2ndwon", "l_svgms", "l_bpsaved", "l_bpfaced",
+        "winner_rank", "winner_rank_points", "loser_rank", "loser_rank_points")},
+}
+
+def _column_types(cur, table):
+    cur.execute("""
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    """, (table,))
+    return dict(cur.fetchall())
+
+def stage_csv(cur, csv_path):
+    """COPY del CSV tal cual (todo text) a stg_matches; devuelve la cabecera original."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+    cols = [h.strip().lower() for h in header]
+    extra = [c for c in BULK_CSV_COLUMNS if c not in cols]
+    coldefs = sql.SQL(", ").join(
+        sql.SQL("{} text").format(sql.Identifier(c)) for c in cols + extra
+    )
+    cur.execute(sql.SQL(
+        "CREATE TEMP TABLE stg_matches (line bigserial PRIMARY KEY, {}) ON COMMIT DROP"
+    ).format(coldefs))
+    copy = sql.SQL("COPY stg_matches ({}) FROM STDIN WITH (FORMAT csv, HEADER true)").format(
+        sql.SQL(", ").join(map(sql.Identifier, cols)))
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        cur.copy_expert(copy.as_string(cur), f)
+    return header, cols
+
+def bulk_resolve_players(cur):
+    """Resuelve cada jugador del CSV (clave csv_id o nombre) a player_id, creando los que falten."""
+    S = DDL_SCHEMA
+    # ids de nombres unicos (PlayerIndex.is_unique_name_id), tomados antes de tocar players
+    cur.execute(f"""
+        CREATE TEMP TABLE stg_uniq_ids ON COMMIT DROP AS
+        SELECT min(player_id) AS player_id
+        FROM {S}.players
+        WHERE player_id IS NOT NULL AND nullif(btrim(name), '') IS NOT NULL
+        GROUP BY btrim(name)
+        HAVING count(*) = 1
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE stg_sides ON COMMIT DROP AS
+        SELECT m.line, v.side, nullif(btrim(v.raw_id), '') AS csv_id, v.name AS name_raw,
+               nullif(btrim(v.name), '') AS name, v.hand, v.ht, v.ioc,
+               coalesce(nullif(btrim(v.raw_id), ''), lower(nullif(btrim(v.name), ''))) AS key
+        FROM stg_matches m
+        CROSS JOIN LATERAL (VALUES
+          ('winner', m.winner_id, m.winner_name, m.winner_hand, m.winner_ht, m.winner_ioc),
+          ('loser',  m.loser_id,  m.loser_name,  m.loser_hand,  m.loser_ht,  m.loser_ioc)
+        ) AS v(side, raw_id, name, hand, ht, ioc)
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE stg_keys ON COMMIT DROP AS
+        SELECT DISTINCT ON (key) key, csv_id, name, line AS first_line,
+               NULL::int AS pid, NULL::text AS how
+        FROM stg_sides
+        WHERE key IS NOT NULL
+        ORDER BY key, (name IS NULL), line
+    """)
+    # 1) ext_atp_id
+    cur.execute(f"""
+        UPDATE stg_keys k SET pid = p.player_id, how = 'ext'
+        FROM {S}.players p WHERE p.ext_atp_id = k.csv_id
+    """)
+    # 2) player_name_map (un resolved_player_id NULL cuenta como resuelto a "nadie")
+    cur.execute(f"""
+        UPDATE stg_keys k SET pid = m.resolved_player_id, how = 'map'
+        FROM {S}.player_name_map m
+        WHERE k.how IS NULL AND m.csv_id = k.csv_id
+    """)
+    # 3) nombre exacto (guion = espacio), solo si no es ambiguo
+    cur.execute(f"""
+        WITH u AS (
+          SELECT lower(replace(name, '-', ' ')) AS nk, min(player_id) AS pid, count(*) AS n
+          FROM {S}.players WHERE name IS NOT NULL GROUP BY 1
+        )
+        UPDATE stg_keys k
+        SET pid = CASE WHEN u.n = 1 THEN u.pid END,
+            how = CASE WHEN u.n = 1 THEN 'name' ELSE 'ambiguous' END
+        FROM u
+        WHERE k.how IS NULL AND k.name IS NOT NULL AND u.nk = lower(replace(k.name, '-', ' '))
+    """)
+    cur.execute("SELECT name FROM stg_keys WHERE how = 'ambiguous' ORDER BY first_line")
+    for (name,) in cur.fetchall():
+        logging.warning("Nombre ambiguo %r (no se crea mapping automatico, requiere resolucion manual)", name)
+    cur.execute(f"""
+        INSERT INTO {S}.player_name_map (csv_id, player_name, resolved_player_id)
+        SELECT csv_id, name, pid FROM stg_keys
+        WHERE how = 'name' AND csv_id IS NOT NULL
+        ON CONFLICT (csv_id) DO NOTHING
+    """)
+    cur.execute(f"""
+        UPDATE {S}.players p SET ext_atp_id = k.csv_id
+        FROM (
+          SELECT DISTINCT ON (pid) pid, csv_id FROM stg_keys
+          WHERE how IN ('map', 'name') AND csv_id IS NOT NULL AND pid IS NOT NULL
+          ORDER BY pid, first_line
+        ) k
+        WHERE p.player_id = k.pid AND p.ext_atp_id IS NULL
+    """)
+    # 4) jugadores nuevos: ids de la secuencia en una sola sentencia
+    cur.execute(f"""
+        UPDATE stg_keys k SET pid = n.pid, how = 'new'
+        FROM (
+          SELECT key, nextval('{S}.players_player_id_seq')::int AS pid
+          FROM (SELECT key FROM stg_keys WHERE pid IS NULL AND name IS NOT NULL ORDER BY first_line) q
+        ) n
+        WHERE k.key = n.key
+        RETURNING k.name, k.csv_id, k.pid
+    """)
+    for name, csv_id, pid in cur.fetchall():
+        logging.info("Jugador nuevo: %r (ext_atp_id=%s) -> player_id=%s", name, csv_id, pid)
+    # 5) alta/actualización de players (la última aparición de cada jugador manda)
+    cur.execute(f"""
+        INSERT INTO {S}.players(player_id, name, hand, height_cm, ioc, ext_atp_id)
+        SELECT DISTINCT ON (k.pid)
+               k.pid, s.name_raw, pg_temp.norm_hand(s.hand), pg_temp.as_int(s.ht),
+               nullif(s.ioc, ''), s.csv_id
+        FROM stg_sides s JOIN stg_keys k USING (key)
+        WHERE s.name IS NOT NULL AND k.pid IS NOT NULL
+        ORDER BY k.pid, s.line DESC
+        ON CONFLICT (player_id) DO UPDATE SET
+            name = EXCLUDED.name,
+            hand = COALESCE(EXCLUDED.hand, {S}.players.hand),
+            height_cm = COALESCE(EXCLUDED.height_cm, {S}.players.height_cm),
+            ioc = COALESCE(EXCLUDED.ioc, {S}.players.ioc),
+            ext_atp_id = COALESCE({S}.players.ext_atp_id, EXCLUDED.ext_atp_id)
+    """)
+
+def bulk_load(cur, csv_path):
+    """Carga completa por conjuntos. Devuelve (insertados, ignorados, ya_cargados)."""
+    S = DDL_SCHEMA
+    cur.execute(BULK_FUNCS_SQL)
+    header, cols = stage_csv(cur, csv_path)
+    cur.execute("ANALYZE stg_matches")
+    bulk_resolve_players(cur)
+
+    # Un id numérico del CSV que ya es player_id de un nombre único se usa tal
+    # cual (como resolve_player_id); si no, el resuelto por stg_keys
+    cur.execute(f"""
+        CREATE TEMP TABLE stg_resolved ON COMMIT DROP AS
+        SELECT x.*,
+               EXISTS (SELECT 1 FROM {S}.matches_full f
+                       WHERE f.tourney_id = x.tid AND f.match_num IS NOT DISTINCT FROM x.mnum) AS already,
+               CASE
+                 WHEN x.tid IS NULL THEN 'tourney_id missing'
+                 WHEN x.wid IS NULL THEN 'winner_id not resolved'
+                 WHEN x.lid IS NULL THEN 'loser_id not resolved'
+                 WHEN x.tdate IS NULL THEN 'unknown error: tourney_date missing'
+               END AS reason
+        FROM (
+          SELECT m.line,
+                 nullif(m.tourney_id, '') AS tid,
+                 pg_temp.as_int(m.match_num) AS mnum,
+                 coalesce(wu.player_id, wk.pid) AS wid,
+                 coalesce(lu.player_id, lk.pid) AS lid,
+                 CASE WHEN length(m.tourney_date) >= 8 THEN
+                   substr(m.tourney_date, 1, 4) || '-' || substr(m.tourney_date, 5, 2) || '-' || substr(m.tourney_date, 7)
+                 END AS tdate,
+                 substr(m.tourney_date, 1, 4) || '_' || m.tourney_id || '_'
+                   || coalesce(pg_temp.as_int(m.match_num), 0) AS match_id
+          FROM stg_matches m
+          LEFT JOIN stg_sides ws ON ws.line = m.line AND ws.side = 'winner'
+          LEFT JOIN stg_keys  wk ON wk.key = ws.key
+          LEFT JOIN stg_uniq_ids wu
+                 ON m.winner_id ~ '^\\s*[+-]?[0-9]{{1,9}}\\s*$' AND wu.player_id = btrim(m.winner_id)::int
+          LEFT JOIN stg_sides ls ON ls.line = m.line AND ls.side = 'loser'
+          LEFT JOIN stg_keys  lk ON lk.key = ls.key
+          LEFT JOIN stg_uniq_ids lu
+                 ON m.loser_id ~ '^\\s*[+-]?[0-9]{{1,9}}\\s*$' AND lu.player_id = btrim(m.loser_id)::int
+        ) x
+    """)
+
+    types = _column_types(cur, f"{S}.matches_full")
+    target = [c for c in BULK_MATCH_EXPRS if c in types]
+    select_list = ", ".join(f"({BULK_MATCH_EXPRS[c]})::{types[c]}" for c in target)
+    cur.execute(f"""
+        INSERT INTO {S}.matches_full ({", ".join(target)})
+        SELECT {select_list}
+        FROM stg_resolved r JOIN stg_matches m USING (line)
+        WHERE r.reason IS NULL AND NOT r.already
+        ORDER BY r.line
+        ON CONFLICT DO NOTHING
+    """)
+    # filas realmente insertadas: ON CONFLICT descarta las (tourney_id, match_num) repetidas en el CSV
+    inserted = cur.rowcount
+    cur.execute(f"""
+        INSERT INTO {S}.rankings_snapshot_v2 (player_id, match_id, rank, rank_points, side)
+        SELECT r.wid, r.match_id, pg_temp.as_int(m.winner_rank), pg_temp.as_int(m.winner_rank_points), 'winner'
+        FROM stg_resolved r JOIN stg_matches m USING (line)
+        WHERE r.reason IS NULL AND NOT r.already AND pg_temp.as_int(m.winner_rank) IS NOT NULL
+        UNION ALL
+        SELECT r.lid, r.match_id, pg_temp.as_int(m.loser_rank), pg_temp.as_int(m.loser_rank_points), 'loser'
+        FROM stg_resolved r JOIN stg_matches m USING (line)
+        WHERE r.reason IS NULL AND NOT r.already AND pg_temp.as_int(m.loser_rank) IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+
+    cur.execute("""
+        SELECT count(*) FILTER (WHERE reason IS NULL AND NOT already),
+               count(*) FILTER (WHERE reason IS NOT NULL AND NOT already),
+               count(*) FILTER (WHERE already)
+        FROM stg_resolved
+    """)
+    candidates, skipped, already = cur.fetchone()
+    if candidates > inserted:
+        logging.warning("%d lineas del CSV descartadas por conflicto (tourney_id, match_num repetidos)",
+                        candidates - inserted)
+
+    if skipped:
+        cur.execute(sql.SQL("""
+            SELECT {}, r.reason FROM stg_matches m JOIN stg_resolved r USING (line)
+            WHERE r.reason IS NOT NULL AND NOT r.already ORDER BY m.line
+        """).format(sql.SQL(", ").join(sql.SQL("m.{}").format(sql.Identifier(c)) for c in cols)))
+        with open(IGNORED_OUTPUT, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header + ["reason"])
+            writer.writerows(cur.fetchall())
+
+    return inserted, skipped, already
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", required=True, help="Ruta al CSV atp_matches_2024.csv")
     ap.add_argument("--dburl", default=os.getenv("DATABASE_URL"), help="DATABASE_URL de Postgres")
     ap.add_argument("--dry-run", action="store_true", help="Validar sin insertar datos")
+    ap.add_argument("--bulk", action="store_true",
+                    help="COPY a tabla temporal y resolucion por conjuntos (en --dry-run se hace ROLLBACK)")
     args = ap.parse_args()
     if not args.dburl:
         raise SystemExit("DATABASE_URL no especificado (usa --dburl o variable de entorno).")
 
     conn = connect(args.dburl)
+    if args.bulk:
+        try:
+            with conn.cursor() as cur:
+                inserted, skipped, already = bulk_load(cur, args.csv)
+            if args.dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+            verb = "se insertarian" if args.dry_run else "insertados"
+            print(f"✅ {inserted} partidos {verb} desde {args.csv}")
+            if already:
+                print(f"ℹ️  {already} partidos ya estaban cargados (omitidos, no duplicados)")
+            if skipped:
+                print(f"⚠️  {skipped} partidos ignorados por datos incompletos (ver {IGNORED_OUTPUT})")
+        finally:
+            conn.close()
+        return
+
     try:
         with conn:
             with conn.cursor() as cur:
-                name_id_map = load_player_name_id_map(cur)
+                index = load_player_index(cur)
                 batch = []
                 inserted, skipped, already = 0, 0, 0
                 with open(args.csv, newline="", encoding="utf-8") as f:
@@ -302,15 +609,15 @@ def main():
                     for row in reader:
                         batch.append(row)
                         if len(batch) >= 1000:
-                            upsert_players(cur, batch)
-                            ins, skip, alr = upsert_matches_full(cur, batch, name_id_map, dry_run=args.dry_run)
+                            upsert_players(cur, batch, index)
+                            ins, skip, alr = upsert_matches_full(cur, batch, index, dry_run=args.dry_run)
                             inserted += ins
                             skipped += skip
                             already += alr
                             batch.clear()
                     if batch:
-                        upsert_players(cur, batch)
-                        ins, skip, alr = upsert_matches_full(cur, batch, name_id_map, dry_run=args.dry_run)
+                        upsert_players(cur, batch, index)
+                        ins, skip, alr = upsert_matches_full(cur, batch, index, dry_run=args.dry_run)
                         inserted += ins
                         skipped += skip
                         already += alr
@@ -1,27 +1,34 @@
 # apps_script/load_players_from_sr.py
-import os, time, json, math
+import os, sys, time, json, math, pathlib
 import psycopg2
 import psycopg2.extras
 import requests
 
+try:
+    from services import sr_disk_cache as SRDC
+except ImportError:  # ejecutado como script: la raíz del repo no está en sys.path
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from services import sr_disk_cache as SRDC
+
 SR_API_KEY = os.environ["SR_API_KEY"]
 DATABASE_URL = os.environ["DATABASE_URL"]
 SESSION = requests.Session()
 SESSION.headers.update({"accept": "application/json", "x-api-key": SR_API_KEY})
 
-def fetch_profile(sr_id: str) -> dict | None:
+def fetch_profile(sr_id: str) -> tuple[dict | None, bool]:
+    """(perfil, fue_a_red): los perfiles servidos desde la caché en disco no necesitan pausa."""
     # sr_id: 'sr:competitor:407573'
     enc = sr_id.replace(":", "%3A")
     url = f"https://api.sportradar.com/tennis/trial/v3/en/competitors/{enc}/profile.json"
-    r = SESSION.get(url, timeout=20)
+    r, src = SRDC.cached_get(url, timeout=20, session=SESSION)
     if r.status_code == 200:
-        return r.json()
+        return r.json(), src != "hit"
     # rate limit simple
     if r.status_code == 429:
         time.sleep(1.0)
         return fetch_profile(sr_id)
     print("WARN fetch_profile", r.status_code, r.text[:200])
-    return None
+    return None, True
 
 def upsert_player(conn, pid: int, sr_id: str, prof: dict):
     # mapping desde el JSON de SR
@@ -89,13 +96,14 @@ def main():
         for i, r in enumerate(rows, 1):
             pid = r["player_id"]
             srid = r["ext_sportradar_id"] or f"sr:competitor:{pid}"
-            prof = fetch_profile(srid)
+            prof, from_net = fetch_profile(srid)
             if prof:
                 upsert_player(conn, pid, srid, prof)
                 conn.commit()
             if i % 10 == 0:
                 print(f"[INFO] {i}/{len(rows)}")
-            time.sleep(0.15)  # ~6-7 req/s, ajusta si hace falta
+            if from_net:
+                time.sleep(0.15)  # ~6-7 req/s, ajusta si hace falta
     finally:
         conn.close()
 
@@ -1,16 +1,22 @@
 # load_rankings_sportradar.py
-import os, re, requests, psycopg2
+import os, re, sys, pathlib, requests, psycopg2
 from psycopg2.extras import execute_values
 from datetime import date
 
+try:
+    from services import sr_disk_cache as SRDC
+except ImportError:  # ejecutado como script: la raíz del repo no está en sys.path
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from services import sr_disk_cache as SRDC
+
 SR_API_KEY   = os.getenv("SR_API_KEY", "")
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 BASE_URL     = "https://api.sportradar.com/tennis/trial/v3/en"
 
 def sr_get(path):
-    r = requests.get(f"{BASE_URL}{path}",
-                     headers={"accept":"application/json","x-api-key":SR_API_KEY},
-                     timeout=30)
+    r, _src = SRDC.cached_get(f"{BASE_URL}{path}",
+                              headers={"accept":"application/json","x-api-key":SR_API_KEY},
+                              timeout=30)
     r.raise_for_status()
     return r.json()
 
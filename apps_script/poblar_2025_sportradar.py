@@ -4,17 +4,30 @@
 # - y hace UPSERT a public.matches_long_base.
 # Fix clave: extracción robusta de tournament_name/surface + fallback a /seasons/{id}/info.json.
 
-import os, time, re, sys
+import os, time, re, sys, pathlib
 import requests
 import psycopg2
 from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+try:
+    from services import sr_disk_cache as SRDC
+except ImportError:  # ejecutado como script: la raíz del repo no está en sys.path
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from services import sr_disk_cache as SRDC
+from utils.token_bucket import TokenBucket
+
 # ==== CONFIG por variables de entorno ====
 SR_API_KEY     = os.getenv("SR_API_KEY", "")
 DATABASE_URL   = os.getenv("DATABASE_URL", "")
 BASE_URL       = os.getenv("BASE_URL", "https://api.sportradar.com/tennis/trial/v3/en")
-RATE_SLEEP     = float(os.getenv("RATE_SLEEP", "0.35"))  # sube a 0.8 si ves 429
+RATE_SLEEP     = float(os.getenv("RATE_SLEEP", "0.35"))  # compat: si no hay SR_QPS, QPS = 1/RATE_SLEEP
+SR_QPS         = float(os.getenv("SR_QPS") or 1.0 / RATE_SLEEP)  # QPS del plan de Sportradar
+SR_BURST       = float(os.getenv("SR_BURST", "1"))
+SR_WORKERS     = int(os.getenv("SR_WORKERS", "4"))
+SR_MAX_429     = int(os.getenv("SR_MAX_429", "5"))       # reintentos por petición ante 429
+UPSERT_BATCH   = int(os.getenv("UPSERT_BATCH", "5000"))   # filas long por execute_values
 SEASON_IDS_CSV = os.getenv("SEASON_IDS_CSV", "")         # opcional: "sr:season:123,sr:season:456"
 COMPS_CSV      = os.getenv("COMPETITIONS_CSV", "")       # opcional: "sr:competition:111,sr:competition:222"
 
@@ -23,9 +36,34 @@ OVERRIDE_SEASON_IDS = [s.strip() for s in SEASON_IDS_CSV.split(",") if s.strip()
 OVERRIDE_COMPETITIONS = [c.strip() for c in COMPS_CSV.split(",") if c.strip()]
 
 # ==== Helpers HTTP / parsing ====
+# Un único limitador para todos los hilos: solo consumen token las peticiones
+# que van a la red (lo servido desde la caché en disco no gasta cuota)
+LIMITER = TokenBucket(SR_QPS, burst=SR_BURST)
+
+class _LimitedSession:
+    """`get` con token-bucket y reintento en 429 (el limitador baja el ritmo)."""
+    def __init__(self):
+        self._s = requests.Session()
+
+    def get(self, url, **kw):
+        for attempt in range(SR_MAX_429 + 1):
+            LIMITER.acquire()
+            r = self._s.get(url, **kw)
+            if r.status_code != 429 or attempt == SR_MAX_429:
+                if r.status_code < 400:
+                    LIMITER.success()
+                return r
+            ra = r.headers.get("Retry-After")
+            LIMITER.throttle(float(ra) if ra and ra.isdigit() else None)
+            print(f"[WARN] 429 de SR; ritmo reducido a {LIMITER.rate:.2f} req/s")
+        return r
+
+SESSION = _LimitedSession()
+
 def sr_get(path, expect_ok=True):
     url = f"{BASE_URL}{path}"
-    r = requests.get(url, headers={"accept":"application/json","x-api-key":SR_API_KEY}, timeout=30)
+    r, _src = SRDC.cached_get(url, headers={"accept":"application/json","x-api-key":SR_API_KEY},
+                              timeout=30, session=SESSION)
     if expect_ok and r.status_code != 200:
         raise RuntimeError(f"SR {r.status_code}: {r.text[:200]}")
     return r.json()
@@ -97,7 +135,10 @@ def get_season_name(sid):
 # ==== 3) Descargar summaries de una season con fix ====
 def fetch_season_summaries(season_id):
     data = sr_get(f"/seasons/{season_id}/summaries.json")
-    rows = []
+    return list(iter_long_rows(data, season_id))
+
+def iter_long_rows(data, season_id):
+    """Normaliza un summaries.json a filas long (dos por partido), según se recorre."""
     for ev in data.get("summaries", []) or []:
         st_obj = ev.get("sport_event_status", {}) or {}
         status = st_obj.get("status")
@@ -138,9 +179,8 @@ def fetch_season_summaries(season_id):
         p_id, o_id = ids[0], ids[1]
 
         # Formato long: dos filas por partido
-        rows.append((dt, p_id, o_id, w_id, tname, surface, ext_season_id, ext_event_id))
-        rows.append((dt, o_id, p_id, w_id, tname, surface, ext_season_id, ext_event_id))
-    return rows
+        yield (dt, p_id, o_id, w_id, tname, surface, ext_season_id, ext_event_id)
+        yield (dt, o_id, p_id, w_id, tname, surface, ext_season_id, ext_event_id)
 
 # ==== 4) UPSERT en BD ====
 UPSERT_SQL = """
@@ -172,6 +212,13 @@ def ensure_base_tables(conn):
           updated_at timestamptz default now()
         );
         """)
+        # Resueltas al ingerir por el trigger de sql/migrations/2026_10_19_matches_long_tourney_cols.sql
+        cur.execute("""
+        alter table public.matches_long_base
+          add column if not exists tourney_key text,
+          add column if not exists tourney_surface text,
+          add column if not exists speed_bucket text;
+        """)
         cur.execute("""
         create unique index if not exists matches_long_base_uniq
           on public.matches_long_base (ext_event_id, player_id);
@@ -180,7 +227,8 @@ def ensure_base_tables(conn):
         cur.execute("""
         create or replace view public.fs_matches_long as
         select match_date, player_id, opponent_id, winner_id,
-               tournament_name, surface, ext_season_id, ext_event_id
+               tournament_name, surface, ext_season_id, ext_event_id,
+               tourney_key, tourney_surface, speed_bucket
         from public.matches_long_base;
         """)
     conn.commit()
@@ -188,6 +236,8 @@ def ensure_base_tables(conn):
 def upsert_matches_long_base(conn, rows):
     if not rows:
         return 0
+    # ON CONFLICT no admite dos filas con la misma clave en una sentencia
+    rows = list({(r[7], r[1]): r for r in rows}.values())
     with conn.cursor() as cur:
         execute_values(cur, UPSERT_SQL, rows, page_size=2000)
     conn.commit()
@@ -215,35 +265,58 @@ def main():
         else:
             print(f"[INFO] Competitions provistas: {len(comp_ids)}")
 
-        seen = set()
-        for cid in comp_ids:
-            try:
-                seas = seasons_2025_for_competition(cid)
-                for s in seas:
-                    if s["id"] not in seen:
-                        season_ids.append(s["id"])
-                        seen.add(s["id"])
-            except Exception as e:
-                print(f"[WARN] No se pudo leer seasons de {cid}: {e}")
-            time.sleep(RATE_SLEEP)
+        # Seasons de cada competition en paralelo (el limitador marca el ritmo)
+        with ThreadPoolExecutor(max_workers=SR_WORKERS) as pool:
+            futs = {pool.submit(seasons_2025_for_competition, cid): cid for cid in comp_ids}
+            for fut in as_completed(futs):
+                try:
+                    season_ids.extend(s["id"] for s in fut.result())
+                except Exception as e:
+                    print(f"[WARN] No se pudo leer seasons de {futs[fut]}: {e}")
         season_ids = sorted(set(season_ids))
 
-    print(f"[INFO] Seasons 2025 a cargar: {len(season_ids)}")
+    print(f"[INFO] Seasons 2025 a cargar: {len(season_ids)} ({SR_WORKERS} workers, {SR_QPS:.2f} req/s)")
 
-    # 2) Descargar summaries y upsert
+    # 2) Descargar summaries en paralelo; el hilo principal normaliza según
+    #    llegan y hace upsert por lotes de UPSERT_BATCH filas
     total = 0
-    for sid in season_ids:
+    failed = 0
+    buf, buf_sids = [], []
+    t0 = time.monotonic()
+
+    def flush():
+        nonlocal total, failed, buf, buf_sids
         try:
-            rows = fetch_season_summaries(sid)
-            n = upsert_matches_long_base(conn, rows)
-            total += n
-            print(f"[OK] {sid}: {n} filas long (2 por partido) upserted")
+            total += upsert_matches_long_base(conn, buf)
         except Exception as e:
-            print(f"[ERR] {sid}: {e}")
-        time.sleep(RATE_SLEEP)
+            conn.rollback()
+            failed += len(buf_sids)
+            print(f"[ERR] upsert de {len(buf)} filas falló ({e}); seasons del lote: {', '.join(buf_sids)}")
+        buf, buf_sids = [], []
+
+    with ThreadPoolExecutor(max_workers=SR_WORKERS) as pool:
+        futs = {pool.submit(sr_get, f"/seasons/{sid}/summaries.json"): sid for sid in season_ids}
+        for fut in as_completed(futs):
+            # fuera del dict: el JSON de la season se libera al normalizarla
+            sid = futs.pop(fut)
+            try:
+                rows = list(iter_long_rows(fut.result(), sid))
+                buf.extend(rows)
+                buf_sids.append(sid)
+                print(f"[OK] {sid}: {len(rows)} filas long (2 por partido)")
+            except Exception as e:
+                print(f"[ERR] {sid}: {e}")
+            if len(buf) >= UPSERT_BATCH:
+                flush()
+    if buf:
+        flush()
 
     conn.close()
-    print(f"[DONE] Total filas long insertadas/actualizadas: {total}")
+    print(f"[DONE] Total filas long insertadas/actualizadas: {total} "
+          f"en {time.monotonic() - t0:.1f}s (limitador: {LIMITER.stats()})")
+    if failed:
+        print(f"[WARN] {failed} seasons no se guardaron (ver [ERR] de upsert)", file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
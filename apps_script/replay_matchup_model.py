@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Replay offline del modelo de /matchup sobre matches_full (sin Sportradar).
+
+Lee matches_full + rankings_snapshot_v2 de una vez, reconstruye as-of las
+features NOW y HIST de cada partido (utils/replay_engine.py), puntúa todos
+con el scoring de producción y escribe métricas + CSV por partido.
+
+ENV:
+  DATABASE_URL     conexión Postgres (obligatoria)
+  REPLAY_YEARS     ventana HIST en años (4, como /matchup)
+  REPLAY_FROM      evaluar solo partidos desde esta fecha (YYYY-MM-DD)
+  REPLAY_CSV       salida por partido (replay_matchup.csv; vacío = no escribir)
+  SUPABASE_URL/KEY si están, superficie/velocidad/país del torneo salen de
+                   FS.TOURNEYS como en /matchup; si no, de la superficie del partido
+"""
+import os, sys, json, pathlib, time, datetime
+
+import psycopg2
+import pandas as pd
+
+try:
+    from utils import replay_engine as RE
+except ImportError:
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from utils import replay_engine as RE
+from services import supabase_fs as FS
+
+DATABASE_URL = os.environ["DATABASE_URL"]
+SCHEMA       = os.getenv("REPLAY_SCHEMA", "estratego_v1")
+YEARS_BACK   = int(os.getenv("REPLAY_YEARS", "4") or 4)
+REPLAY_FROM  = os.getenv("REPLAY_FROM", "").strip()
+OUT_CSV      = os.getenv("REPLAY_CSV", "replay_matchup.csv").strip()
+
+# match_id de rankings_snapshot_v2 = año_tourney_id_match_num (load_matches_full_improved)
+SQL = f"""
+SELECT m.tourney_id, m.tourney_name, m.surface, m.tourney_date, m.match_num, m.round,
+       m.winner_id, m.loser_id,
+       COALESCE(rw.rank, m.winner_rank) AS winner_rank,
+       COALESCE(rl.rank, m.loser_rank)  AS loser_rank,
+       m.winner_ioc, m.loser_ioc
+FROM {SCHEMA}.matches_full m
+LEFT JOIN {SCHEMA}.rankings_snapshot_v2 rw
+  ON rw.match_id = left(m.tourney_date::text, 4) || '_' || m.tourney_id || '_' || COALESCE(m.match_num, 0)
+ AND rw.side = 'winner' AND rw.player_id = m.winner_id
+LEFT JOIN {SCHEMA}.rankings_snapshot_v2 rl
+  ON rl.match_id = left(m.tourney_date::text, 4) || '_' || m.tourney_id || '_' || COALESCE(m.match_num, 0)
+ AND rl.side = 'loser' AND rl.player_id = m.loser_id
+WHERE m.winner_id IS NOT NULL AND m.loser_id IS NOT NULL AND m.tourney_date IS NOT NULL
+"""
+
+def main():
+    t0 = time.perf_counter()
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+    t_load = time.perf_counter() - t0
+
+    meta_of = country_of = None
+    if FS.SUPABASE_URL and FS.TOURNEYS.loaded:
+        meta_of, country_of = FS.TOURNEYS.meta, FS.TOURNEYS.country
+    since = datetime.date.fromisoformat(REPLAY_FROM) if REPLAY_FROM else None
+
+    t1 = time.perf_counter()
+    feats = RE.replay_features(rows, years_back=YEARS_BACK, meta_of=meta_of,
+                               country_of=country_of, since=since)
+    p, deltas = RE.score(feats)
+    res = RE.evaluate(feats, p)
+    print(f"Replay: {len(rows)} partidos leídos en {t_load:.2f}s; "
+          f"{feats['n']} puntuados en {time.perf_counter() - t1:.2f}s "
+          f"(torneos: {'registro' if meta_of else 'superficie del partido'})")
+    print("== SUMMARY ==")
+    print(json.dumps(res, indent=2))
+
+    if OUT_CSV:
+        df = pd.DataFrame({k: v for k, v in feats.items() if k != "n"})
+        for name, d in deltas.items():
+            df[f"d_{name}"] = d
+        df["prob_player"] = p
+        df.to_csv(OUT_CSV, index=False)
+        print(f"Saved: {OUT_CSV}")
+
+if __name__ == "__main__":
+    main()
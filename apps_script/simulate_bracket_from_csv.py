@@ -1,6 +1,11 @@
 # apps_script/simulate_bracket_from_csv.py
 import csv, json, os, random, unicodedata, urllib.request
 
+try:
+    from apps_script import bracket_engine as BE
+except ImportError:  # ejecutado como script: apps_script/ ya está en sys.path
+    import bracket_engine as BE
+
 API = os.environ.get("API_URL", "http://127.0.0.1:8080/matchup")
 CSV_IN = os.environ.get("ENTRANTS_CSV", "data/entrants.csv")
 MAP_CSV = os.environ.get("MAP_CSV", "data/players_sr_map.csv")  # Name;Player ID (sr:competitor:XXXXX)
@@ -8,8 +13,12 @@ MAP_CSV = os.environ.get("MAP_CSV", "data/players_sr_map.csv")  # Name;Player ID
 TOURNAMENT = {"name": os.environ.get("TNAME", "Cincinnati"),
               "month": int(os.environ.get("TMONTH", "8"))}
 YEARS_BACK = int(os.environ.get("YEARS_BACK", "4"))
-MODE = (os.environ.get("MODE", "deterministic") or "deterministic").lower()
+MODE = (os.environ.get("MODE", "deterministic") or "deterministic").lower()  # deterministic | mc | exact
 MC_RUNS = int(os.environ.get("MC_RUNS", "0") or 0)
+# mc: "matrix" = una petición a /matchup/matrix y simulación local con NumPy;
+#     "http"   = un /matchup por partido y realización (modo anterior)
+MC_ENGINE = (os.environ.get("MC_ENGINE", "matrix") or "matrix").lower()
+MC_SEED = int(os.environ["MC_SEED"]) if os.environ.get("MC_SEED") else None
 
 # controles de red
 CALL_TIMEOUT = float(os.environ.get("CALL_TIMEOUT", "8"))   # segundos
@@ -45,29 +54,138 @@ NAME2SR = load_name_to_sr(MAP_CSV)
 import time
 from urllib.error import URLError, HTTPError
 
-def call_matchup(payload: dict, timeout=None):
-    if timeout is None:
-        timeout = CALL_TIMEOUT
-    clean = {k: v for k, v in payload.items() if v is not None}
-    data = json.dumps(clean).encode("utf-8")
-    req  = urllib.request.Request(API, data=data, headers={"Content-Type":"application/json"})
+API_BATCH = os.environ.get("API_BATCH_URL", API.rstrip("/") + "/batch")
+BATCH_TIMEOUT = float(os.environ.get("BATCH_TIMEOUT", "120"))  # segundos por ronda
+
+def _post_json(url: str, payload: dict, timeout: float) -> dict:
+    data = json.dumps(payload).encode("utf-8")
+    req  = urllib.request.Request(url, data=data, headers={"Content-Type":"application/json"})
     backoff = BACKOFF_BASE
     for attempt in range(CALL_RETRIES + 1):
         try:
             with urllib.request.urlopen(req, timeout=timeout) as resp:
                 return json.loads(resp.read().decode("utf-8"))
-        except (TimeoutError, URLError, HTTPError) as e:
+        except (TimeoutError, URLError, HTTPError):
             if attempt < CALL_RETRIES:
                 time.sleep(backoff)
                 backoff *= 2.0
                 continue
-            # último intento fallido → responder “neutro” para no romper el bracket
-            return {
-                "ok": False,
-                "prob_player": 0.5,
-                "inputs": clean,
-                "error": f"{type(e).__name__}: {getattr(e,'reason',getattr(e,'code',''))}"
-            }
+            raise
+
+def call_matchup(payload: dict, timeout=None):
+    if timeout is None:
+        timeout = CALL_TIMEOUT
+    clean = {k: v for k, v in payload.items() if v is not None}
+    try:
+        return _post_json(API, clean, timeout)
+    except (TimeoutError, URLError, HTTPError) as e:
+        # último intento fallido → responder “neutro” para no romper el bracket
+        return {
+            "ok": False,
+            "prob_player": 0.5,
+            "inputs": clean,
+            "error": f"{type(e).__name__}: {getattr(e,'reason',getattr(e,'code',''))}"
+        }
+
+def call_matchup_batch(pairs: list[dict]) -> list[dict] | None:
+    """Una sola petición a /matchup/batch; None si el servidor no la soporta o falla."""
+    body = {"tournament": TOURNAMENT, "years_back": YEARS_BACK,
+            "pairs": [{k: v for k, v in p.items() if v is not None} for p in pairs]}
+    try:
+        out = _post_json(API_BATCH, body, BATCH_TIMEOUT)
+    except (TimeoutError, URLError, HTTPError) as e:
+        print(f"WARN /matchup/batch no disponible ({type(e).__name__}) → llamadas por partido", flush=True)
+        return None
+    results = out.get("results") if isinstance(out, dict) else None
+    if not isinstance(results, list) or len(results) != len(pairs):
+        return None
+    return results
+
+API_MATRIX = os.environ.get("API_MATRIX_URL", API.rstrip("/") + "/matrix")
+
+def call_matrix(entrants: list[dict]) -> dict | None:
+    """Matriz P(i gana a j) de todo el cuadro en una petición; None si falla."""
+    ents = []
+    for e in entrants:
+        pa = build_participant(e)
+        ents.append({k: v for k, v in {"player_id": pa["player_id"], "player": pa["player"]}.items() if v is not None})
+    body = {"tournament": TOURNAMENT, "years_back": YEARS_BACK, "entrants": ents}
+    try:
+        out = _post_json(API_MATRIX, body, BATCH_TIMEOUT)
+    except (TimeoutError, URLError, HTTPError) as e:
+        print(f"WARN /matchup/matrix no disponible ({type(e).__name__}) → MC por HTTP", flush=True)
+        return None
+    if not isinstance(out, dict) or len(out.get("matrix") or []) != len(entrants):
+        return None
+    stats = out.get("stats") or {}
+    if stats.get("degraded"):
+        print(f"WARN /matchup/matrix con señales neutras por fallo/plazo: {stats.get('fallbacks')}", flush=True)
+    return out
+
+# Probabilidad por pareja, compartida entre rondas e iteraciones MC.
+# El modelo es simétrico: P(b gana a a) = 1 - P(a gana a b).
+_PAIR_MEMO: dict[tuple, dict] = {}
+
+def _entry_key(e: dict):
+    return e.get("id") or e.get("name")
+
+def _flip(r: dict) -> dict:
+    inp = r.get("inputs", {}) or {}
+    return {**r,
+            "prob_player": 1.0 - float(r.get("prob_player", 0.5)),
+            "inputs": {**inp,
+                       "player_id": inp.get("opponent_id"), "opponent_id": inp.get("player_id"),
+                       "player_sr_id": inp.get("opponent_sr_id"), "opponent_sr_id": inp.get("player_sr_id")}}
+
+def _memo_get(a: dict, b: dict):
+    ka, kb = _entry_key(a), _entry_key(b)
+    if (ka, kb) in _PAIR_MEMO:
+        return _PAIR_MEMO[(ka, kb)]
+    if (kb, ka) in _PAIR_MEMO:
+        return _flip(_PAIR_MEMO[(kb, ka)])
+    return None
+
+def _pair_payload(a: dict, b: dict) -> dict:
+    pa = build_participant(a)
+    pb = build_participant(b)
+    return {
+        "player_id": pa["player_id"], "player": pa["player"],
+        "opponent_id": pb["player_id"], "opponent": pb["player"],
+    }
+
+def matchup_results(pairs: list[tuple]) -> list[dict]:
+    """Resultados de /matchup para `pairs`; las parejas nuevas van en un único batch."""
+    todo = []
+    seen = set()
+    failed = {}
+    for a, b in pairs:
+        key = frozenset((_entry_key(a), _entry_key(b)))
+        if _memo_get(a, b) is None and key not in seen:
+            seen.add(key)
+            todo.append((a, b))
+
+    if todo:
+        for a, b in todo:
+            print(f"[{TOURNAMENT['name']}] {a.get('name') or a.get('id')} vs {b.get('name') or b.get('id')}...", flush=True)
+        payloads = [_pair_payload(a, b) for a, b in todo]
+        results = call_matchup_batch(payloads)
+        if results is None:
+            results = [call_matchup({**p, "tournament": TOURNAMENT, "years_back": YEARS_BACK}) for p in payloads]
+        for (a, b), r in zip(todo, results):
+            if r.get("ok", True) and not r.get("degraded"):
+                _PAIR_MEMO[(_entry_key(a), _entry_key(b))] = r
+            else:
+                # respuesta neutra o con entradas de relleno (plazo/fallo en el servidor):
+                # no se memoiza, se reintenta en la siguiente ronda/iteración
+                failed[frozenset((_entry_key(a), _entry_key(b)))] = r
+
+    out = []
+    for a, b in pairs:
+        r = _memo_get(a, b)
+        if r is None:
+            r = failed.get(frozenset((_entry_key(a), _entry_key(b)))) or {"ok": False, "prob_player": 0.5}
+        out.append(r)
+    return out
 
 
 def read_entrants(path):
@@ -113,17 +231,7 @@ def round_pairs(players):
 def play_round(players, use_seeds, sample=False):
     pairs = first_round_pairs_by_seed(players) if use_seeds else round_pairs(players)
     results=[]; winners=[]; unresolved=[]
-    for a,b in pairs:
-        pa = build_participant(a)
-        pb = build_participant(b)
-        payload = {
-            "player_id": pa["player_id"], "player": pa["player"],
-            "opponent_id": pb["player_id"], "opponent": pb["player"],
-            "tournament": TOURNAMENT, "years_back": YEARS_BACK
-        }
-        print(f"[{TOURNAMENT['name']}] {a.get('name') or a.get('id')} vs {b.get('name') or b.get('id')}...", flush=True)
-
-        r = call_matchup(payload)  # ya trae reintentos/backoff
+    for (a,b), r in zip(pairs, matchup_results(pairs)):
         prob_a = float(r.get("prob_player", 0.5))
 
         # Capturar IDs resueltos desde el backend (si vino respuesta)
@@ -178,9 +286,68 @@ def write_matches_csv(bracket, path):
                     m["prob_a"], m["winner"]
                 ])
 
+def simulate_mc_matrix(entrants, mat: dict) -> dict:
+    """MC local (bracket_engine) sobre la matriz de /matchup/matrix."""
+    P = mat["matrix"]
+    use_seeds = all(p.get("seed") is not None for p in entrants)
+    order = BE.seeded_order(entrants, use_seeds)
+    res = BE.simulate(P, order, MC_RUNS, seed=MC_SEED)
+    example = BE.bracket_rounds(P, order, res["sample"], entrants, mat.get("entrants"))
+    champ0 = entrants[res["sample"][-1][0]]
+    probs = [{"id": e.get("id"), "name": e.get("name"), "seed": e.get("seed"),
+              "p_champion": float(res["champion"][i])} for i, e in enumerate(entrants)]
+    return {"ok": True, "mode": "mc", "engine": "matrix", "mc_runs": MC_RUNS,
+            "tournament": TOURNAMENT, "years_back": YEARS_BACK,
+            "champion_probs": sorted(probs, key=lambda x: x["p_champion"], reverse=True),
+            "reach_probs": BE.reach_table(res, entrants),
+            "example_bracket": example, "example_champion": champ0}
+
+def matrix_from_pairs(entrants) -> dict:
+    """Matriz P(i gana a j) con /matchup/batch (o /matchup) si no hay /matchup/matrix."""
+    n = len(entrants)
+    idx = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    P = [[0.5] * n for _ in range(n)]
+    resolved = [{} for _ in range(n)]
+    for (i, j), r in zip(idx, matchup_results([(entrants[i], entrants[j]) for i, j in idx])):
+        p = float(r.get("prob_player", 0.5))
+        P[i][j], P[j][i] = p, 1.0 - p
+        inp = r.get("inputs", {}) or {}
+        resolved[i] = resolved[i] or {"player_id": inp.get("player_id"), "player_sr_id": inp.get("player_sr_id")}
+        resolved[j] = resolved[j] or {"player_id": inp.get("opponent_id"), "player_sr_id": inp.get("opponent_sr_id")}
+    return {"matrix": P, "entrants": resolved}
+
+def simulate_exact(entrants, mat: dict) -> dict:
+    """Probabilidades exactas de ganar cada ronda (programación dinámica), sin muestreo."""
+    P = mat["matrix"]
+    use_seeds = all(p.get("seed") is not None for p in entrants)
+    order = BE.seeded_order(entrants, use_seeds)
+    res = BE.exact(P, order)
+    probs = [{"id": e.get("id"), "name": e.get("name"), "seed": e.get("seed"),
+              "p_champion": float(res["champion"][i])} for i, e in enumerate(entrants)]
+    # Cuadro de referencia para el HTML/CSV: el favorito avanza en cada cruce
+    bracket = BE.bracket_rounds(P, order, BE.deterministic(P, order), entrants, mat.get("entrants"))
+    champ = entrants[max(range(len(entrants)), key=lambda i: res["champion"][i])]
+    return {"ok": True, "mode": "exact", "tournament": TOURNAMENT, "years_back": YEARS_BACK,
+            "champion_probs": sorted(probs, key=lambda x: x["p_champion"], reverse=True),
+            "reach_probs": BE.reach_table(res, entrants),
+            "bracket": bracket, "champion": champ}
+
 def main():
     entrants = read_entrants(CSV_IN)
-    if MODE == "mc" and MC_RUNS > 0:
+    if MODE == "exact":
+        mat = call_matrix(entrants) or matrix_from_pairs(entrants)
+        out = simulate_exact(entrants, mat)
+        print("== BRACKET (exacto) =="); print(json.dumps(out, indent=2))
+        write_matches_csv(out["bracket"], "/tmp/bracket_matches.csv")
+        with open("/tmp/bracket.json","w",encoding="utf-8") as f: json.dump(out,f,ensure_ascii=False,indent=2)
+        return
+    mat = call_matrix(entrants) if (MODE == "mc" and MC_RUNS > 0 and MC_ENGINE == "matrix") else None
+    if mat is not None:
+        out = simulate_mc_matrix(entrants, mat)
+        print("== BRACKET (MC, matriz) =="); print(json.dumps(out, indent=2))
+        write_matches_csv(out["example_bracket"], "/tmp/bracket_matches.csv")
+        with open("/tmp/bracket.json","w",encoding="utf-8") as f: json.dump(out,f,ensure_ascii=False,indent=2)
+    elif MODE == "mc" and MC_RUNS > 0:
         wins = { (e["name"] or e["id"]):0 for e in entrants }
         example=None; champ0=None
         for _ in range(MC_RUNS):
@@ -1,20 +1,30 @@
 from __future__ import annotations
 
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 import json
 import logging
 import os
 import re
+import threading
+import time
 import urllib.parse
-from typing import Any
+from typing import Any, Callable
 
 from flask import Flask, Response, jsonify, request, render_template
+import numpy as np
 import requests
 
 # Servicios/Utilidades
+from services import http_client as HTTP
 from services import sportradar_now as SR
 from services import supabase_fs as FS
-from utils.scoring import ADJUSTS, WEIGHTS, clamp, logistic
+from utils.scoring import (
+    ADJUSTS, HIST_W_MONTH, HIST_W_SPEED, HIST_W_SURF, MODEL_VERSION, WEIGHTS,
+    adjust_np, clamp, logistic, logistic_np,
+    matchup_deltas_np, matchup_z_np,
+)
+from utils.ttl_cache import TTLCache
 from apps_script.prematch_bp import bp as prematch_bp  # 👈 ruta correcta al paquete
 
 
@@ -53,21 +63,35 @@ def _sr_url(path: str, params: dict[str, Any] | None = None) -> str:
     return f"{SR_BASE}/{path}?{urllib.parse.urlencode(params)}"
 
 def _sr_get(path: str, params: dict[str, Any] | None = None, timeout=15) -> requests.Response:
-    url = _sr_url(path, params)
-    redacted = re.sub(r'api_key=[^&]+', 'api_key=***', url)
-    app.logger.info("SR GET %s", redacted)
-    try:
-        r = requests.get(url, timeout=timeout, headers={"accept": "application/json"})
-        r.raise_for_status()
-    except requests.RequestException:
-        app.logger.exception("SR GET failed %s", redacted)
-        raise
-    app.logger.info(
-        "SR RESP %s (ratelimit-remaining=%s)",
-        r.status_code,
-        r.headers.get("x-ratelimit-remaining"),
-    )
-    return r
+    def _fetch() -> requests.Response:
+        url = _sr_url(path, params)
+        redacted = re.sub(r'api_key=[^&]+', 'api_key=***', url)
+        app.logger.info("SR GET %s", redacted)
+        try:
+            r = HTTP.get(url, timeout=timeout, headers={"accept": "application/json"})
+            r.raise_for_status()
+        except requests.RequestException:
+            app.logger.exception("SR GET failed %s", redacted)
+            raise
+        app.logger.info(
+            "SR RESP %s (ratelimit-remaining=%s)",
+            r.status_code,
+            r.headers.get("x-ratelimit-remaining"),
+        )
+        return r
+    # Caché compartida con services/sportradar_now (clave path+params, TTL por endpoint)
+    return SR.cached_fetch(path, params, _fetch)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return jsonify({
+        "sr_responses": SR.cache_stats(),
+        "matchup_l1": FS.MATCHUP_L1.stats(),
+        "matchup_matrix": MATRIX_CACHE.stats(),
+        "pg_pool": FS.pg_pool_stats(),
+        "tourney_registry": FS.TOURNEYS.stats(),
+        "write_behind": FS.WRITES.stats(),
+    }), 200
 
 # -----------------------------------------------------------------------------
 # ENDPOINT '/' (evaluador original)
@@ -450,10 +474,7 @@ def obtener_proximos_partidos(season_id: str) -> list[dict]:
 PLAYER_TABLE_SRID = "players_lookup"  # public -> (player_id INT, name, ext_sportradar_id)
 PLAYER_TABLE_NAME = "players_min"     # public -> (player_id INT, name)
 
-# Pesos HIST calibrados (se pueden sobreescribir por ENV)
-HIST_W_MONTH = float(os.getenv("HIST_W_MONTH", "0.5"))
-HIST_W_SURF  = float(os.getenv("HIST_W_SURF",  "2.0"))
-HIST_W_SPEED = float(os.getenv("HIST_W_SPEED", "2.0"))
+# Pesos HIST calibrados (ENV HIST_W_*; definidos en utils/scoring.py)
 _HIST_DENOM  = max(1.0, abs(HIST_W_MONTH) + abs(HIST_W_SURF) + abs(HIST_W_SPEED))
 
 def _sr_short_to_int_any(v):
@@ -470,7 +491,7 @@ def _rest_get(table: str, params: dict, select: str = "*"):
     base = FS.SUPABASE_URL.rstrip("/") + "/rest/v1/" + table
     q = {"select": select}; q.update(params or {})
     url = base + "?" + urllib.parse.urlencode(q, doseq=True)
-    r = requests.get(url, headers=FS.HEADERS_SB, timeout=FS.HTTP_TIMEOUT)
+    r = HTTP.get(url, headers=FS.HEADERS_SB, timeout=FS.HTTP_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -531,6 +552,226 @@ def _tourney_meta_fallback(tname: str) -> dict:
     except Exception:
         return {}
 
+def _tourney_meta(tname: str) -> dict:
+    try:
+        meta = FS.get_tourney_meta(tname) or {}
+    except Exception:
+        meta = {}
+    if not meta:
+        meta = _tourney_meta_fallback(tname) or {}
+    return meta
+
+# -----------------------------------------------------------------------------
+# Fan-out concurrente (opcional) de las llamadas independientes de /matchup
+# -----------------------------------------------------------------------------
+MATCHUP_FANOUT = os.getenv("MATCHUP_FANOUT", "0").lower() in ("1", "true", "yes")
+MATCHUP_FANOUT_WORKERS = int(os.getenv("MATCHUP_FANOUT_WORKERS", "16"))
+MATCHUP_FANOUT_DEADLINE_SECS = float(os.getenv("MATCHUP_FANOUT_DEADLINE_SECS", "10"))
+# /matchup/batch y /matchup/matrix usan su propio pool: cientos de tareas de
+# una petición grande no dejan sin hilos a los /matchup concurrentes
+MATCHUP_BULK_WORKERS = int(os.getenv("MATCHUP_BULK_WORKERS", "16"))
+
+_POOLS: dict[str, ThreadPoolExecutor] = {}
+_POOLS_LOCK = threading.Lock()
+
+def _named_pool(name: str, workers: int) -> ThreadPoolExecutor:
+    pool = _POOLS.get(name)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(name)
+            if pool is None:
+                pool = _POOLS[name] = ThreadPoolExecutor(
+                    max_workers=max(1, workers),
+                    thread_name_prefix=name,
+                )
+    return pool
+
+def _fanout_pool() -> ThreadPoolExecutor:
+    return _named_pool("matchup-fanout", MATCHUP_FANOUT_WORKERS)
+
+def _bulk_pool() -> ThreadPoolExecutor:
+    return _named_pool("matchup-bulk", MATCHUP_BULK_WORKERS)
+
+def _await(fut: Future, default: Any, deadline: float, name: str) -> Any:
+    try:
+        return fut.result(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception as e:
+        fut.cancel()
+        app.logger.warning("fan-out %s sin resultado (%s): uso valor neutro", name, type(e).__name__)
+        return default
+
+def _fanout(tasks: dict[str, Callable[[], Any]], defaults: dict[str, Any], deadline: float,
+            missed: set | None = None, pool: ThreadPoolExecutor | None = None) -> dict[str, Any]:
+    """
+    Lanza `tasks` en el pool acotado (por defecto el de /matchup) y espera
+    hasta `deadline` (monotonic). Cada tarea que falle o no termine a tiempo
+    toma su valor de `defaults` y, si se pasa `missed`, su nombre se añade ahí.
+    """
+    return _fanout_collect(_fanout_submit(tasks, pool), defaults, deadline, missed)
+
+def _fanout_submit(tasks: dict[Any, Callable[[], Any]],
+                   pool: ThreadPoolExecutor | None = None) -> dict[Any, Future]:
+    if not tasks:
+        return {}
+    pool = pool or _fanout_pool()
+    return {name: pool.submit(fn) for name, fn in tasks.items()}
+
+_MISSED = object()
+
+def _fanout_collect(futures: dict[Any, Future], defaults: dict[Any, Any], deadline: float,
+                    missed: set | None = None) -> dict[Any, Any]:
+    out = dict(defaults)
+    if not futures:
+        return out
+    wait(list(futures.values()), timeout=max(0.0, deadline - time.monotonic()))
+    for name, fut in futures.items():
+        val = _await(fut, _MISSED, deadline, name)
+        if val is _MISSED:
+            val = defaults.get(name)
+            if missed is not None:
+                missed.add(name)
+        out[name] = val
+    return out
+
+# /matchup/batch y /matchup/matrix lanzan muchas más llamadas que /matchup:
+# su plazo crece con las tandas del pool (llamadas / workers), con tope
+MATCHUP_BULK_SECS_PER_ROUND = float(os.getenv("MATCHUP_BULK_SECS_PER_ROUND", "2"))
+MATCHUP_BULK_DEADLINE_MAX_SECS = float(os.getenv("MATCHUP_BULK_DEADLINE_MAX_SECS", "120"))
+
+def _bulk_deadline(calls: int) -> float:
+    rounds = -(-max(0, calls) // max(1, MATCHUP_BULK_WORKERS))
+    secs = MATCHUP_FANOUT_DEADLINE_SECS + rounds * MATCHUP_BULK_SECS_PER_ROUND
+    return time.monotonic() + max(MATCHUP_FANOUT_DEADLINE_SECS, min(secs, MATCHUP_BULK_DEADLINE_MAX_SECS))
+
+def _now_defaults() -> dict[str, Any]:
+    # Valores neutros (los mismos que usa el modo secuencial cuando algo falla)
+    return {
+        "profile_p": {}, "profile_o": {},
+        "last10_p": [], "last10_o": [],
+        "ytd_p": {"wins": 0, "losses": 0}, "ytd_o": {"wins": 0, "losses": 0},
+        "h2h": (0, 0),
+    }
+
+def _now_tasks(p_sr_norm: str | None, o_sr_norm: str | None) -> dict[str, Callable[[], Any]]:
+    tasks: dict[str, Callable[[], Any]] = {}
+    if p_sr_norm:
+        tasks["profile_p"] = lambda: SR.get_profile(p_sr_norm)
+    if o_sr_norm:
+        tasks["profile_o"] = lambda: SR.get_profile(o_sr_norm)
+    if p_sr_norm:
+        tasks["last10_p"] = lambda: SR.get_last10(p_sr_norm)
+    if o_sr_norm:
+        tasks["last10_o"] = lambda: SR.get_last10(o_sr_norm)
+    if p_sr_norm:
+        tasks["ytd_p"] = lambda: SR.get_ytd_record(p_sr_norm)
+    if o_sr_norm:
+        tasks["ytd_o"] = lambda: SR.get_ytd_record(o_sr_norm)
+    if p_sr_norm and o_sr_norm:
+        tasks["h2h"] = lambda: SR.get_h2h(p_sr_norm, o_sr_norm)
+    return tasks
+
+def _fetch_now_inputs(p_sr_norm: str | None, o_sr_norm: str | None,
+                      missed: set | None = None) -> dict[str, Any]:
+    # Secuencial: si cualquier llamada falla, todo vuelve a neutro
+    out = _now_defaults()
+    tasks = _now_tasks(p_sr_norm, o_sr_norm)
+    try:
+        out.update({name: fn() for name, fn in tasks.items()})
+    except Exception:
+        out = _now_defaults()
+        if missed is not None:
+            missed.update(tasks)
+    return out
+
+# Entradas de /matchup que tomaron el valor neutro, agrupadas como en /matchup/batch
+_FALLBACK_GROUPS = {
+    "meta": "meta", "p_int": "ids", "o_int": "ids", "p_sr": "ids", "o_sr": "ids",
+    "profile_p": "now", "profile_o": "now", "last10_p": "now", "last10_o": "now",
+    "ytd_p": "now", "ytd_o": "now", "hist": "hist", "h2h": "h2h",
+}
+
+def _fallback_groups(missed: set) -> list[str]:
+    groups = {_FALLBACK_GROUPS.get(name, name) for name in missed}
+    return [g for g in ("meta", "ids", "now", "hist", "h2h") if g in groups]
+
+def _resolve_sr_side(sr_norm: str | None, pid_int: int | None) -> str | None:
+    if sr_norm is None and isinstance(pid_int, int):
+        try:
+            return FS.get_sr_id_from_player_int(pid_int)
+        except Exception:
+            return None
+    return sr_norm
+
+def _hist_vector(p_int: int | None, o_int: int | None, years_back: int, tname: str, month: int) -> dict:
+    if p_int is None or o_int is None:
+        return {}
+    try:
+        return FS.get_matchup_hist_vector(
+            p_id=p_int, o_id=o_int, yrs=years_back, tname=tname, month=month
+        ) or {}
+    except Exception:
+        return {}
+
+def _score_matchup(body: dict, hist: dict, now_p: dict, now_o: dict, h2h: tuple[int, int]) -> dict:
+    """
+    Modelo v1: deltas NOW (SR) + HIST (Supabase) + ajustes -> prob del jugador.
+    `body` aporta los flags opcionales (country, *_country, mot_points_*).
+    """
+    h2h_w, h2h_l = h2h
+    surf_change_p = 1 if (now_p.get("last_surface") and now_p["last_surface"] != str(hist.get("surface","")).lower()) else 0
+    surf_change_o = 1 if (now_o.get("last_surface") and now_o["last_surface"] != str(hist.get("surface","")).lower()) else 0
+    is_local_p = 1 if body.get("country") and body.get("player_country") and body["country"] == body["player_country"] else 0
+    is_local_o = 1 if body.get("country") and body.get("opponent_country") and body["country"] == body["opponent_country"] else 0
+    mot_p = int(body.get("mot_points_p") or 0)
+    mot_o = int(body.get("mot_points_o") or 0)
+
+    rank_p = now_p.get("ranking_now") or 999
+    rank_o = now_o.get("ranking_now") or 999
+    d_rank_norm   = clamp((rank_o - rank_p) / 100.0, -1, 1)
+    d_ytd         = clamp(now_p["winrate_ytd"]    - now_o["winrate_ytd"],    -0.25, 0.25)
+    d_last10      = clamp(now_p["winrate_last10"] - now_o["winrate_last10"], -0.25, 0.25)
+    d_h2h         = clamp(((h2h_w + 5) / max(1, (h2h_w + h2h_l + 10))) - ((h2h_l + 5) / max(1, (h2h_w + h2h_l + 10))), -0.25, 0.25)
+    d_inactive    = clamp(-(now_p["days_inactive"] - now_o["days_inactive"]) / 30.0, -0.25, 0.25)
+
+    d_hist_surface = clamp(hist.get("d_hist_surface", 0.0), -0.25, 0.25)
+    d_hist_speed   = clamp(hist.get("d_hist_speed",   0.0), -0.25, 0.25)
+    d_hist_month   = clamp(hist.get("d_hist_month",   0.0), -0.25, 0.25)
+
+    now_linear = (
+        WEIGHTS["rank_norm"]   * d_rank_norm   +
+        WEIGHTS["ytd"]         * d_ytd         +
+        WEIGHTS["last10"]      * d_last10      +
+        WEIGHTS["h2h"]         * d_h2h         +
+        WEIGHTS["inactive"]    * d_inactive
+    )
+    hist_linear = (
+        HIST_W_MONTH * d_hist_month +
+        HIST_W_SURF  * d_hist_surface +
+        HIST_W_SPEED * d_hist_speed
+    ) / _HIST_DENOM
+
+    adj = 0.0
+    adj += ADJUSTS["surf_change"] * (surf_change_p - surf_change_o)
+    adj += ADJUSTS["local"]       * (is_local_p - is_local_o)
+    adj += ADJUSTS["mot_points"]  * (mot_p - mot_o)
+
+    z = now_linear + hist_linear + adj
+    return {
+        "prob_player": logistic(z),
+        "features": {
+            "deltas": {
+                "rank_norm": d_rank_norm,
+                "ytd": d_ytd, "last10": d_last10, "h2h": d_h2h, "inactive": d_inactive,
+                "hist_surface": d_hist_surface, "hist_speed": d_hist_speed, "hist_month": d_hist_month
+            },
+            "flags": {
+                "surf_change_p": surf_change_p, "surf_change_o": surf_change_o,
+                "is_local_p": is_local_p, "is_local_o": is_local_o, "mot_p": mot_p, "mot_o": mot_o
+            }
+        },
+        "components": {"now_linear": now_linear, "hist_linear": hist_linear, "adj": adj, "z": z},
+    }
+
 def _compute_matchup_payload(body: dict) -> dict:
     years_back = int(body.get("years_back", 4))
     tourney = body.get("tournament", {}) or {}
@@ -544,20 +785,30 @@ def _compute_matchup_payload(body: dict) -> dict:
     player  = body.get("player")
     opponent= body.get("opponent")
 
-    p_int = _resolve_id(p_id_in, player, p_sr_id)
-    o_int = _resolve_id(o_id_in, opponent, o_sr_id)
+    fanout = MATCHUP_FANOUT
+    deadline = time.monotonic() + MATCHUP_FANOUT_DEADLINE_SECS
+    missed: set = set()
 
-    try:
-        meta = FS.get_tourney_meta(tname) or {}
-    except Exception:
-        meta = {}
-    if not meta:
-        meta = _tourney_meta_fallback(tname) or {}
+    if fanout:
+        got = _fanout(
+            {
+                "p_int": lambda: _resolve_id(p_id_in, player, p_sr_id),
+                "o_int": lambda: _resolve_id(o_id_in, opponent, o_sr_id),
+                "meta":  lambda: _tourney_meta(tname),
+            },
+            {"p_int": None, "o_int": None, "meta": {}},
+            deadline, missed,
+        )
+        p_int, o_int, meta = got["p_int"], got["o_int"], got["meta"] or {}
+    else:
+        p_int = _resolve_id(p_id_in, player, p_sr_id)
+        o_int = _resolve_id(o_id_in, opponent, o_sr_id)
+        meta = _tourney_meta(tname)
     surface_default = (meta.get("surface") or "hard").lower()
     speed_bucket_meta = meta.get("speed_bucket") or "Medium"
 
     using_sr = bool(SR_API_KEY)
-    ttl_seconds = int(os.getenv("CACHE_TTL_SR_SECS", str(12*3600))) if using_sr else int(os.getenv("CACHE_TTL_HIST_SECS", str(30*24*3600)))
+    ttl_seconds = FS.matchup_cache_ttl(using_sr)
 
     if p_int is not None and o_int is not None:
         try:
@@ -598,18 +849,42 @@ def _compute_matchup_payload(body: dict) -> dict:
                     "flags":  features_cached.get("flags",  flags_cached)
                 },
                 "weights_hist": cached.get("weights_hist"),
-                "components": {"cached": True}
+                "components": {"cached": True},
+                "degraded": False,
+                "fallbacks": [],
             }
             return out_cached
 
-    hist = {}
-    if p_int is not None and o_int is not None:
-        try:
-            hist = FS.get_matchup_hist_vector(
-                p_id=p_int, o_id=o_int, yrs=years_back, tname=tname, month=month
-            ) or {}
-        except Exception:
+    p_sr_norm = _normalize_sr_id(p_sr_id or (p_id_in if (isinstance(p_id_in, str) and p_id_in.startswith("sr:")) else None))
+    o_sr_norm = _normalize_sr_id(o_sr_id or (o_id_in if (isinstance(o_id_in, str) and o_id_in.startswith("sr:")) else None))
+
+    if fanout:
+        # HIST (Supabase) en paralelo con la resolución SR y las 7 llamadas NOW
+        hist_fut = _fanout_pool().submit(_hist_vector, p_int, o_int, years_back, tname, month)
+        ids = _fanout(
+            {
+                "p_sr": lambda: _resolve_sr_side(p_sr_norm, p_int),
+                "o_sr": lambda: _resolve_sr_side(o_sr_norm, o_int),
+            },
+            {"p_sr": p_sr_norm, "o_sr": o_sr_norm},
+            deadline, missed,
+        )
+        p_sr_norm, o_sr_norm = ids["p_sr"], ids["o_sr"]
+        now_in = _fanout(_now_tasks(p_sr_norm, o_sr_norm), _now_defaults(), deadline, missed)
+        hist = _await(hist_fut, _MISSED, deadline, "hist")
+        if hist is _MISSED:
             hist = {}
+    else:
+        hist = _hist_vector(p_int, o_int, years_back, tname, month)
+        p_sr_norm = _resolve_sr_side(p_sr_norm, p_int)
+        o_sr_norm = _resolve_sr_side(o_sr_norm, o_int)
+        now_in = _fetch_now_inputs(p_sr_norm, o_sr_norm, missed)
+
+    # Con los dos IDs, un HIST vacío es fallo o plazo de la RPC (como en /matchup/batch)
+    if not hist and p_int is not None and o_int is not None:
+        missed.add("hist")
+    fallbacks = _fallback_groups(missed)
+
     if not hist:
         hist = {
             "surface": surface_default,
@@ -619,91 +894,15 @@ def _compute_matchup_payload(body: dict) -> dict:
             "d_hist_month":   0.0
         }
 
-    p_sr_norm = _normalize_sr_id(p_sr_id or (p_id_in if (isinstance(p_id_in, str) and p_id_in.startswith("sr:")) else None))
-    o_sr_norm = _normalize_sr_id(o_sr_id or (o_id_in if (isinstance(o_id_in, str) and o_id_in.startswith("sr:")) else None))
-
-    if p_sr_norm is None and isinstance(p_int, int):
-        try:
-            p_sr_norm = FS.get_sr_id_from_player_int(p_int)
-        except Exception:
-            pass
-    if o_sr_norm is None and isinstance(o_int, int):
-        try:
-            o_sr_norm = FS.get_sr_id_from_player_int(o_int)
-        except Exception:
-            pass
-
-    try:
-        profile_p = SR.get_profile(p_sr_norm) if p_sr_norm else {}
-        profile_o = SR.get_profile(o_sr_norm) if o_sr_norm else {}
-        last10_p  = SR.get_last10(p_sr_norm)  if p_sr_norm else []
-        last10_o  = SR.get_last10(o_sr_norm)  if o_sr_norm else []
-        ytd_p     = SR.get_ytd_record(p_sr_norm) if p_sr_norm else {"wins":0, "losses":0}
-        ytd_o     = SR.get_ytd_record(o_sr_norm) if o_sr_norm else {"wins":0, "losses":0}
-        h2h_w, h2h_l = SR.get_h2h(p_sr_norm, o_sr_norm) if p_sr_norm and o_sr_norm else (0, 0)
-    except Exception:
-        profile_p, profile_o, last10_p, last10_o = {}, {}, [], []
-        ytd_p, ytd_o = {"wins":0, "losses":0}, {"wins":0, "losses":0}
-        h2h_w, h2h_l = 0, 0
-
-    now_p = SR.compute_now_features(profile_p, last10_p, ytd_p)
-    now_o = SR.compute_now_features(profile_o, last10_o, ytd_o)
-
-    surf_change_p = 1 if (now_p.get("last_surface") and now_p["last_surface"] != str(hist.get("surface","")).lower()) else 0
-    surf_change_o = 1 if (now_o.get("last_surface") and now_o["last_surface"] != str(hist.get("surface","")).lower()) else 0
-    is_local_p = 1 if body.get("country") and body.get("player_country") and body["country"] == body["player_country"] else 0
-    is_local_o = 1 if body.get("country") and body.get("opponent_country") and body["country"] == body["opponent_country"] else 0
-    mot_p = int(body.get("mot_points_p") or 0)
-    mot_o = int(body.get("mot_points_o") or 0)
-
-    rank_p = now_p.get("ranking_now") or 999
-    rank_o = now_o.get("ranking_now") or 999
-    d_rank_norm   = clamp((rank_o - rank_p) / 100.0, -1, 1)
-    d_ytd         = clamp(now_p["winrate_ytd"]    - now_o["winrate_ytd"],    -0.25, 0.25)
-    d_last10      = clamp(now_p["winrate_last10"] - now_o["winrate_last10"], -0.25, 0.25)
-    d_h2h         = clamp(((h2h_w + 5) / max(1, (h2h_w + h2h_l + 10))) - ((h2h_l + 5) / max(1, (h2h_w + h2h_l + 10))), -0.25, 0.25)
-    d_inactive    = clamp(-(now_p["days_inactive"] - now_o["days_inactive"]) / 30.0, -0.25, 0.25)
-
-    d_hist_surface = clamp(hist.get("d_hist_surface", 0.0), -0.25, 0.25)
-    d_hist_speed   = clamp(hist.get("d_hist_speed",   0.0), -0.25, 0.25)
-    d_hist_month   = clamp(hist.get("d_hist_month",   0.0), -0.25, 0.25)
-
-    now_linear = (
-        WEIGHTS["rank_norm"]   * d_rank_norm   +
-        WEIGHTS["ytd"]         * d_ytd         +
-        WEIGHTS["last10"]      * d_last10      +
-        WEIGHTS["h2h"]         * d_h2h         +
-        WEIGHTS["inactive"]    * d_inactive
-    )
-    hist_linear = (
-        HIST_W_MONTH * d_hist_month +
-        HIST_W_SURF  * d_hist_surface +
-        HIST_W_SPEED * d_hist_speed
-    ) / _HIST_DENOM
-
-    adj = 0.0
-    adj += ADJUSTS["surf_change"] * (surf_change_p - surf_change_o)
-    adj += ADJUSTS["local"]       * (is_local_p - is_local_o)
-    adj += ADJUSTS["mot_points"]  * (mot_p - mot_o)
-
-    z = now_linear + hist_linear + adj
-    prob_player = logistic(z)
-
-    features = {
-        "deltas": {
-            "rank_norm": d_rank_norm,
-            "ytd": d_ytd, "last10": d_last10, "h2h": d_h2h, "inactive": d_inactive,
-            "hist_surface": d_hist_surface, "hist_speed": d_hist_speed, "hist_month": d_hist_month
-        },
-        "flags": {
-            "surf_change_p": surf_change_p, "surf_change_o": surf_change_o,
-            "is_local_p": is_local_p, "is_local_o": is_local_o, "mot_p": mot_p, "mot_o": mot_o
-        }
-    }
+    now_p = SR.compute_now_features(now_in["profile_p"], now_in["last10_p"], now_in["ytd_p"])
+    now_o = SR.compute_now_features(now_in["profile_o"], now_in["last10_o"], now_in["ytd_o"])
+    scored = _score_matchup(body, hist, now_p, now_o, now_in["h2h"])
+    prob_player, features = scored["prob_player"], scored["features"]
 
-    if p_int is not None and o_int is not None:
+    # Una probabilidad con entradas neutras por fallo o plazo no se cachea
+    if p_int is not None and o_int is not None and not fallbacks:
         try:
-            FS.put_matchup_cache_json(
+            FS.queue_matchup_cache_json(
                 player_id=p_int, opponent_id=o_int,
                 tournament_name=tname, mon=month,
                 surface=str(hist.get("surface", surface_default)).lower(),
@@ -712,7 +911,7 @@ def _compute_matchup_payload(body: dict) -> dict:
                 prob_player=float(prob_player),
                 features=features, flags=features["flags"],
                 weights_hist={"month": HIST_W_MONTH, "surface": HIST_W_SURF, "speed": HIST_W_SPEED, "denom": _HIST_DENOM},
-                sources={"source": "api", "ver": "v1"},
+                sources={"source": "api", "ver": MODEL_VERSION},
                 ttl_seconds=ttl_seconds
             )
         except Exception as e:
@@ -734,7 +933,9 @@ def _compute_matchup_payload(body: dict) -> dict:
         },
         "features": features,
         "weights_hist": { "month": HIST_W_MONTH, "surface": HIST_W_SURF, "speed": HIST_W_SPEED, "denom": _HIST_DENOM },
-        "components": { "now_linear": now_linear, "hist_linear": hist_linear, "adj": adj, "z": z, "cached": False }
+        "components": {**scored["components"], "cached": False},
+        "degraded": bool(fallbacks),
+        "fallbacks": fallbacks,
     }
 
 @app.post("/matchup")
@@ -749,6 +950,8 @@ def matchup():
         "inputs": out["inputs"],
         "features": out["features"],
         "weights_hist": out.get("weights_hist"),
+        "degraded": out.get("degraded", False),
+        "fallbacks": out.get("fallbacks", []),
     }
     # ===== ENRIQUECER RESPUESTA CON 'extras' PARA PREMATCH =====
 
@@ -778,8 +981,10 @@ def matchup():
     )
 
     try:
-        meta_p = FS.get_player_meta(pid_int=p_int, sr_id=p_sr)
-        meta_o = FS.get_player_meta(pid_int=o_int, sr_id=o_sr)
+        meta_p, meta_o = FS.get_players_meta([
+            p_int if p_int is not None else p_sr,
+            o_int if o_int is not None else o_sr,
+        ])
 
         extras.update(
             {
@@ -854,6 +1059,430 @@ def matchup_features():
     out = _compute_matchup_payload(body)
     return jsonify(out), 200
 
+# -----------------------------------------------------------------------------
+# /matchup/batch: muchas parejas con un mismo contexto de torneo
+# -----------------------------------------------------------------------------
+MATCHUP_BATCH_MAX_PAIRS = int(os.getenv("MATCHUP_BATCH_MAX_PAIRS", "1024"))
+
+def _side_ref(pair: dict, side: str) -> tuple:
+    # (id, nombre, sr_id) de un lado; hashable para deduplicar jugadores
+    if side == "p":
+        return (pair.get("player_id"), pair.get("player"), pair.get("player_sr_id"))
+    return (pair.get("opponent_id"), pair.get("opponent"), pair.get("opponent_sr_id"))
+
+def _ref_sr_norm(ref: tuple) -> str | None:
+    pid_in, _name, sr_in = ref
+    return _normalize_sr_id(sr_in or (pid_in if (isinstance(pid_in, str) and pid_in.startswith("sr:")) else None))
+
+def _resolve_players(refs: list[tuple], tname: str, deadline: float,
+                     missed: set | None = None) -> tuple[dict, dict, dict]:
+    """
+    ID interno y SR id de cada referencia única, más la meta del torneo.
+    Las referencias cuya resolución no llegó a tiempo van a `missed` (y
+    "meta" si tampoco llegó la meta del torneo).
+    """
+    lost: set = set()
+    got = _fanout(
+        {("id", ref): (lambda ref=ref: _resolve_id(*ref)) for ref in refs}
+        | {"meta": lambda: _tourney_meta(tname)},
+        {("id", ref): None for ref in refs} | {"meta": {}},
+        deadline, lost, _bulk_pool(),
+    )
+    pid_of = {ref: got[("id", ref)] for ref in refs}
+    sr_of = _fanout(
+        {ref: (lambda ref=ref: _resolve_sr_side(_ref_sr_norm(ref), pid_of[ref])) for ref in refs},
+        {ref: _ref_sr_norm(ref) for ref in refs},
+        deadline, lost, _bulk_pool(),
+    )
+    if missed is not None:
+        missed.update(ref for ref in refs if ref in lost or ("id", ref) in lost)
+        if "meta" in lost:
+            missed.add("meta")
+    return pid_of, sr_of, got["meta"] or {}
+
+def _player_now_tasks(srs: list[str], h2h_pairs: list[tuple[str, str]]) -> tuple[dict, dict]:
+    """Tareas NOW (perfil, last10, YTD) por SR id y H2H por pareja, con sus neutros."""
+    defaults = _now_defaults()
+    tasks: dict[Any, Callable[[], Any]] = {}
+    task_defaults: dict[Any, Any] = {}
+    for sr in srs:
+        tasks[("profile", sr)] = lambda sr=sr: SR.get_profile(sr)
+        tasks[("last10", sr)] = lambda sr=sr: SR.get_last10(sr)
+        tasks[("ytd", sr)] = lambda sr=sr: SR.get_ytd_record(sr)
+        task_defaults[("profile", sr)] = defaults["profile_p"]
+        task_defaults[("last10", sr)] = defaults["last10_p"]
+        task_defaults[("ytd", sr)] = defaults["ytd_p"]
+    for a, b in h2h_pairs:
+        tasks[("h2h", a, b)] = lambda a=a, b=b: SR.get_h2h(a, b)
+        task_defaults[("h2h", a, b)] = defaults["h2h"]
+    return tasks, task_defaults
+
+def _player_now_features(now_in: dict, srs: list[str]) -> dict[str, dict]:
+    return {
+        sr: SR.compute_now_features(now_in[("profile", sr)], now_in[("last10", sr)], now_in[("ytd", sr)])
+        for sr in srs
+    }
+
+def _batch_hist(pairs_int: list[tuple[int | None, int | None]], years_back: int,
+                tname: str, month: int, surface_default: str, speed_bucket_meta: str,
+                deadline: float, missed: set | None = None) -> tuple[dict[tuple, dict], str]:
+    """
+    HIST por pareja. Primero una sola RPC con las winrates de todos los
+    jugadores; si no está desplegada, RPC por pareja (única) en el pool.
+    Las parejas que se quedan sin vector por fallo o plazo van a `missed`.
+    """
+    neutral = {
+        "surface": surface_default, "speed_bucket": speed_bucket_meta,
+        "d_hist_surface": 0.0, "d_hist_speed": 0.0, "d_hist_month": 0.0,
+    }
+    uniq = sorted({(p, o) for p, o in pairs_int if p is not None and o is not None})
+    out: dict[tuple, dict] = {}
+
+    bulk = None
+    try:
+        bulk = FS.get_players_hist_winrates(
+            [x for pair in uniq for x in pair], years_back, tname, month
+        )
+    except Exception as e:
+        app.logger.warning(f"hist bulk failed: {e}")
+    if bulk:
+        wr = bulk["players"]
+        for p, o in uniq:
+            if p in wr and o in wr:
+                out[(p, o)] = {
+                    "surface": bulk["surface"], "speed_bucket": bulk["speed_bucket"],
+                    "d_hist_month":   wr[p]["wr_month"] - wr[o]["wr_month"],
+                    "d_hist_surface": wr[p]["wr_surf"]  - wr[o]["wr_surf"],
+                    "d_hist_speed":   wr[p]["wr_speed"] - wr[o]["wr_speed"],
+                }
+        source = "bulk"
+    else:
+        got = _fanout(
+            {pair: (lambda pair=pair: _hist_vector(pair[0], pair[1], years_back, tname, month))
+             for pair in uniq},
+            {pair: {} for pair in uniq},
+            deadline, pool=_bulk_pool(),
+        )
+        out.update({pair: h for pair, h in got.items() if h})
+        source = "pairs"
+        if missed is not None:
+            missed.update(pair for pair in uniq if pair not in out)
+
+    return {pair: out.get(pair) or dict(neutral) for pair in uniq}, source
+
+def _compute_matchup_batch(body: dict) -> dict:
+    """
+    Igual que /matchup para cada pareja de `pairs`, pero resolviendo jugadores,
+    HIST y NOW en bloque y sin repetir llamadas para el mismo jugador.
+    No usa matchup_cache (las probabilidades se calculan siempre). Las
+    parejas con alguna entrada en valor neutro por fallo o plazo llevan
+    `degraded` y la lista de entradas en `fallbacks`.
+    """
+    years_back = int(body.get("years_back", 4))
+    tourney = body.get("tournament", {}) or {}
+    tname = tourney.get("name") or tourney.get("tourney_name") or ""
+    month = int(tourney.get("month") or 1)
+    with_h2h = body.get("h2h", True) is not False
+    pairs = body.get("pairs") or []
+
+    refs = list(dict.fromkeys(_side_ref(pr, side) for pr in pairs for side in ("p", "o")))
+    # ID + SR id + perfil/last10/YTD por jugador; H2H y (si falta la RPC bulk) HIST por pareja
+    deadline = _bulk_deadline(5 * len(refs) + (2 if with_h2h else 1) * len(pairs))
+
+    # 1) IDs internos / SR ids de cada jugador único + meta del torneo
+    missed_refs: set = set()
+    pid_of, sr_of, meta = _resolve_players(refs, tname, deadline, missed_refs)
+    surface_default = (meta.get("surface") or "hard").lower()
+    speed_bucket_meta = meta.get("speed_bucket") or "Medium"
+
+    # 2) NOW (SR) por jugador único y H2H por pareja en el pool; mientras
+    #    tanto, HIST (Supabase) desde este hilo (su fallback también usa el pool)
+    pair_keys = [(_side_ref(pr, "p"), _side_ref(pr, "o")) for pr in pairs]
+    srs = sorted({sr for sr in sr_of.values() if sr})
+    h2h_pairs = sorted({(sr_of[a], sr_of[b]) for a, b in pair_keys if sr_of[a] and sr_of[b]}) if with_h2h else []
+    defaults = _now_defaults()
+    tasks, task_defaults = _player_now_tasks(srs, h2h_pairs)
+    now_futs = _fanout_submit(tasks, _bulk_pool())
+    missed_hist: set = set()
+    hist_by_pair, hist_source = _batch_hist(
+        [(pid_of[a], pid_of[b]) for a, b in pair_keys],
+        years_back, tname, month, surface_default, speed_bucket_meta, deadline, missed_hist,
+    )
+    missed_now: set = set()
+    now_in = _fanout_collect(now_futs, task_defaults, deadline, missed_now)
+    now_feats = _player_now_features(now_in, srs)
+    now_lost = {key[1] for key in missed_now if key[0] != "h2h"}
+    now_neutral = SR.compute_now_features({}, [], {"wins": 0, "losses": 0})
+
+    # 3) Puntuar cada pareja con el mismo modelo que /matchup
+    results = []
+    degraded = 0
+    for pr, (a, b) in zip(pairs, pair_keys):
+        p_int, o_int = pid_of[a], pid_of[b]
+        p_sr, o_sr = sr_of[a], sr_of[b]
+        fallbacks = [name for name, lost in (
+            ("meta", "meta" in missed_refs),
+            ("ids", a in missed_refs or b in missed_refs),
+            ("now", p_sr in now_lost or o_sr in now_lost),
+            ("hist", (p_int, o_int) in missed_hist),
+            ("h2h", ("h2h", p_sr, o_sr) in missed_now),
+        ) if lost]
+        degraded += bool(fallbacks)
+        hist = hist_by_pair.get((p_int, o_int)) or {
+            "surface": surface_default, "speed_bucket": speed_bucket_meta,
+            "d_hist_surface": 0.0, "d_hist_speed": 0.0, "d_hist_month": 0.0,
+        }
+        h2h = now_in.get(("h2h", p_sr, o_sr), defaults["h2h"])
+        scored = _score_matchup(
+            pr, hist, now_feats.get(p_sr, now_neutral), now_feats.get(o_sr, now_neutral), h2h
+        )
+        results.append({
+            "ok": True,
+            "degraded": bool(fallbacks),
+            "fallbacks": fallbacks,
+            "prob_player": scored["prob_player"],
+            "inputs": {
+                "player": pr.get("player"), "opponent": pr.get("opponent"),
+                "player_id": p_int if p_int is not None else pr.get("player_id"),
+                "opponent_id": o_int if o_int is not None else pr.get("opponent_id"),
+                "player_sr_id": p_sr,
+                "opponent_sr_id": o_sr,
+            },
+            "features": scored["features"],
+            "components": scored["components"],
+        })
+
+    return {
+        "ok": True,
+        "surface": surface_default,
+        "speed_bucket": speed_bucket_meta,
+        "tournament": {"name": tname, "month": month},
+        "years_back": years_back,
+        "weights_hist": {"month": HIST_W_MONTH, "surface": HIST_W_SURF, "speed": HIST_W_SPEED, "denom": _HIST_DENOM},
+        "results": results,
+        "stats": {
+            "pairs": len(pairs), "players": len(refs), "sr_players": len(srs),
+            "h2h_calls": len(h2h_pairs), "hist_source": hist_source,
+            "degraded_pairs": degraded,
+        },
+    }
+
+@app.post("/matchup/batch")
+def matchup_batch():
+    body = request.get_json(force=True, silent=True) or {}
+    pairs = body.get("pairs")
+    if not isinstance(pairs, list) or not pairs or not all(isinstance(p, dict) for p in pairs):
+        return jsonify({"ok": False, "error": "'pairs' debe ser una lista no vacía de objetos"}), 400
+    if len(pairs) > MATCHUP_BATCH_MAX_PAIRS:
+        return jsonify({"ok": False, "error": f"máximo {MATCHUP_BATCH_MAX_PAIRS} parejas por petición"}), 400
+    return jsonify(_compute_matchup_batch(body)), 200
+
+# -----------------------------------------------------------------------------
+# /matchup/matrix: P(i gana a j) para todas las parejas de un cuadro
+# -----------------------------------------------------------------------------
+MATCHUP_MATRIX_MAX_ENTRANTS = int(os.getenv("MATCHUP_MATRIX_MAX_ENTRANTS", "256"))
+MATRIX_CACHE = TTLCache(
+    max_entries=int(os.getenv("MATCHUP_MATRIX_CACHE_MAX", "64")),
+    default_ttl=float(os.getenv("MATCHUP_MATRIX_TTL_SECS", "3600")),
+)
+# Una matriz con entradas en valor neutro (fallo o plazo) solo se cachea un rato
+MATCHUP_MATRIX_DEGRADED_TTL_SECS = float(os.getenv("MATCHUP_MATRIX_DEGRADED_TTL_SECS", "60"))
+
+def _entrant_ref(e: dict) -> tuple:
+    return (
+        e.get("player_id", e.get("id")),
+        e.get("player", e.get("name")),
+        e.get("player_sr_id", e.get("sr_id")),
+    )
+
+def _players_hist_wr(pids: list[int], years_back: int, tname: str, month: int,
+                     surface: str, speed_bucket: str, deadline: float,
+                     missed: set | None = None) -> tuple[dict, str, str, str]:
+    """
+    Winrates HIST (mes, superficie, velocidad) por jugador: una RPC para
+    todos o, si no existe, la RPC del vector por jugador en el pool (N, no
+    N²), con el mismo suavizado que /matchup/batch. Los jugadores que se
+    quedan sin winrates por fallo o plazo van a `missed`.
+    """
+    bulk = None
+    try:
+        bulk = FS.get_players_hist_winrates(pids, years_back, tname, month)
+    except Exception as e:
+        app.logger.warning(f"hist bulk failed: {e}")
+    if bulk:
+        return bulk["players"], bulk["surface"], bulk["speed_bucket"], "bulk"
+    got = _fanout(
+        {pid: (lambda pid=pid: FS.get_player_hist_winrates(pid, years_back, tname, month))
+         for pid in pids},
+        {pid: None for pid in pids},
+        deadline, pool=_bulk_pool(),
+    )
+    if missed is not None:
+        missed.update(pid for pid, wr in got.items() if not wr)
+    wr_by_pid = {pid: wr for pid, wr in got.items() if wr}
+    if wr_by_pid:
+        # superficie/velocidad resueltas por la RPC, como en el modo bulk
+        first = next(iter(wr_by_pid.values()))
+        surface, speed_bucket = first["surface"], first["speed_bucket"]
+    return wr_by_pid, surface, speed_bucket, "players"
+
+def _pairwise(v: np.ndarray) -> np.ndarray:
+    # M[i, j] = v[i] - v[j]; NaN (dato ausente) -> 0, como el delta neutro de /matchup
+    return np.nan_to_num(v[:, None] - v[None, :], nan=0.0)
+
+def _score_matrix(now: dict[str, np.ndarray], wr: dict[str, np.ndarray],
+                  h2h_wins: np.ndarray, flags: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Versión vectorizada de `_score_matchup`: mismos clamps, WEIGHTS, HIST_W_*
+    y ADJUSTS, evaluados para todas las parejas (i, j) a la vez.
+    """
+    rank = np.where(np.isnan(now["rank"]), 999.0, now["rank"])
+    d = matchup_deltas_np(
+        _pairwise(rank), _pairwise(now["ytd"]), _pairwise(now["last10"]),
+        h2h_wins, h2h_wins.T, _pairwise(now["inactive"]),
+        _pairwise(wr["month"]), _pairwise(wr["surf"]), _pairwise(wr["speed"]),
+    )
+    adj = adjust_np(_pairwise(flags["surf_change"]), _pairwise(flags["is_local"]), _pairwise(flags["mot"]))
+    return logistic_np(matchup_z_np(d, (HIST_W_MONTH, HIST_W_SURF, HIST_W_SPEED), adj))
+
+def _compute_matchup_matrix(body: dict) -> dict:
+    years_back = int(body.get("years_back", 4))
+    tourney = body.get("tournament", {}) or {}
+    tname = tourney.get("name") or tourney.get("tourney_name") or ""
+    month = int(tourney.get("month") or 1)
+    with_h2h = bool(body.get("h2h", False))   # N² llamadas a SR: opcional
+    country = body.get("country")
+    entrants = body.get("entrants") or []
+    refs = [_entrant_ref(e) for e in entrants]
+
+    # Orden canónico: el mismo conjunto de jugadores comparte entrada de caché
+    canon = sorted(set(refs), key=repr)
+    extras_of = {}
+    for ref, e in zip(refs, entrants):
+        extras_of.setdefault(ref, (e.get("country"), int(e.get("mot_points") or 0)))
+    cache_key = (
+        FS.norm_tourney_py(tname), month, years_back, with_h2h, country,
+        tuple((ref, extras_of[ref]) for ref in canon), MODEL_VERSION,
+    )
+    cached = MATRIX_CACHE.get(cache_key)
+    if cached is None:
+        cached = _build_matrix(canon, extras_of, tname, month, years_back, with_h2h, country)
+        MATRIX_CACHE.put(cache_key, cached,
+                         ttl=MATCHUP_MATRIX_DEGRADED_TTL_SECS if cached["stats"]["degraded"] else None)
+        from_cache = False
+    else:
+        from_cache = True
+
+    pos = {ref: i for i, ref in enumerate(canon)}
+    idx = [pos[ref] for ref in refs]
+    matrix = cached["matrix"][np.ix_(idx, idx)]
+    return {
+        "ok": True,
+        "surface": cached["surface"],
+        "speed_bucket": cached["speed_bucket"],
+        "tournament": {"name": tname, "month": month},
+        "years_back": years_back,
+        "model_version": MODEL_VERSION,
+        "entrants": [
+            {"index": i, **cached["players"][pos[ref]]} for i, ref in enumerate(refs)
+        ],
+        "matrix": matrix.tolist(),
+        "cached": from_cache,
+        "stats": cached["stats"],
+    }
+
+def _build_matrix(canon: list[tuple], extras_of: dict, tname: str, month: int,
+                  years_back: int, with_h2h: bool, country: str | None) -> dict:
+    n = len(canon)
+    # ID + SR id + perfil/last10/YTD (+ HIST si falta la RPC bulk) por jugador; H2H por pareja
+    deadline = _bulk_deadline(6 * n + (n * (n - 1) // 2 if with_h2h else 0))
+
+    missed_refs: set = set()
+    pid_of, sr_of, meta = _resolve_players(canon, tname, deadline, missed_refs)
+    surface_default = (meta.get("surface") or "hard").lower()
+    speed_bucket_meta = meta.get("speed_bucket") or "Medium"
+
+    srs = sorted({sr for sr in sr_of.values() if sr})
+    h2h_pairs = [(a, b) for a in srs for b in srs if a < b] if with_h2h else []
+    tasks, task_defaults = _player_now_tasks(srs, h2h_pairs)
+    now_futs = _fanout_submit(tasks, _bulk_pool())
+    pids = sorted({pid for pid in pid_of.values() if pid is not None})
+    missed_hist: set = set()
+    wr_by_pid, surface, speed_bucket, hist_source = _players_hist_wr(
+        pids, years_back, tname, month, surface_default, speed_bucket_meta, deadline, missed_hist
+    )
+    missed_now: set = set()
+    now_in = _fanout_collect(now_futs, task_defaults, deadline, missed_now)
+    now_feats = _player_now_features(now_in, srs)
+    now_lost = {key[1] for key in missed_now if key[0] != "h2h"}
+    fallbacks = {
+        "meta": int("meta" in missed_refs),
+        "ids": sum(ref in missed_refs for ref in canon),
+        "now": sum(sr_of[ref] in now_lost for ref in canon if sr_of[ref]),
+        "hist": sum(pid_of[ref] in missed_hist for ref in canon if pid_of[ref] is not None),
+        "h2h": sum(key[0] == "h2h" for key in missed_now),
+    }
+    now_neutral = SR.compute_now_features({}, [], {"wins": 0, "losses": 0})
+
+    feats = [now_feats.get(sr_of[ref], now_neutral) for ref in canon]
+    now = {
+        "rank":     np.array([f.get("ranking_now") or np.nan for f in feats], dtype=float),
+        "ytd":      np.array([f["winrate_ytd"] for f in feats], dtype=float),
+        "last10":   np.array([f["winrate_last10"] for f in feats], dtype=float),
+        "inactive": np.array([f["days_inactive"] for f in feats], dtype=float),
+    }
+    wrs = [wr_by_pid.get(pid_of[ref]) for ref in canon]
+    wr = {
+        key: np.array([w[f"wr_{key}"] if w else np.nan for w in wrs], dtype=float)
+        for key in ("month", "surf", "speed")
+    }
+    h2h_wins = np.zeros((n, n))
+    pos_sr: dict[str, list[int]] = {}
+    for i, ref in enumerate(canon):
+        if sr_of[ref]:
+            pos_sr.setdefault(sr_of[ref], []).append(i)
+    for a, b in h2h_pairs:
+        w_ab, w_ba = now_in[("h2h", a, b)]
+        for i in pos_sr[a]:
+            for j in pos_sr[b]:
+                h2h_wins[i, j], h2h_wins[j, i] = w_ab, w_ba
+    flags = {
+        "surf_change": np.array([
+            1.0 if (f.get("last_surface") and f["last_surface"] != surface.lower()) else 0.0 for f in feats
+        ]),
+        "is_local": np.array([
+            1.0 if country and extras_of[ref][0] and country == extras_of[ref][0] else 0.0 for ref in canon
+        ]),
+        "mot": np.array([float(extras_of[ref][1]) for ref in canon]),
+    }
+
+    matrix = _score_matrix(now, wr, h2h_wins, flags)
+    return {
+        "matrix": matrix,
+        "surface": surface,
+        "speed_bucket": speed_bucket,
+        "players": [
+            {"player_id": pid_of[ref] if pid_of[ref] is not None else ref[0],
+             "player": ref[1], "player_sr_id": sr_of[ref]}
+            for ref in canon
+        ],
+        "stats": {
+            "entrants": n, "sr_players": len(srs), "h2h_calls": len(h2h_pairs),
+            "hist_source": hist_source,
+            "degraded": any(fallbacks.values()), "fallbacks": fallbacks,
+        },
+    }
+
+@app.post("/matchup/matrix")
+def matchup_matrix():
+    body = request.get_json(force=True, silent=True) or {}
+    entrants = body.get("entrants")
+    if not isinstance(entrants, list) or len(entrants) < 2 or not all(isinstance(e, dict) for e in entrants):
+        return jsonify({"ok": False, "error": "'entrants' debe ser una lista de al menos 2 objetos"}), 400
+    if len(entrants) > MATCHUP_MATRIX_MAX_ENTRANTS:
+        return jsonify({"ok": False, "error": f"máximo {MATCHUP_MATRIX_MAX_ENTRANTS} jugadores por petición"}), 400
+    return jsonify(_compute_matchup_matrix(body)), 200
+
 # -----------------------------------------------------------------------------
 # Prematch HTML helpers y endpoint
 # -----------------------------------------------------------------------------
@@ -913,9 +1542,10 @@ def enrich_resp_with_extras(resp: dict, conn=None) -> dict:
     o_id = inp.get("opponent_id")
     tname = (inp.get("tournament") or {}).get("name")
 
-    # ---- meta por jugador (solo BD; tu FS.get_player_meta ya lo hace)
-    meta_p = FS.get_player_meta(p_id, conn=conn) if p_id else {}
-    meta_o = FS.get_player_meta(o_id, conn=conn) if o_id else {}
+    # ---- meta de ambos jugadores en una sola consulta (solo BD)
+    meta_p, meta_o = FS.get_players_meta([p_id or None, o_id or None], conn=conn)
+    meta_p = meta_p if p_id else {}
+    meta_o = meta_o if o_id else {}
 
     extras = resp.setdefault("extras", {})
     extras.update({
@@ -0,0 +1,169 @@
+# services/http_client.py
+"""
+Cliente HTTP compartido para las llamadas salientes (Sportradar, Supabase REST).
+
+- Una `requests.Session` por host, con pool de conexiones keep-alive.
+- Reintentos con backoff exponencial en 429/5xx y errores de conexión,
+  respetando `Retry-After` cuando el servidor lo manda.
+- Timeout por intento y presupuesto total (incluidos reintentos) por host.
+"""
+from __future__ import annotations
+
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger("http_client")
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE     = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_RETRIES          = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_BASE     = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX      = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+@dataclass(frozen=True)
+class HostPolicy:
+    timeout: float   # segundos por intento
+    budget: float    # segundos totales, reintentos incluidos
+
+
+# Presupuestos por host (se elige el primero cuyo patrón aparezca en el host)
+_HOST_POLICIES: list[tuple[str, HostPolicy]] = [
+    ("sportradar.com", HostPolicy(
+        timeout=float(os.getenv("HTTP_TIMEOUT_SR", "15")),
+        budget=float(os.getenv("HTTP_BUDGET_SR", "30")),
+    )),
+    ("supabase.", HostPolicy(
+        timeout=float(os.getenv("HTTP_TIMEOUT_SUPABASE", "20")),
+        budget=float(os.getenv("HTTP_BUDGET_SUPABASE", "40")),
+    )),
+]
+_DEFAULT_POLICY = HostPolicy(
+    timeout=float(os.getenv("HTTP_TIMEOUT_DEFAULT", "20")),
+    budget=float(os.getenv("HTTP_BUDGET_DEFAULT", "40")),
+)
+
+_SESSIONS: dict[str, requests.Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def policy_for(host: str) -> HostPolicy:
+    host = (host or "").lower()
+    for pattern, policy in _HOST_POLICIES:
+        if pattern in host:
+            return policy
+    return _DEFAULT_POLICY
+
+
+def session_for(url: str) -> requests.Session:
+    parts = urllib.parse.urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}".lower()
+    sess = _SESSIONS.get(key)
+    if sess is not None:
+        return sess
+    with _SESSIONS_LOCK:
+        sess = _SESSIONS.get(key)
+        if sess is None:
+            sess = requests.Session()
+            # Los reintentos los gestionamos aquí (para poder leer Retry-After)
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+                max_retries=0,
+            )
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            _SESSIONS[key] = sess
+    return sess
+
+
+def _retry_after_secs(resp: requests.Response) -> float | None:
+    val = resp.headers.get("Retry-After") if resp is not None else None
+    if not val:
+        return None
+    try:
+        return max(0.0, float(val))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(val)
+        return max(0.0, dt.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    return min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+
+def request(method: str, url: str, *, timeout: float | None = None,
+            retry: bool | None = None, **kwargs) -> requests.Response:
+    """
+    Igual que `requests.request` pero con sesión por host y reintentos.
+    `retry=None` reintenta solo métodos idempotentes; `retry=True` fuerza
+    reintentos (p.ej. RPCs POST de solo lectura).
+    """
+    method = method.upper()
+    host = urllib.parse.urlsplit(url).netloc
+    policy = policy_for(host)
+    per_try = policy.timeout if timeout is None else timeout
+    can_retry = (method in IDEMPOTENT_METHODS) if retry is None else retry
+    retries = HTTP_RETRIES if can_retry else 0
+    sess = session_for(url)
+    t0 = time.monotonic()
+
+    for attempt in range(retries + 1):
+        resp = None
+        err: Exception | None = None
+        try:
+            resp = sess.request(method, url, timeout=per_try, **kwargs)
+            if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                return resp
+            wait = _retry_after_secs(resp)
+            wait = _backoff(attempt) if wait is None else min(wait, HTTP_BACKOFF_MAX)
+            reason = f"HTTP {resp.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+            wait = _backoff(attempt)
+            reason = type(e).__name__
+            err = e
+
+        if time.monotonic() - t0 + wait + per_try > policy.budget:
+            # Sin presupuesto para otro intento: devolvemos/lanzamos lo último
+            if resp is not None:
+                return resp
+            raise err
+        log.info("HTTP %s %s -> %s; reintento %d/%d en %.2fs",
+                 method, host, reason, attempt + 1, retries, wait)
+        time.sleep(wait)
+
+    raise AssertionError("unreachable")
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def patch(url: str, **kwargs) -> requests.Response:
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request("DELETE", url, **kwargs)
@@ -0,0 +1,158 @@
+# services/player_index.py
+"""
+Índice en memoria para resolver jugadores sin ir a la BD por cada fila.
+
+Se construye una vez por ejecución (players, player_name_map, players_min) y
+responde lo mismo que las cascadas SQL/REST de los loaders:
+
+- `ext(csv_id)`      -> players.ext_atp_id = csv_id
+- `mapping(csv_id)`  -> player_name_map.csv_id = csv_id
+- `by_name(name)`    -> lower(replace(name, '-', ' ')) = lower(replace(%s, '-', ' '))
+- `ilike(pattern)`   -> players_min?name=ilike.<pattern> (PostgREST)
+
+Las claves exactas ("Apellido, Nombre" y "Nombre Apellido" incluidas, que son
+variantes distintas de la cascada) salen de diccionarios; los patrones con
+comodín se resuelven una vez contra la lista de nombres y se memorizan.
+"""
+from __future__ import annotations
+
+import re
+from typing import Iterable, Optional
+
+
+def name_key(name: Optional[str]) -> Optional[str]:
+    """Equivalente Python de lower(replace(name, '-', ' '))."""
+    if name is None:
+        return None
+    return name.replace("-", " ").lower()
+
+
+def _like_regex(pattern: str) -> re.Pattern:
+    # ILIKE: % = cualquier secuencia, _ = un carácter; PostgREST acepta * como %
+    out = []
+    for ch in pattern.replace("*", "%"):
+        if ch == "%":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("".join(out), re.IGNORECASE | re.DOTALL)
+
+
+class PlayerIndex:
+    def __init__(self):
+        self._ext: dict[str, int] = {}
+        self._ext_of: dict[int, str] = {}
+        self._name_of: dict[int, str] = {}
+        self._map: dict[str, Optional[int]] = {}
+        self._by_key: dict[str, list[int]] = {}
+        self._uniq_ids: set[int] = set()
+        self._ambiguous: dict[str, list[int]] = {}
+        # players_min: nombre en minúsculas -> ids (para ilike)
+        self._min_exact: dict[str, list[int]] = {}
+        self._min_names: list[tuple[str, int]] = []
+        self._like_memo: dict[str, list[int]] = {}
+
+    # ── construcción ─────────────────────────────────────────────────────────
+    def add_player(self, player_id: int, name: Optional[str], ext_atp_id: Optional[str] = None) -> None:
+        """
+        Refleja el upsert de players: el nombre se sustituye y ext_atp_id solo
+        se rellena si el jugador no tenía (COALESCE(players.ext_atp_id, nuevo)).
+        """
+        old = self._name_of.get(player_id)
+        if old is not None and old != name:
+            ids = self._by_key.get(name_key(old), [])
+            if player_id in ids:
+                ids.remove(player_id)
+        if name is not None:
+            self._name_of[player_id] = name
+            ids = self._by_key.setdefault(name_key(name), [])
+            if player_id not in ids:
+                ids.append(player_id)
+                ids.sort()
+        if ext_atp_id:
+            self.set_ext(ext_atp_id, player_id)
+
+    def set_ext(self, csv_id: str, player_id: int) -> None:
+        """Refleja `UPDATE players SET ext_atp_id = csv_id WHERE ... AND ext_atp_id IS NULL`."""
+        if player_id in self._ext_of:
+            return
+        self._ext_of[player_id] = csv_id
+        self._ext.setdefault(csv_id, player_id)
+
+    def add_mapping(self, csv_id: str, player_id: Optional[int]) -> None:
+        """Refleja `INSERT INTO player_name_map ... ON CONFLICT (csv_id) DO NOTHING`."""
+        self._map.setdefault(csv_id, player_id)
+
+    def add_min(self, player_id: int, name: Optional[str]) -> None:
+        if not name:
+            return
+        self._min_exact.setdefault(name.lower(), []).append(player_id)
+        self._min_names.append((name, player_id))
+        self._like_memo.clear()
+
+    @classmethod
+    def from_rows(cls, players: Iterable = (), mappings: Iterable = (), players_min: Iterable = ()) -> "PlayerIndex":
+        """players: (player_id, name, ext_atp_id); mappings: (csv_id, resolved_player_id); players_min: (player_id, name)."""
+        idx = cls()
+        uniq: dict[str, list[int]] = {}
+        for pid, name, ext in players:
+            if pid is None:
+                continue
+            idx.add_player(pid, name, ext)
+            if name:
+                uniq.setdefault(name.strip(), []).append(pid)
+        idx._uniq_ids = {ids[0] for ids in uniq.values() if len(ids) == 1}
+        idx._ambiguous = {n: ids for n, ids in uniq.items() if len(ids) > 1}
+        for csv_id, pid in mappings:
+            idx.add_mapping(csv_id, pid)
+        for pid, name in players_min:
+            idx.add_min(pid, name)
+        return idx
+
+    @classmethod
+    def from_pg(cls, cur, schema: str) -> "PlayerIndex":
+        cur.execute(f"SELECT player_id, name, ext_atp_id FROM {schema}.players ORDER BY player_id")
+        players = cur.fetchall()
+        cur.execute(f"SELECT csv_id, resolved_player_id FROM {schema}.player_name_map")
+        mappings = cur.fetchall()
+        return cls.from_rows(players, mappings)
+
+    # ── consultas ────────────────────────────────────────────────────────────
+    def ext(self, csv_id: Optional[str]) -> Optional[int]:
+        return self._ext.get(csv_id) if csv_id is not None else None
+
+    def mapping(self, csv_id: Optional[str]) -> tuple[bool, Optional[int]]:
+        """(existe_fila, resolved_player_id); el id puede ser None aunque exista la fila."""
+        if csv_id is None or csv_id not in self._map:
+            return False, None
+        return True, self._map[csv_id]
+
+    def by_name(self, name: Optional[str]) -> list[int]:
+        """Todos los player_id con ese nombre normalizado (ordenados)."""
+        return list(self._by_key.get(name_key(name), ())) if name is not None else []
+
+    def is_unique_name_id(self, player_id: int) -> bool:
+        """¿Es player_id el id de un nombre no ambiguo al cargar el índice? (name_id_map)"""
+        return player_id in self._uniq_ids
+
+    def ambiguous_names(self) -> dict[str, list[int]]:
+        """Nombres (strip) repetidos en players al cargar el índice."""
+        return dict(self._ambiguous)
+
+    def ilike(self, pattern: str) -> list[int]:
+        """Ids de players_min cuyo name ILIKE pattern."""
+        p = pattern.replace("*", "%")
+        if "%" not in p and "_" not in p:
+            return list(self._min_exact.get(p.lower(), ()))
+        hit = self._like_memo.get(p)
+        if hit is None:
+            rx = _like_regex(p)
+            hit = [pid for name, pid in self._min_names if rx.fullmatch(name)]
+            self._like_memo[p] = hit
+        return list(hit)
+
+    def stats(self) -> dict:
+        return {"ext_ids": len(self._ext), "mappings": len(self._map), "names": len(self._by_key),
+                "players_min": len(self._min_names), "like_memo": len(self._like_memo)}
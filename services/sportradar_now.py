@@ -2,19 +2,39 @@
 from __future__ import annotations
 import os
 import re
+import threading
 import time
 import urllib.parse
 import requests
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import Callable, List, Dict, Any, Tuple, Optional
 from datetime import datetime, timezone
 
+from services import http_client as HTTP
+from services import sr_disk_cache as SRDC
+from utils.ttl_cache import TTLCache
+
 log = logging.getLogger("sportradar_now")
 
 # Config
 SR_API_KEY = os.getenv("SR_API_KEY", "").strip()
 SR_BASE = "https://api.sportradar.com/tennis/trial/v3/en"  # ajusta si usas otro plan/locale
 
+# Caché de respuestas SR (compartida con main._sr_get). TTL por tipo de recurso.
+SR_CACHE_MAX_ENTRIES  = int(os.getenv("SR_CACHE_MAX_ENTRIES", "2048"))
+SR_CACHE_TTL_PROFILE  = int(os.getenv("SR_CACHE_TTL_PROFILE", str(6 * 3600)))
+SR_CACHE_TTL_SUMMARIES = int(os.getenv("SR_CACHE_TTL_SUMMARIES", str(10 * 60)))
+SR_CACHE_TTL_SEASONS  = int(os.getenv("SR_CACHE_TTL_SEASONS", str(24 * 3600)))
+SR_CACHE_TTL_DEFAULT  = int(os.getenv("SR_CACHE_TTL_DEFAULT", str(5 * 60)))
+
+_CACHE_TTL_RULES: list[tuple[re.Pattern, int]] = [
+    (re.compile(r"(^|/)profile\.json$"), SR_CACHE_TTL_PROFILE),
+    (re.compile(r"(^|/)summaries\.json$"), SR_CACHE_TTL_SUMMARIES),
+    (re.compile(r"^seasons\.json$"), SR_CACHE_TTL_SEASONS),
+]
+
+RESP_CACHE = TTLCache(max_entries=SR_CACHE_MAX_ENTRIES, default_ttl=SR_CACHE_TTL_DEFAULT)
+
 # --------------------------- Utils internas ---------------------------
 
 def _normalize_sr(sr_id: str | int | None) -> Optional[str]:
@@ -28,14 +48,110 @@ def _sr_url(path: str, params: dict | None = None) -> str:
     params["api_key"] = SR_API_KEY or "REPLACE_ME"
     return f"{SR_BASE}/{path}?{urllib.parse.urlencode(params)}"
 
-def _get(path: str, params: dict | None = None, timeout: int = 15) -> requests.Response:
-    url = _sr_url(path, params)
-    red = re.sub(r"api_key=[^&]+", "api_key=***", url)  # no logeamos la clave
-    log.info("SR GET %s", red)
-    r = requests.get(url, timeout=timeout, headers={"accept": "application/json"})
-    log.info("SR RESP %s (ratelimit-remaining=%s)", r.status_code, r.headers.get("x-ratelimit-remaining"))
+def cache_ttl(path: str) -> int:
+    for rx, ttl in _CACHE_TTL_RULES:
+        if rx.search(path):
+            return ttl
+    return SR_CACHE_TTL_DEFAULT
+
+def cache_key(path: str, params: dict | None = None) -> tuple:
+    # La api_key no forma parte de la clave (es la misma para todo el proceso)
+    items = tuple(sorted((k, str(v)) for k, v in (params or {}).items() if k != "api_key"))
+    return (path.lstrip("/"), items)
+
+class _InFlight:
+    __slots__ = ("done", "resp", "exc", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.resp: requests.Response | None = None
+        self.exc: BaseException | None = None
+        self.waiters = 0
+
+_INFLIGHT: dict[tuple, _InFlight] = {}
+_INFLIGHT_LOCK = threading.Lock()
+_COALESCED = 0
+
+def _single_flight(key: tuple, fetch: Callable[[], requests.Response]) -> tuple[requests.Response, bool]:
+    """
+    Single-flight: si ya hay una petición en curso para `key`, espera a que
+    termine y comparte su respuesta (o su excepción) en vez de repetirla.
+    Devuelve (respuesta, es_lider).
+    """
+    global _COALESCED
+    with _INFLIGHT_LOCK:
+        call = _INFLIGHT.get(key)
+        leader = call is None
+        if leader:
+            call = _INFLIGHT[key] = _InFlight()
+        else:
+            call.waiters += 1
+            _COALESCED += 1
+
+    if not leader:
+        call.done.wait()
+        if call.exc is not None:
+            raise call.exc
+        return call.resp, False
+
+    try:
+        call.resp = fetch()
+        return call.resp, True
+    except BaseException as e:
+        call.exc = e
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+        call.done.set()
+
+def cached_fetch(path: str, params: dict | None, fetch: Callable[[], requests.Response]) -> requests.Response:
+    """
+    Devuelve la respuesta cacheada para (path, params) o ejecuta `fetch()`.
+    Las peticiones concurrentes a la misma URL se coalescen en una sola.
+    Solo se cachean respuestas 200.
+    """
+    key = cache_key(path, params)
+    hit = RESP_CACHE.get(key)
+    if hit is not None:
+        log.debug("SR CACHE HIT %s", path)
+        return hit
+
+    def _fetch_and_store() -> requests.Response:
+        r = fetch()
+        if r.status_code == 200:
+            # antes de liberar a los que esperan, para que los siguientes ya acierten
+            RESP_CACHE.put(key, r, cache_ttl(path))
+        return r
+
+    r, _leader = _single_flight(key, _fetch_and_store)
     return r
 
+def cache_stats() -> dict:
+    out = RESP_CACHE.stats()
+    with _INFLIGHT_LOCK:
+        out["in_flight"] = len(_INFLIGHT)
+        out["coalesced"] = _COALESCED
+    return out
+
+def _get(path: str, params: dict | None = None, timeout: int = 15) -> requests.Response:
+    def _fetch() -> requests.Response:
+        url = _sr_url(path, params)
+        red = re.sub(r"api_key=[^&]+", "api_key=***", url)  # no logeamos la clave
+        log.info("SR GET %s", red)
+        disk = SRDC.default_cache(enabled_by_default=False)
+        if disk is not None:
+            r, src = disk.get(url, lambda extra: HTTP.get(
+                url, timeout=timeout, headers={"accept": "application/json", **extra}))
+            if src != "network":
+                log.info("SR DISK %s %s", src.upper(), path)
+                return r
+        else:
+            r = HTTP.get(url, timeout=timeout, headers={"accept": "application/json"})
+        log.info("SR RESP %s (ratelimit-remaining=%s)", r.status_code, r.headers.get("x-ratelimit-remaining"))
+        return r
+    return cached_fetch(path, params, _fetch)
+
 def _parse_iso_to_epoch(ts: str | None) -> Optional[float]:
     if not ts:
         return None
@@ -0,0 +1,225 @@
+# services/sr_disk_cache.py
+"""
+Caché persistente en disco (SQLite) del JSON crudo de Sportradar, compartida
+por los loaders (poblar_2025_sportradar, load_players_from_sr,
+load_rankings_sportradar) y, si se activa, por la API.
+
+- Clave: URL canónica sin api_key (mismo recurso = misma entrada, venga la
+  clave por query o por cabecera x-api-key, y con ':' codificado o no).
+- Contenido direccionado por sha256 y comprimido con zlib: dos recursos con
+  el mismo cuerpo comparten blob.
+- Frescura por tipo de recurso; pasada la frescura se revalida con
+  If-None-Match / If-Modified-Since y un 304 reutiliza el cuerpo guardado.
+- Solo se guardan respuestas 200.
+
+Variables: SR_DISK_CACHE (1/0), SR_DISK_CACHE_PATH, SR_DISK_MAX_AGE (fuerza
+una frescura única, p. ej. para backfills de temporadas cerradas) y
+SR_DISK_CACHE_OFFLINE=1 (sirve lo guardado sin mirar la edad).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+from typing import Callable, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+log = logging.getLogger("sr_disk_cache")
+
+SR_DISK_CACHE_PATH = os.getenv(
+    "SR_DISK_CACHE_PATH",
+    os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "sportradar", "sr_json.sqlite"),
+)
+SR_DISK_MAX_AGE = os.getenv("SR_DISK_MAX_AGE")
+SR_DISK_CACHE_OFFLINE = str(os.getenv("SR_DISK_CACHE_OFFLINE", "")).lower() in ("1", "true", "yes")
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Frescura (segundos) por recurso; gana la primera regla que casa con la ruta
+FRESHNESS_RULES: list[tuple[re.Pattern, int]] = [
+    (re.compile(r"/competitors/[^/]+/profile\.json$"), DAY),
+    (re.compile(r"/competitors/[^/]+/summaries\.json$"), HOUR),
+    (re.compile(r"/seasons/[^/]+/summaries\.json$"), 6 * HOUR),
+    (re.compile(r"/seasons/[^/]+/info\.json$"), 7 * DAY),
+    (re.compile(r"/competitions/[^/]+/seasons\.json$"), DAY),
+    (re.compile(r"/(competitions|seasons)\.json$"), 7 * DAY),
+    (re.compile(r"/rankings\.json$"), 6 * HOUR),
+]
+DEFAULT_FRESHNESS = HOUR
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+  sha256 TEXT PRIMARY KEY,
+  body   BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+  key           TEXT PRIMARY KEY,
+  sha256        TEXT NOT NULL REFERENCES blobs(sha256),
+  etag          TEXT,
+  last_modified TEXT,
+  fetched_at    REAL NOT NULL
+);
+"""
+
+
+def canonical_key(url: str) -> str:
+    """URL sin api_key, con la ruta decodificada y la query ordenada."""
+    u = urllib.parse.urlsplit(url)
+    q = sorted((k, v) for k, v in urllib.parse.parse_qsl(u.query, keep_blank_values=True) if k != "api_key")
+    path = urllib.parse.unquote(u.path)
+    return f"{u.netloc}{path}" + (f"?{urllib.parse.urlencode(q)}" if q else "")
+
+
+def freshness(key: str) -> float:
+    if SR_DISK_MAX_AGE:
+        return float(SR_DISK_MAX_AGE)
+    path = key.split("?", 1)[0]
+    for rx, secs in FRESHNESS_RULES:
+        if rx.search(path):
+            return secs
+    return DEFAULT_FRESHNESS
+
+
+def _response(url: str, body: bytes, status: int = 200, headers: dict | None = None) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r._content = body
+    r.url = url
+    r.encoding = "utf-8"
+    r.headers = CaseInsensitiveDict(headers or {"Content-Type": "application/json"})
+    return r
+
+
+class SRDiskCache:
+    def __init__(self, path: str = SR_DISK_CACHE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        self._stats = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0}
+
+    def _lookup(self, key: str):
+        with self._lock:
+            return self._db.execute(
+                "SELECT r.etag, r.last_modified, r.fetched_at, b.body FROM resources r "
+                "JOIN blobs b ON b.sha256 = r.sha256 WHERE r.key = ?", (key,)
+            ).fetchone()
+
+    def _store(self, key: str, body: bytes, etag: str | None, last_modified: str | None) -> None:
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                prev = self._db.execute("SELECT sha256 FROM resources WHERE key = ?", (key,)).fetchone()
+                self._db.execute("INSERT OR IGNORE INTO blobs(sha256, body) VALUES (?, ?)",
+                                 (digest, zlib.compress(body, 6)))
+                self._db.execute(
+                    "INSERT INTO resources(key, sha256, etag, last_modified, fetched_at) VALUES (?,?,?,?,?) "
+                    "ON CONFLICT(key) DO UPDATE SET sha256=excluded.sha256, etag=excluded.etag, "
+                    "last_modified=excluded.last_modified, fetched_at=excluded.fetched_at",
+                    (key, digest, etag, last_modified, time.time()),
+                )
+                # el cuerpo anterior sobra si ya no lo referencia ningún recurso
+                if prev and prev[0] != digest:
+                    self._db.execute(
+                        "DELETE FROM blobs WHERE sha256 = ? "
+                        "AND NOT EXISTS (SELECT 1 FROM resources WHERE sha256 = ?)", (prev[0], prev[0]))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._stats["stored"] += 1
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE resources SET fetched_at = ? WHERE key = ?", (time.time(), key))
+
+    def get(self, url: str, fetch: Callable[[dict], requests.Response]) -> tuple[requests.Response, str]:
+        """
+        Devuelve (respuesta, origen) con origen "hit" (disco, sin red),
+        "revalidated" (304) o "network". `fetch(headers_extra)` hace el GET real.
+        """
+        key = canonical_key(url)
+        row = self._lookup(key)
+        if row is not None:
+            etag, last_modified, fetched_at, blob = row
+            if SR_DISK_CACHE_OFFLINE or time.time() - fetched_at < freshness(key):
+                self._stats["hits"] += 1
+                return _response(url, zlib.decompress(blob)), "hit"
+
+        cond = {}
+        if row is not None:
+            if etag:
+                cond["If-None-Match"] = etag
+            if last_modified:
+                cond["If-Modified-Since"] = last_modified
+        r = fetch(cond)
+        if r.status_code == 304 and row is not None:
+            self._touch(key)
+            self._stats["revalidated"] += 1
+            return _response(url, zlib.decompress(row[3])), "revalidated"
+        self._stats["misses"] += 1
+        if r.status_code == 200:
+            try:
+                self._store(key, r.content, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+            except sqlite3.Error as e:
+                log.warning("SR disk cache: no se pudo guardar %s: %s", key, e)
+        return r, "network"
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, = self._db.execute("SELECT count(*) FROM resources").fetchone()
+            b, size = self._db.execute("SELECT count(*), coalesce(sum(length(body)), 0) FROM blobs").fetchone()
+        return {**self._stats, "resources": n, "blobs": b, "bytes": size}
+
+
+_DEFAULT: SRDiskCache | None = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_cache(enabled_by_default: bool) -> Optional[SRDiskCache]:
+    """
+    Caché compartida del proceso, o None si está desactivada. Los loaders la
+    activan por defecto; la API solo si SR_DISK_CACHE=1.
+    """
+    global _DEFAULT
+    flag = os.getenv("SR_DISK_CACHE")
+    enabled = enabled_by_default if flag is None else flag.lower() in ("1", "true", "yes")
+    if not enabled:
+        return None
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            try:
+                _DEFAULT = SRDiskCache()
+            except (OSError, sqlite3.Error) as e:
+                log.warning("SR disk cache desactivada (%s): %s", SR_DISK_CACHE_PATH, e)
+                return None
+        return _DEFAULT
+
+
+def cached_get(url: str, headers: dict | None = None, timeout: float = 30,
+               session=None, enabled_by_default: bool = True) -> tuple[requests.Response, str]:
+    """GET con la caché por defecto; (respuesta, origen) como SRDiskCache.get."""
+    http = session or requests
+
+    def fetch(extra: dict) -> requests.Response:
+        return http.get(url, headers={**(headers or {}), **extra}, timeout=timeout)
+
+    cache = default_cache(enabled_by_default)
+    if cache is None:
+        return fetch({}), "network"
+    return cache.get(url, fetch)
@@ -1,12 +1,16 @@
 # services/supabase_fs.py
 from __future__ import annotations
 import os, json, re
+import atexit
 import logging
+import threading
+import time
 import urllib.parse
 from typing import Any, Dict, Optional
 
 try:
     import psycopg2
+    import psycopg2.extensions
     from psycopg2.extras import RealDictCursor
 except ImportError:
     psycopg2 = None
@@ -14,6 +18,11 @@ except ImportError:
 import requests
 import datetime as _dt
 
+from services import http_client as HTTP
+from services import tourney_registry as TR
+from services import write_behind as WB
+from utils.ttl_cache import TTLCache
+
 # ───────────────────────────────────────────────────────────────────
 # Configuración
 # ───────────────────────────────────────────────────────────────────
@@ -61,21 +70,18 @@ def get_defense_prev_year(tourney_name: str, player_ids, conn=None):
     WHERE tourney_key = public.norm_tourney(%s)
       AND player_id = ANY(%s)
     """
-    close_conn = False
-    if conn is None:
-        conn = psycopg.connect(os.environ["DATABASE_URL"])
-        close_conn = True
+    pg, opened = _pg_conn_or_env(conn)
     try:
-        with conn.cursor() as cur:
-            cur.execute(sql, (tkey, player_ids))
+        with pg.cursor() as cur:
+            cur.execute(sql, (tkey, list(player_ids)))
             rows = cur.fetchall()
         out = {}
         for pid, pts, code in rows:
             out[pid] = {"points": pts, "title_code": code}
         return out
     finally:
-        if close_conn:
-            conn.close()
+        if opened:
+            _pg_release(pg)
 
 def _get(table: str, params: Dict[str, Any] | None = None, select: str = "*") -> list[dict]:
     if not SUPABASE_URL or not SUPABASE_KEY:
@@ -84,17 +90,33 @@ def _get(table: str, params: Dict[str, Any] | None = None, select: str = "*") ->
     if params:
         q.update(params)
     url = f"{SUPABASE_URL}/rest/v1/{table}?{urllib.parse.urlencode(q, doseq=True)}"
-    r = requests.get(url, headers=HEADERS_SB, timeout=HTTP_TIMEOUT)
+    r = HTTP.get(url, headers=HEADERS_SB, timeout=HTTP_TIMEOUT)
     if r.status_code >= 300:
         log.warning("SB GET %s -> %s %s", table, r.status_code, r.text[:200])
     r.raise_for_status()
     return r.json()
 
+# PostgREST corta cada GET en max-rows (1000 por defecto) sin avisar
+SB_PAGE_SIZE = int(os.environ.get("SB_PAGE_SIZE", "1000"))
+
+def _get_all(table: str, select: str, order: str, params: Dict[str, Any] | None = None) -> list[dict]:
+    """Lee la tabla entera paginando con limit/offset hasta una página corta."""
+    rows: list[dict] = []
+    offset = 0
+    while True:
+        page = _get(table, {**(params or {}), "order": order, "limit": SB_PAGE_SIZE, "offset": offset},
+                    select=select)
+        rows.extend(page)
+        if len(page) < SB_PAGE_SIZE:
+            return rows
+        offset += SB_PAGE_SIZE
+
 def _rpc(fn: str, payload: Dict[str, Any]) -> Any:
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise RuntimeError("SUPABASE_URL / SUPABASE_KEY no configurados.")
     url = f"{SUPABASE_URL}/rest/v1/rpc/{fn}"
-    r = requests.post(url, headers=HEADERS_SB, json=payload, timeout=HTTP_TIMEOUT)
+    # Las RPC que usamos son de solo lectura: se pueden reintentar
+    r = HTTP.post(url, headers=HEADERS_SB, json=payload, timeout=HTTP_TIMEOUT, retry=True)
     if r.status_code >= 300:
         log.info("SB RPC %s(%s) -> %s %s", fn, payload, r.status_code, r.text[:200])
         r.raise_for_status()
@@ -107,14 +129,141 @@ def _rpc(fn: str, payload: Dict[str, Any]) -> Any:
 
 DISABLE_DB_CACHE = str(os.environ.get("DISABLE_DB_CACHE", "")).lower() in ("1","true","yes")
 
+# Pool de conexiones (PG_POOL_MAX=0 vuelve a una conexión por llamada)
+PG_POOL_MIN = int(os.environ.get("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.environ.get("PG_POOL_MAX", "10"))
+PG_POOL_WAIT_SECS = float(os.environ.get("PG_POOL_WAIT_SECS", "10"))
+PG_POOL_PING_SECS = float(os.environ.get("PG_POOL_PING_SECS", "60"))
+PG_STATEMENT_TIMEOUT_MS = int(os.environ.get("PG_STATEMENT_TIMEOUT_MS", "15000"))
+
+_PG_POOL = None
+_PG_POOL_LOCK = threading.Lock()
+_PG_POOL_SEM: threading.BoundedSemaphore | None = None
+_PG_LAST_USED: dict[int, float] = {}   # id(conn) -> monotonic de la última devolución
+_PG_STATS = {"created": 0, "borrowed": 0, "discarded": 0}
+
+def _pg_dsn() -> str | None:
+    return os.environ.get("DATABASE_URL") or os.environ.get("SUPABASE_DB_URL")
+
+def _pg_prepare(pg) -> None:
+    # SET en vez de `options=-c ...`: el pooler de Supabase no acepta `options`
+    if PG_STATEMENT_TIMEOUT_MS > 0:
+        with pg.cursor() as cur:
+            cur.execute("SET statement_timeout = %s", (PG_STATEMENT_TIMEOUT_MS,))
+        pg.commit()
+    _PG_STATS["created"] += 1
+
+def _pg_pool():
+    global _PG_POOL, _PG_POOL_SEM
+    if _PG_POOL is not None:
+        return _PG_POOL
+    with _PG_POOL_LOCK:
+        if _PG_POOL is None:
+            from psycopg2.pool import ThreadedConnectionPool
+            size = max(1, PG_POOL_MAX)
+            _PG_POOL = ThreadedConnectionPool(min(PG_POOL_MIN, size), size, _pg_dsn())
+            # psycopg2 cierra al devolverlas las conexiones por encima de minconn;
+            # abrimos PG_POOL_MIN al arrancar pero conservamos hasta `size` ociosas.
+            _PG_POOL.minconn = size
+            _PG_POOL_SEM = threading.BoundedSemaphore(size)
+            atexit.register(_pg_pool_close)
+    return _PG_POOL
+
+def _pg_pool_close() -> None:
+    global _PG_POOL
+    with _PG_POOL_LOCK:
+        if _PG_POOL is not None:
+            try:
+                _PG_POOL.closeall()
+            except Exception:
+                pass
+            _PG_POOL = None
+            _PG_LAST_USED.clear()
+
+def _pg_healthy(pg) -> bool:
+    if pg.closed:
+        return False
+    last = _PG_LAST_USED.get(id(pg))
+    if last is None or time.monotonic() - last < PG_POOL_PING_SECS:
+        return True
+    # Conexión ociosa un buen rato: comprobamos que el servidor no la cortó
+    try:
+        with pg.cursor() as cur:
+            cur.execute("SELECT 1")
+        pg.rollback()
+        return True
+    except Exception:
+        return False
+
+def _pg_borrow():
+    pool = _pg_pool()
+    # El semáforo hace esperar a los hilos en vez de que el pool lance PoolError
+    if not _PG_POOL_SEM.acquire(timeout=PG_POOL_WAIT_SECS):
+        raise RuntimeError(f"pool PG agotado ({PG_POOL_MAX} conexiones en uso)")
+    try:
+        for _ in range(3):
+            pg = pool.getconn()
+            if id(pg) not in _PG_LAST_USED:
+                _pg_prepare(pg)
+                _PG_LAST_USED[id(pg)] = time.monotonic()
+                return pg
+            if _pg_healthy(pg):
+                return pg
+            _PG_LAST_USED.pop(id(pg), None)
+            _PG_STATS["discarded"] += 1
+            pool.putconn(pg, close=True)
+        raise RuntimeError("no se pudo obtener una conexión PG sana")
+    except Exception:
+        _PG_POOL_SEM.release()
+        raise
+
+def _pg_release(pg) -> None:
+    """Devuelve al pool una conexión obtenida con `_pg_conn_or_env` (opened=True)."""
+    if PG_POOL_MAX <= 0 or _PG_POOL is None:
+        pg.close()
+        return
+    try:
+        broken = bool(pg.closed)
+        if not broken and pg.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # Lo no confirmado por el llamador se descarta
+            try:
+                pg.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            _PG_LAST_USED.pop(id(pg), None)
+            _PG_STATS["discarded"] += 1
+        else:
+            _PG_LAST_USED[id(pg)] = time.monotonic()
+        _PG_POOL.putconn(pg, close=broken)
+    finally:
+        _PG_POOL_SEM.release()
+
+def pg_pool_stats() -> dict:
+    pool = _PG_POOL
+    return {
+        "enabled": PG_POOL_MAX > 0,
+        "max": PG_POOL_MAX,
+        "in_use": len(pool._used) if pool is not None else 0,
+        "idle": len(pool._pool) if pool is not None else 0,
+        **_PG_STATS,
+    }
+
 def _pg_conn_or_env(conn=None):
+    """
+    Devuelve (conexión, opened). Si opened es True, el llamador la
+    devuelve con `_pg_release` (no con `close()`).
+    """
     if conn:
         return conn, False
     if psycopg2 is None:
         raise RuntimeError("psycopg2 no disponible y no se pasó conn")
-    dsn = os.environ.get("DATABASE_URL") or os.environ.get("SUPABASE_DB_URL")
-    pg = psycopg2.connect(dsn)
-    return pg, True
+    if PG_POOL_MAX <= 0:
+        pg = psycopg2.connect(_pg_dsn())
+        _pg_prepare(pg)
+        return pg, True
+    _PG_STATS["borrowed"] += 1
+    return _pg_borrow(), True
 
 # --- helpers PG-only ------------------------------------------------
 
@@ -126,7 +275,7 @@ def _pg_fetch_one(sql: str, params: tuple = (), conn=None) -> dict | None:
                 cur.execute(sql, params)
                 return cur.fetchone()
         finally:
-            if opened: pg.close()
+            if opened: _pg_release(pg)
     except Exception as e:
         log.info("_pg_fetch_one fallo: %s", e)
     return None
@@ -137,35 +286,24 @@ def _pg_fetch_one(sql: str, params: tuple = (), conn=None) -> dict | None:
 # ───────────────────────────────────────────────────────────────────
 
 def norm_tourney(txt: str | None) -> str | None:
+    # Réplica local de public.norm_tourney(): sin ida y vuelta a BD
     if not txt:
         return None
-    try:
-        res = _rpc("norm_tourney", {"txt": txt})
-        if isinstance(res, list) and res:
-            res = res[0]
-        if isinstance(res, dict) and "norm_tourney" in res:
-            return res["norm_tourney"]
-        if isinstance(res, str):
-            return res
-    except Exception:
-        pass
-    # fallback local
-    return re.sub(r'[^a-z0-9]+', ' ', txt.lower()).strip()
-
-def _speed_bucket_from_rank(rank):
-    if rank is None:
-        return None
-    r = int(rank)
-    return "Fast" if r <= 33 else ("Medium" if r <= 66 else "Slow")
+    return TR.norm_tourney(txt)
 
 def get_tourney_meta(tournament_name: str) -> dict:
     """
     1º intenta tourney_speed_resolved por clave normalizada;
     2º fallback a court_speed_rankig_norm por ILIKE;
     devuelve surface/speed_rank/speed_bucket/category si hay.
+    Se resuelve en memoria con TOURNEYS; solo si el registro no ha podido
+    cargarse se consulta PostgREST.
     """
     if not tournament_name:
         return {}
+    meta = TOURNEYS.meta(tournament_name)
+    if meta is not None:
+        return meta
     key = norm_tourney(tournament_name)
     # 1) resolved
     if key:
@@ -176,15 +314,7 @@ def get_tourney_meta(tournament_name: str) -> dict:
                 select="tourney_key,surface,speed_rank,speed_bucket"
             )
             if rows:
-                row = rows[0]
-                meta = {
-                    "surface": (row.get("surface") or "hard").lower(),
-                    "speed_rank": row.get("speed_rank"),
-                    "speed_bucket": row.get("speed_bucket"),
-                }
-                if not meta.get("speed_bucket"):
-                    meta["speed_bucket"] = _speed_bucket_from_rank(meta.get("speed_rank")) or "Medium"
-                return meta
+                return TR.meta_from_row(rows[0])
         except Exception:
             pass
     # 2) compat
@@ -198,21 +328,14 @@ def get_tourney_meta(tournament_name: str) -> dict:
         rows = []
     if not rows:
         return {}
-    row = rows[0]
-    meta = {
-        "surface": (row.get("surface") or "hard").lower(),
-        "speed_rank": row.get("speed_rank"),
-        "speed_bucket": row.get("speed_bucket"),
-        "category": row.get("category"),
-    }
-    if not meta.get("speed_bucket"):
-        meta["speed_bucket"] = _speed_bucket_from_rank(meta.get("speed_rank")) or "Medium"
-    return meta
+    return TR.meta_from_row(rows[0], with_category=True)
 
 # tourney_speed_resolved / court_speed_rankig_norm no tienen columna country_code
 # (la consulta de abajo siempre devuelve vacio), asi que el pais del torneo se
-# resuelve con este mapa estatico por tourney_key. Codigos IOC de 3 letras para
-# que casen con players_lookup.country_code (ej. "GBR", no "GB").
+# resuelve con este mapa estatico por tourney_key (más tourney_country_map, que
+# manda si ambos tienen la clave). Codigos IOC de 3 letras para que casen con
+# players_lookup.country_code (ej. "GBR", no "GB"). TourneyRegistry normaliza
+# las claves, así que "monte-carlo" casa con la clave "monte carlo".
 _TOURNEY_COUNTRY_IOC: dict[str, str] = {
     "acapulco": "MEX",
     "adelaide": "AUS",
@@ -281,6 +404,8 @@ def get_tourney_country(tournament_name: str | None) -> str | None:
     """Devuelve el codigo de pais (IOC-3) donde se juega el torneo, si se conoce."""
     if not tournament_name:
         return None
+    if TOURNEYS.loaded:
+        return TOURNEYS.country(tournament_name)
     key = norm_tourney(tournament_name)
     if key and key in _TOURNEY_COUNTRY_IOC:
         return _TOURNEY_COUNTRY_IOC[key]
@@ -305,6 +430,32 @@ def get_tourney_country(tournament_name: str | None) -> str | None:
     return None
 
 
+def _load_tourney_tables() -> dict:
+    """Tablas pequeñas (cientos de filas): se leen enteras, paginando."""
+    speeds = _get_all("court_speed_rankig_norm", "tournament_name,surface,speed_rank,speed_bucket,category",
+                      order="tournament_name,surface")
+    # La vista keyed da la clave calculada por la BD: sirve de control de norm_tourney()
+    keyed = {r["tournament_name"]: r.get("tourney_key")
+             for r in _get_all("court_speed_rankig_norm_compat_keyed", "tournament_name,tourney_key",
+                               order="tournament_name,tourney_key")
+             if r.get("tournament_name")}
+    for r in speeds:
+        r["tourney_key"] = keyed.get(r.get("tournament_name"))
+    try:
+        countries = _get_all("tourney_country_map", "tourney_key,country_code", order="tourney_key")
+    except Exception:
+        countries = []   # migración 2025_09_01 opcional
+    return {
+        "resolved": _get_all("tourney_speed_resolved", "tourney_key,surface,speed_rank,speed_bucket",
+                             order="tourney_key"),
+        "aliases": _get_all("tourney_key_map", "src_key,dest_key", order="src_key"),
+        "countries": countries,
+        "speeds": speeds,
+    }
+
+TOURNEYS = TR.TourneyRegistry(_load_tourney_tables, static_countries=_TOURNEY_COUNTRY_IOC)
+
+
 # ───────────────────────────────────────────────────────────────────
 # Feature store – winrates (RPC o vistas precalculadas)
 # ───────────────────────────────────────────────────────────────────
@@ -398,6 +549,29 @@ def _winrate_speed(player_id: int, speed_bucket: str, years_back: int) -> Option
 # Matchup histórico (RPC con fallback a winrates)
 # ───────────────────────────────────────────────────────────────────
 
+# RPC del vector HIST: por defecto la que lee del agregado fs_hist_agg
+# (migración 2026_10_18_fs_hist_agg.sql); si no está desplegada se vuelve a
+# get_matchup_hist_vector, que recorre fs_matches_long.
+HIST_VECTOR_RPC = os.environ.get("HIST_VECTOR_RPC", "get_matchup_hist_vector_agg")
+_HIST_RPC_MISSING = False
+
+
+def _hist_vector_rpc(payload: dict) -> Any:
+    global _HIST_RPC_MISSING
+    if HIST_VECTOR_RPC != "get_matchup_hist_vector" and not _HIST_RPC_MISSING:
+        try:
+            return _rpc(HIST_VECTOR_RPC, payload)
+        except requests.HTTPError as e:
+            if getattr(e.response, "status_code", None) == 404:
+                _HIST_RPC_MISSING = True
+                log.info("RPC %s no desplegada; se usa get_matchup_hist_vector", HIST_VECTOR_RPC)
+            else:
+                log.info("RPC %s falló (%s); se usa get_matchup_hist_vector", HIST_VECTOR_RPC, e)
+        except Exception as e:
+            log.info("RPC %s falló (%s); se usa get_matchup_hist_vector", HIST_VECTOR_RPC, e)
+    return _rpc("get_matchup_hist_vector", payload)
+
+
 def get_matchup_hist_vector(
     p_id: int,
     o_id: int,
@@ -415,7 +589,7 @@ def get_matchup_hist_vector(
             "p_tournament_name": tname,
             "p_month": int(month),
         }
-        data = _rpc("get_matchup_hist_vector", payload)
+        data = _hist_vector_rpc(payload)
         if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
             data = data[0]
         if isinstance(data, dict) and "d_hist_month" in data:
@@ -493,6 +667,84 @@ def get_matchup_hist_vector(
     return out
 
 
+def get_players_hist_winrates(
+    player_ids: list[int],
+    yrs: int,
+    tname: str,
+    month: int,
+) -> dict | None:
+    """
+    Winrates HIST suavizadas de varios jugadores en una sola RPC
+    (get_players_hist_winrates). Devuelve
+      {"surface", "speed_bucket", "players": {pid: {"wr_month", "wr_surf", "wr_speed"}}}
+    o None si la RPC no está disponible (el llamador cae a la RPC por pareja).
+    d_hist_* de un cruce = wr_*(p) - wr_*(o), igual que get_matchup_hist_vector.
+    """
+    ids = sorted({int(x) for x in player_ids if x is not None})
+    if not ids:
+        return None
+    try:
+        rows = _rpc("get_players_hist_winrates", {
+            "p_player_ids": ids,
+            "p_years_back": int(yrs),
+            "p_as_of": _dt.date.today().isoformat(),
+            "p_tournament_name": tname,
+            "p_month": int(month),
+        })
+    except Exception as e:
+        log.info("RPC get_players_hist_winrates no disponible: %s", e)
+        return None
+    if not isinstance(rows, list) or not rows:
+        return None
+    first = rows[0]
+    return {
+        "surface": (first.get("surface") or "hard").lower(),
+        "speed_bucket": first.get("speed_bucket") or "Medium",
+        "players": {
+            int(r["player_id"]): {
+                "wr_month": float(r["wr_month"]),
+                "wr_surf": float(r["wr_surf"]),
+                "wr_speed": float(r["wr_speed"]),
+            }
+            for r in rows
+            if r.get("player_id") is not None
+        },
+    }
+
+
+def get_player_hist_winrates(player_id: int, yrs: int, tname: str, month: int) -> dict | None:
+    """
+    Winrates HIST suavizadas de un jugador (fallback de
+    `get_players_hist_winrates`): la RPC del vector con el jugador contra sí
+    mismo devuelve sus wr_*_p con el mismo k que /matchup. Devuelve
+    {"surface", "speed_bucket", "wr_month", "wr_surf", "wr_speed"} o None si
+    la RPC falla (sin caer a los helpers sin suavizar).
+    """
+    try:
+        data = _hist_vector_rpc({
+            "p_player_id": int(player_id),
+            "p_opponent_id": int(player_id),
+            "p_years_back": int(yrs),
+            "p_as_of": _dt.date.today().isoformat(),
+            "p_tournament_name": tname,
+            "p_month": int(month),
+        })
+    except Exception as e:
+        log.info("RPC del vector HIST falló para %s: %s", player_id, e)
+        return None
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict) or any(data.get(k) is None for k in ("wr_month_p", "wr_surf_p", "wr_speed_p")):
+        return None
+    return {
+        "surface": (data.get("surface") or "hard").lower(),
+        "speed_bucket": data.get("speed_bucket") or "Medium",
+        "wr_month": float(data["wr_month_p"]),
+        "wr_surf": float(data["wr_surf_p"]),
+        "wr_speed": float(data["wr_speed_p"]),
+    }
+
+
 # ───────────────────────────────────────────────────────────────────
 # Player meta: Ranking + YTD (DB → SR fallback)
 # ───────────────────────────────────────────────────────────────────
@@ -521,7 +773,7 @@ def _get_rank_from_db_view(player_id_int: int, conn=None) -> tuple[Optional[int]
                 if row:
                     return (row.get("rank"), row.get("points"))
         finally:
-            if opened: pg.close()
+            if opened: _pg_release(pg)
     except Exception as e:
         log.info("_get_rank_from_db_view fallo: %s", e)
     return (None, None)
@@ -544,7 +796,7 @@ def _get_ytd_from_db_view(player_id_int: int, conn=None) -> Optional[float]:
                 if row and row.get("winrate") is not None:
                     return float(row["winrate"])
         finally:
-            if opened: pg.close()
+            if opened: _pg_release(pg)
     except Exception as e:
         log.info("_get_ytd_from_db_view fallo: %s", e)
     return None
@@ -583,7 +835,7 @@ def _upsert_rank_snapshot_sr(player_id_int: int, rank: int,
                 """, (year, week, int(player_id_int), int(rank), points, name, country_code))
             if opened: pg.commit()
         finally:
-            if opened: pg.close()
+            if opened: _pg_release(pg)
     except Exception as e:
         log.info("_upsert_rank_snapshot_sr fallo (no crítico): %s", e)
 
@@ -631,20 +883,98 @@ def get_sr_id_from_player_int(player_id: int) -> str | None:
 
 
 
-def get_player_meta(
-    pid_int: Optional[int] = None,
-    sr_id: Optional[str] = None,
-    asof_date: Optional[date] = None,
-    conn=None,
-) -> Dict[str, Any]:
-    """
-    Devuelve metadatos de jugador tirando **solo de BD**:
-      - players_lookup (name, country_code, ext_sportradar_id)
-      - v_player_rank_now_int (rank/points actuales)
-      - v_player_ytd_now_int (win-rate YTD)
-      - fallback a rankings_snapshot_int para name/country si faltan
-    """
-    meta: Dict[str, Any] = {
+_YTD_COLUMN_CANDIDATES = ("wr", "ytd_wr", "winrate")
+_ytd_column: str | None = None
+_ytd_column_checked = False
+
+def _ytd_wr_column(pg) -> str | None:
+    """Nombre de la columna de win-rate en v_player_ytd_now_int (se detecta una vez)."""
+    global _ytd_column, _ytd_column_checked
+    if _ytd_column_checked:
+        return _ytd_column
+    with pg.cursor() as cur:
+        cur.execute("""
+            select column_name
+            from information_schema.columns
+            where table_schema = 'public'
+              and table_name = 'v_player_ytd_now_int'
+              and column_name = any(%s)
+        """, (list(_YTD_COLUMN_CANDIDATES),))
+        found = {r[0] for r in cur.fetchall()}
+    _ytd_column = next((c for c in _YTD_COLUMN_CANDIDATES if c in found), None)
+    _ytd_column_checked = True
+    if _ytd_column is None:
+        log.info("v_player_ytd_now_int sin columna de win-rate (%s)", ", ".join(_YTD_COLUMN_CANDIDATES))
+    return _ytd_column
+
+_PLAYERS_META_SQL = """
+with req as (
+  select u.ord, u.pid_in, u.sr_in
+  from unnest(%s::int[], %s::text[]) with ordinality as u(pid_in, sr_in, ord)
+),
+ids as (
+  select r.ord,
+         coalesce(r.pid_in, sm.player_id,
+                  nullif(regexp_replace(r.sr_in, '\\D', '', 'g'), '')::int) as player_id
+  from req r
+  left join lateral (
+    select pl.player_id
+    from public.players_lookup pl
+    where r.pid_in is null and r.sr_in is not null
+      and pl.ext_sportradar_id in (r.sr_in, regexp_replace(r.sr_in, '^sr:competitor:', ''))
+    limit 1
+  ) sm on true
+)
+select i.ord, i.player_id,
+       pl.name, pl.country_code,
+       coalesce(nullif(pl.ext_sportradar_id, ''), pe.ext_sportradar_id) as ext_sportradar_id,
+       rk.rank, rk.points,
+       yt.wr,
+       rs.player_name as snap_name, rs.country_code as snap_country
+from ids i
+left join lateral (
+  select name, country_code, ext_sportradar_id
+  from public.players_lookup where player_id = i.player_id limit 1
+) pl on true
+left join lateral (
+  select ext_sportradar_id
+  from public.players_ext
+  where player_id = i.player_id and coalesce(ext_sportradar_id, '') <> ''
+  limit 1
+) pe on true
+left join lateral (
+  select rank, points
+  from public.v_player_rank_now_int where player_id = i.player_id limit 1
+) rk on true
+left join lateral (
+  select {ytd_expr} as wr
+  from public.v_player_ytd_now_int where player_id = i.player_id limit 1
+) yt on true
+left join lateral (
+  select player_name, country_code
+  from public.rankings_snapshot_int
+  where player_id = i.player_id
+  order by snapshot_date desc
+  limit 1
+) rs on true
+order by i.ord
+"""
+
+def _split_player_ref(ref) -> tuple[Optional[int], Optional[str]]:
+    """int / '123' -> (pid, None); 'sr:competitor:123' -> (None, sr_id)."""
+    if ref is None or isinstance(ref, bool):
+        return None, None
+    if isinstance(ref, int):
+        return ref, None
+    s = str(ref).strip()
+    if not s:
+        return None, None
+    if s.isdigit():
+        return int(s), None
+    return None, s
+
+def _empty_player_meta(pid_int: Optional[int]) -> Dict[str, Any]:
+    return {
         "player_id": pid_int,
         "ext_sportradar_id": None,
         "name": None,
@@ -655,106 +985,67 @@ def get_player_meta(
         "ytd_wr": None,        # 0..1
     }
 
-    # Si viene sr_id y no tenemos pid_int, intenta extraer los dígitos
-    if pid_int is None and sr_id:
-        try:
-            m = re.search(r"(\d+)$", sr_id)
-            if m:
-                pid_int = int(m.group(1))
-                meta["player_id"] = pid_int
-        except Exception:
-            pass
+def get_players_meta(players: list, conn=None) -> list[Dict[str, Any]]:
+    """
+    Meta de varios jugadores en una sola consulta (solo BD). `players` admite
+    player_id INT, '123' o 'sr:competitor:123'; devuelve una lista alineada
+    con la entrada (mismas claves que `get_player_meta`).
+      - players_lookup / players_ext (name, country_code, ext_sportradar_id)
+      - v_player_rank_now_int (rank/points actuales)
+      - v_player_ytd_now_int (win-rate YTD)
+      - último rankings_snapshot_int para name/country si faltan
+    """
+    refs = [_split_player_ref(p) for p in players]
+    metas = []
+    for pid, sr in refs:
+        if pid is None and sr:
+            m = re.search(r"(\d+)$", sr)
+            pid = int(m.group(1)) if m else None
+        metas.append(_empty_player_meta(pid))
+    if not any(pid is not None or sr for pid, sr in refs):
+        return metas
 
-    # --- 1) BD directo: players_lookup (name/country/sr_id)
-    if pid_int is not None:
-        row = _pg_fetch_one(
-            """
-            select name, country_code, ext_sportradar_id
-            from public.players_lookup
-            where player_id = %s
-            limit 1
-            """,
-            (int(pid_int),),
-            conn=conn,
-        )
-        if row:
-            if not meta["name"]:
-                meta["name"] = row.get("name")
-            if not meta["country_code"]:
-                meta["country_code"] = row.get("country_code")
-            if not meta["ext_sportradar_id"] and row.get("ext_sportradar_id"):
-                ext = row["ext_sportradar_id"]
-                meta["ext_sportradar_id"] = ext if isinstance(ext, str) and ext.startswith("sr:") else f"sr:competitor:{ext}"
-
-    # --- 2) SR id desde BD auxiliar si aún falta
-    if not meta["ext_sportradar_id"] and pid_int is not None:
-        meta["ext_sportradar_id"] = get_sr_id_from_player_int(pid_int)
-
-    # --- 3) Rank ahora (vista DB)
-    if pid_int is not None:
-        row = _pg_fetch_one(
-            """
-            select rank, points
-            from public.v_player_rank_now_int
-            where player_id = %s
-            limit 1
-            """,
-            (int(pid_int),),
-            conn=conn,
-        )
-        if row:
-            meta["rank"] = row.get("rank")
+    try:
+        pg, opened = _pg_conn_or_env(conn)
+        try:
+            col = _ytd_wr_column(pg)
+            sql = _PLAYERS_META_SQL.format(ytd_expr=f"{col}::float8" if col else "null::float8")
+            with pg.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, ([r[0] for r in refs], [r[1] for r in refs]))
+                rows = cur.fetchall()
+        finally:
+            if opened: _pg_release(pg)
+    except Exception as e:
+        log.info("get_players_meta fallo: %s", e)
+        return metas
+
+    for row in rows:
+        meta = metas[int(row["ord"]) - 1]
+        if row.get("player_id") is not None:
+            meta["player_id"] = row["player_id"]
+        ext = row.get("ext_sportradar_id")
+        if ext:
+            meta["ext_sportradar_id"] = ext if ext.startswith("sr:") else f"sr:competitor:{ext}"
+        meta["name"] = row.get("name") or row.get("snap_name")
+        meta["country_code"] = row.get("country_code") or row.get("snap_country")
+        if row.get("rank") is not None:
+            meta["rank"] = row["rank"]
             meta["rank_points"] = row.get("points")
             meta["rank_source"] = "db:rankings_snapshot_int"
-
-    # --- 4) YTD ahora (vista DB)
-    if pid_int is not None and meta["ytd_wr"] is None:
-        # Asumimos que la vista expone 'wr' o 'ytd_wr'; probamos 'wr' primero
-        row = _pg_fetch_one(
-            """
-            select wr
-            from public.v_player_ytd_now_int
-            where player_id = %s
-            limit 1
-            """,
-            (int(pid_int),),
-            conn=conn,
-        )
-        if not row:
-            # fallback de nombre alternativo
-            row = _pg_fetch_one(
-                """
-                select ytd_wr as wr
-                from public.v_player_ytd_now_int
-                where player_id = %s
-                limit 1
-                """,
-                (int(pid_int),),
-                conn=conn,
-            )
-        if row and row.get("wr") is not None:
+        if row.get("wr") is not None:
             meta["ytd_wr"] = float(row["wr"])
+    return metas
 
-    # --- 5) Fallback final de nombre/país: último snapshot de rankings si siguen faltando
-    if pid_int is not None and (meta["name"] is None or meta["country_code"] is None):
-        row = _pg_fetch_one(
-            """
-            select player_name, country_code
-            from public.rankings_snapshot_int
-            where player_id = %s
-            order by snapshot_date desc
-            limit 1
-            """,
-            (int(pid_int),),
-            conn=conn,
-        )
-        if row:
-            if meta["name"] is None and row.get("player_name"):
-                meta["name"] = row["player_name"]
-            if meta["country_code"] is None and row.get("country_code"):
-                meta["country_code"] = row["country_code"]
-
-    return meta
+def get_player_meta(
+    pid_int: Optional[int] = None,
+    sr_id: Optional[str] = None,
+    asof_date: Optional[date] = None,
+    conn=None,
+) -> Dict[str, Any]:
+    """
+    Meta de un jugador (solo BD); ver `get_players_meta`.
+    """
+    return get_players_meta([pid_int if pid_int is not None else sr_id], conn=conn)[0]
 
 
 
@@ -773,14 +1064,9 @@ def get_defense_prev_year_by_sr(tourney_name: str, sr_ids, conn=None):
         return {}
     ids = [int(x) for x in sr_ids if x is not None]
 
-    close = False
-    if conn is None:
-        import os, psycopg
-        conn = psycopg.connect(os.environ["DATABASE_URL"])
-        close = True
-
+    pg, opened = _pg_conn_or_env(conn)
     try:
-        with conn.cursor() as cur:
+        with pg.cursor() as cur:
             # 1) Intento con la vista puente (más directa)
             try:
                 cur.execute(
@@ -797,7 +1083,9 @@ def get_defense_prev_year_by_sr(tourney_name: str, sr_ids, conn=None):
                     return {r[0]: {"points": r[1], "title_code": r[2]} for r in rows}
             except Exception:
                 # La vista no existe o no es accesible: fallback via mapping
-                pass
+                # (la transacción quedó abortada; solo la limpiamos si es nuestra)
+                if opened:
+                    pg.rollback()
 
             # 2) Fallback: player_defense_prev_year + mapping (players_ext/players_lookup)
             cur.execute(
@@ -825,9 +1113,69 @@ def get_defense_prev_year_by_sr(tourney_name: str, sr_ids, conn=None):
             rows = cur.fetchall()
             return {r[0]: {"points": r[1], "title_code": r[2]} for r in rows}
     finally:
-        if close:
-            conn.close()
+        if opened:
+            _pg_release(pg)
+
+
+# L1 en proceso delante de matchup_cache (mismos TTL que usa /matchup al escribir)
+CACHE_TTL_SR_SECS = int(os.environ.get("CACHE_TTL_SR_SECS", str(12*3600)))
+CACHE_TTL_HIST_SECS = int(os.environ.get("CACHE_TTL_HIST_SECS", str(30*24*3600)))
+MATCHUP_L1 = TTLCache(max_entries=int(os.environ.get("MATCHUP_L1_MAX_ENTRIES", "4096")))
+
+def matchup_cache_ttl(using_sr: bool) -> int:
+    return CACHE_TTL_SR_SECS if using_sr else CACHE_TTL_HIST_SECS
+
+def _matchup_l1_key(player_id, opponent_id, tkey, mon, speed_bucket, years_back, using_sr) -> tuple:
+    # speed en minúsculas, como la columna speed_key de matchup_cache
+    return (int(player_id), int(opponent_id), tkey, int(mon),
+            (speed_bucket or "").lower(), int(years_back), bool(using_sr))
+
+def _swap_sides(d: dict) -> dict:
+    out = {}
+    for k, v in d.items():
+        if k.endswith("_p"):
+            k = k[:-2] + "_o"
+        elif k.endswith("_o"):
+            k = k[:-2] + "_p"
+        out[k] = v
+    return out
 
+def _flip_cached(value: dict) -> dict:
+    """Entrada de (p, o) vista como (o, p): 1-prob, deltas negados, flags _p/_o intercambiados."""
+    features = value.get("features") or {}
+    flipped_features = dict(features)
+    if isinstance(features.get("deltas"), dict):
+        flipped_features["deltas"] = {k: (-v if isinstance(v, (int, float)) else v)
+                                      for k, v in features["deltas"].items()}
+    if isinstance(features.get("flags"), dict):
+        flipped_features["flags"] = _swap_sides(features["flags"])
+    out = dict(value)
+    out["prob_player"] = 1.0 - float(value.get("prob_player", 0.5))
+    out["features"] = flipped_features
+    if isinstance(value.get("flags"), dict):
+        out["flags"] = _swap_sides(value["flags"])
+    return out
+
+def _matchup_l1_get(player_id, opponent_id, tkey, mon, speed_bucket, years_back, using_sr):
+    hit = MATCHUP_L1.get(_matchup_l1_key(player_id, opponent_id, tkey, mon, speed_bucket, years_back, using_sr))
+    if hit is not None:
+        return hit
+    hit = MATCHUP_L1.get(_matchup_l1_key(opponent_id, player_id, tkey, mon, speed_bucket, years_back, using_sr))
+    return _flip_cached(hit) if hit is not None else None
+
+# Mismo contenido que public.get_matchup_cache_json() + segundos que le quedan a la fila
+_MATCHUP_CACHE_GET_SQL = """
+    SELECT to_jsonb(t) - 'ttl_left', t.ttl_left
+    FROM (
+      SELECT prob_player, features, flags, weights_hist, sources,
+             EXTRACT(EPOCH FROM expires_at - now()) AS ttl_left
+      FROM public.matchup_cache
+      WHERE player_id = %s AND opponent_id = %s AND tourney_key = %s AND mon = %s
+        AND speed_key = lower(COALESCE(%s, '')) AND years_back = %s AND using_sr = %s
+        AND (expires_at IS NULL OR expires_at > now())
+      LIMIT 1
+    ) t
+"""
 
 def get_matchup_cache_json(player_id:int, opponent_id:int,
                            tournament_name:str, mon:int,
@@ -835,19 +1183,122 @@ def get_matchup_cache_json(player_id:int, opponent_id:int,
                            using_sr:bool, conn=None):
     if DISABLE_DB_CACHE or psycopg2 is None:
         return None, None
+    args = (mon, speed_bucket, years_back, using_sr)
+    tkey = TR.norm_tourney(tournament_name)
+    if tkey is not None:
+        hit = _matchup_l1_get(player_id, opponent_id, tkey, *args)
+        if hit is not None:
+            return tkey, hit
+
     pg, opened = _pg_conn_or_env(conn)
     try:
         with pg.cursor() as cur:
-            cur.execute("SELECT public.norm_tourney(%s)", (tournament_name,))
-            tkey = (cur.fetchone() or [None])[0]
-            cur.execute("""
-                SELECT public.get_matchup_cache_json(%s,%s,%s,%s,%s,%s,%s)
-            """, (player_id, opponent_id, tkey, mon, speed_bucket or "", years_back, using_sr))
+            cur.execute(_MATCHUP_CACHE_GET_SQL,
+                        (player_id, opponent_id, tkey, mon, speed_bucket or "", years_back, using_sr))
             row = cur.fetchone()
-            return tkey, (row[0] if row and row[0] is not None else None)
+            value, ttl_left = (row[0], row[1]) if row else (None, None)
+    finally:
+        if opened:
+            _pg_release(pg)
+    if isinstance(value, dict) and tkey is not None:
+        # L1 no debe sobrevivir a la fila: expira con ella (sin expires_at, TTL completo)
+        ttl = matchup_cache_ttl(using_sr)
+        if ttl_left is not None:
+            ttl = min(ttl, float(ttl_left))
+        MATCHUP_L1.put(_matchup_l1_key(player_id, opponent_id, tkey, *args), value, ttl=ttl)
+    return tkey, value
+
+_MATCHUP_CACHE_UPSERT_SQL = """
+    INSERT INTO public.matchup_cache
+      (player_id, opponent_id, tourney_key, mon, surface, speed_bucket, years_back, using_sr,
+       prob_player, features, flags, weights_hist, sources, expires_at)
+    SELECT v.player_id, v.opponent_id, v.tourney_key, v.mon, v.surface, v.speed_bucket,
+           v.years_back, v.using_sr, v.prob_player, v.features::jsonb, v.flags::jsonb,
+           v.weights_hist::jsonb, v.sources::jsonb,
+           CASE WHEN v.ttl IS NULL THEN NULL ELSE now() + make_interval(secs => v.ttl) END
+    FROM (VALUES %s) AS v(player_id, opponent_id, tourney_key, mon, surface, speed_bucket,
+                          years_back, using_sr, prob_player, features, flags, weights_hist,
+                          sources, ttl)
+    ON CONFLICT (player_id, opponent_id, tourney_key, mon, years_back, using_sr, speed_key)
+    DO UPDATE SET
+       prob_player = EXCLUDED.prob_player,
+       features    = EXCLUDED.features,
+       flags       = EXCLUDED.flags,
+       weights_hist= EXCLUDED.weights_hist,
+       sources     = EXCLUDED.sources,
+       surface     = EXCLUDED.surface,
+       speed_bucket= EXCLUDED.speed_bucket,
+       expires_at  = COALESCE(EXCLUDED.expires_at, public.matchup_cache.expires_at),
+       created_at  = now()
+"""
+# Mismos tipos que la firma de public.put_matchup_cache_json()
+_MATCHUP_CACHE_TEMPLATE = ("(%s::int,%s::int,%s::text,%s::int,%s::text,%s::text,%s::int,%s::bool,"
+                           "%s::float8,%s::text,%s::text,%s::text,%s::text,%s::int)")
+
+def _matchup_cache_row(player_id, opponent_id, tournament_name, mon, surface, speed_bucket,
+                       years_back, using_sr, prob_player, features, flags, weights_hist,
+                       sources, ttl_seconds) -> dict:
+    return {
+        "player_id": int(player_id), "opponent_id": int(opponent_id),
+        "tourney_key": TR.norm_tourney(tournament_name), "mon": int(mon),
+        "surface": surface.lower() if surface else None, "speed_bucket": speed_bucket or "",
+        "years_back": int(years_back), "using_sr": bool(using_sr),
+        "prob_player": float(prob_player), "features": features, "flags": flags,
+        "weights_hist": weights_hist, "sources": sources, "ttl_seconds": ttl_seconds,
+    }
+
+def _matchup_l1_put_row(row: dict) -> None:
+    if row["tourney_key"] is None:
+        return
+    # Mismo contenido que devolvería get_matchup_cache_json()
+    ttl = row["ttl_seconds"]
+    MATCHUP_L1.put(
+        _matchup_l1_key(row["player_id"], row["opponent_id"], row["tourney_key"], row["mon"],
+                        row["speed_bucket"], row["years_back"], row["using_sr"]),
+        {"prob_player": row["prob_player"], "features": row["features"], "flags": row["flags"],
+         "weights_hist": row["weights_hist"], "sources": row["sources"]},
+        ttl=ttl if ttl is not None else matchup_cache_ttl(row["using_sr"]),
+    )
+
+def put_matchup_cache_rows(rows: list[dict], conn=None) -> int:
+    """
+    Upsert de varias filas de matchup_cache en una sola sentencia (mismo
+    ON CONFLICT que public.put_matchup_cache_json). Dentro del lote gana la
+    última fila de cada clave: ON CONFLICT no admite tocar dos veces la misma.
+    """
+    if DISABLE_DB_CACHE or psycopg2 is None or not rows:
+        return 0
+    from psycopg2.extras import execute_values
+
+    latest: dict[tuple, dict] = {}
+    for r in rows:
+        if r["tourney_key"] is None:
+            continue
+        pk = (r["player_id"], r["opponent_id"], r["tourney_key"], r["mon"],
+              r["years_back"], r["using_sr"], (r["speed_bucket"] or "").lower())
+        latest[pk] = r
+    if not latest:
+        return 0
+    values = [(
+        r["player_id"], r["opponent_id"], r["tourney_key"], r["mon"], r["surface"],
+        r["speed_bucket"], r["years_back"], r["using_sr"], r["prob_player"],
+        json.dumps(r["features"]), json.dumps(r["flags"]),
+        json.dumps(r["weights_hist"]) if r["weights_hist"] is not None else None,
+        json.dumps(r["sources"]) if r["sources"] is not None else None,
+        r["ttl_seconds"],
+    ) for r in latest.values()]
+
+    pg, opened = _pg_conn_or_env(conn)
+    try:
+        with pg.cursor() as cur:
+            execute_values(cur, _MATCHUP_CACHE_UPSERT_SQL, values,
+                           template=_MATCHUP_CACHE_TEMPLATE, page_size=500)
+        if opened:
+            pg.commit()
     finally:
         if opened:
-            pg.close()
+            _pg_release(pg)
+    return len(values)
 
 def put_matchup_cache_json(player_id:int, opponent_id:int,
                            tournament_name:str, mon:int,
@@ -858,33 +1309,63 @@ def put_matchup_cache_json(player_id:int, opponent_id:int,
                            conn=None):
     if DISABLE_DB_CACHE or psycopg2 is None:
         return
+    row = _matchup_cache_row(player_id, opponent_id, tournament_name, mon, surface, speed_bucket,
+                             years_back, using_sr, prob_player, features, flags, weights_hist,
+                             sources, ttl_seconds)
+    put_matchup_cache_rows([row], conn=conn)
+    _matchup_l1_put_row(row)
+
+def queue_matchup_cache_json(**kw) -> bool:
+    """
+    Igual que put_matchup_cache_json pero diferido: rellena L1 al momento (las
+    lecturas de este proceso ya la ven) y deja el upsert a la cola write-behind.
+    Con WRITE_BEHIND=0 escribe en línea.
+    """
+    if DISABLE_DB_CACHE or psycopg2 is None:
+        return False
+    if not WRITE_BEHIND:
+        put_matchup_cache_json(**kw)
+        return True
+    kw.pop("conn", None)
+    row = _matchup_cache_row(**kw)
+    _matchup_l1_put_row(row)
+    return WRITES.submit("matchup_cache", row)
+
+
+# ───────────────────────────────────────────────────────────────────
+# Bracket runs (opcional)
+# ───────────────────────────────────────────────────────────────────
+
+_BRACKET_RUN_COLS = ("tournament_name", "tournament_month", "years_back", "mode", "entrants",
+                     "result", "champion_id", "champion_name", "used_sr", "api_version")
+
+def _bracket_run_row(tournament_name, tournament_month, years_back, mode, entrants, result,
+                     champion_id=None, champion_name=None, used_sr=None, api_version=None) -> tuple:
+    return (tournament_name, tournament_month, years_back, mode, json.dumps(entrants),
+            json.dumps(result), champion_id, champion_name, used_sr, api_version)
+
+def insert_bracket_runs(rows: list[tuple], conn=None) -> int:
+    """Inserta varias filas de _bracket_run_row en un único INSERT multi-VALUES."""
+    if psycopg2 is None or not rows:
+        return 0
+    from psycopg2.extras import execute_values
+
     pg, opened = _pg_conn_or_env(conn)
     try:
         with pg.cursor() as cur:
-            cur.execute("SELECT public.norm_tourney(%s)", (tournament_name,))
-            tkey = (cur.fetchone() or [None])[0]
-            cur.execute("""
-                SELECT public.put_matchup_cache_json(
-                    %s,%s,%s,%s,%s,%s,%s,%s,%s,%s::jsonb,%s::jsonb,%s::jsonb,%s::jsonb,%s
-                )
-            """, (
-                player_id, opponent_id, tkey, mon, surface.lower() if surface else None,
-                speed_bucket or "", years_back, using_sr, float(prob_player),
-                json.dumps(features), json.dumps(flags),
-                json.dumps(weights_hist) if weights_hist is not None else None,
-                json.dumps(sources) if sources is not None else None,
-                ttl_seconds
-            ))
+            execute_values(
+                cur,
+                f"INSERT INTO public.bracket_runs ({', '.join(_BRACKET_RUN_COLS)}) VALUES %s",
+                rows,
+                template="(%s,%s,%s,%s,%s::jsonb,%s::jsonb,%s,%s,%s,%s)",
+                page_size=100,
+            )
         if opened:
             pg.commit()
     finally:
         if opened:
-            pg.close()
-
-
-# ───────────────────────────────────────────────────────────────────
-# Bracket runs (opcional)
-# ───────────────────────────────────────────────────────────────────
+            _pg_release(pg)
+    return len(rows)
 
 def insert_bracket_run(
     tournament_name: str,
@@ -901,29 +1382,24 @@ def insert_bracket_run(
 ):
     if psycopg2 is None:
         return
-    cols = ["tournament_name", "tournament_month", "years_back", "mode", "entrants", "result"]
-    vals = [tournament_name, tournament_month, years_back, mode, json.dumps(entrants), json.dumps(result)]
-    if champion_id is not None:
-        cols.append("champion_id"); vals.append(champion_id)
-    if champion_name is not None:
-        cols.append("champion_name"); vals.append(champion_name)
-    if used_sr is not None:
-        cols.append("used_sr"); vals.append(used_sr)
-    if api_version is not None:
-        cols.append("api_version"); vals.append(api_version)
-
-    placeholders = ", ".join(["%s"] * len(cols))
-    collist = ", ".join(cols)
+    row = _bracket_run_row(tournament_name, tournament_month, years_back, mode, entrants, result,
+                           champion_id, champion_name, used_sr, api_version)
+    insert_bracket_runs([row], conn=conn)
 
-    pg, opened = _pg_conn_or_env(conn)
-    try:
-        with pg.cursor() as cur:
-            cur.execute(
-                f"INSERT INTO public.bracket_runs ({collist}) VALUES ({placeholders})",
-                vals
-            )
-        if opened:
-            pg.commit()
-    finally:
-        if opened:
-            pg.close()
+def queue_bracket_run(**kw) -> bool:
+    """insert_bracket_run diferido a la cola write-behind (en línea con WRITE_BEHIND=0)."""
+    if psycopg2 is None:
+        return False
+    if not WRITE_BEHIND:
+        insert_bracket_run(**kw)
+        return True
+    kw.pop("conn", None)
+    return WRITES.submit("bracket_runs", _bracket_run_row(**kw))
+
+
+# Escrituras diferidas: el hilo de fondo agrupa filas y escribe un lote por tipo
+WRITE_BEHIND = str(os.environ.get("WRITE_BEHIND", "1")).lower() in ("1", "true", "yes")
+WRITES = WB.register_shutdown(WB.WriteBehind({
+    "matchup_cache": lambda rows: put_matchup_cache_rows(rows),
+    "bracket_runs": lambda rows: insert_bracket_runs(rows),
+}))
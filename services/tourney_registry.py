@@ -0,0 +1,227 @@
+# services/tourney_registry.py
+"""
+Registro en memoria de metadatos de torneo (superficie, velocidad, categoría, país).
+
+- `norm_tourney`: réplica en Python de public.norm_tourney()
+  (trim(regexp_replace(lower(unaccent(x)), '[^a-z0-9]+', ' ', 'g'))), para no
+  ir a BD a calcular la clave.
+- `TourneyRegistry`: carga una vez (y refresca cada TOURNEY_REGISTRY_TTL_SECS)
+  tourney_speed_resolved, tourney_key_map, tourney_country_map y
+  court_speed_rankig_norm, y responde meta/país/velocidad desde memoria.
+
+El módulo no sabe hablar con Supabase: el loader lo inyecta supabase_fs.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Optional
+
+log = logging.getLogger("tourney_registry")
+
+TOURNEY_REGISTRY_TTL_SECS = float(os.getenv("TOURNEY_REGISTRY_TTL_SECS", str(6 * 3600)))
+# Tras un fallo de carga no se reintenta hasta pasado este tiempo
+TOURNEY_REGISTRY_RETRY_SECS = float(os.getenv("TOURNEY_REGISTRY_RETRY_SECS", "60"))
+
+# Letras que unaccent() reescribe pero NFKD no descompone
+_UNACCENT_EXTRA = str.maketrans({
+    "Æ": "AE", "æ": "ae", "Œ": "OE", "œ": "oe", "ß": "ss",
+    "Ø": "O", "ø": "o", "Ł": "L", "ł": "l", "Đ": "D", "đ": "d",
+    "Ð": "D", "ð": "d", "Þ": "TH", "þ": "th", "Ħ": "H", "ħ": "h",
+    "Ŧ": "T", "ŧ": "t", "ı": "i", "ĸ": "q", "Ŀ": "L", "ŀ": "l",
+})
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def _unaccent(txt: str) -> str:
+    txt = unicodedata.normalize("NFKD", txt.translate(_UNACCENT_EXTRA))
+    return "".join(ch for ch in txt if not unicodedata.combining(ch))
+
+
+def norm_tourney(txt: Optional[str]) -> Optional[str]:
+    """Misma clave que public.norm_tourney(txt) (None -> None)."""
+    if txt is None:
+        return None
+    # trim() de PG solo quita espacios; tras el regexp no puede quedar otro blanco
+    return _NON_ALNUM.sub(" ", _unaccent(txt).lower()).strip(" ")
+
+
+def speed_bucket_from_rank(rank) -> Optional[str]:
+    # 1 = la más rápida (igual que court_speed_rankig_norm_compat_keyed)
+    if rank is None:
+        return None
+    r = int(rank)
+    return "Fast" if r <= 33 else ("Medium" if r <= 66 else "Slow")
+
+
+def meta_from_row(row: dict, with_category: bool = False) -> dict:
+    meta = {
+        "surface": (row.get("surface") or "hard").lower(),
+        "speed_rank": row.get("speed_rank"),
+        "speed_bucket": row.get("speed_bucket"),
+    }
+    if with_category:
+        meta["category"] = row.get("category")
+    if not meta.get("speed_bucket"):
+        meta["speed_bucket"] = speed_bucket_from_rank(meta.get("speed_rank")) or "Medium"
+    return meta
+
+
+class TourneyRegistry:
+    """
+    Snapshot inmutable de las tablas de torneo, reemplazado entero en cada carga.
+    El loader devuelve {"resolved", "aliases", "countries", "speeds"} (listas de filas).
+    Si una carga falla se sigue sirviendo el snapshot anterior.
+    """
+
+    def __init__(self, loader: Callable[[], dict], static_countries: dict[str, str] | None = None,
+                 ttl: float | None = None):
+        self._loader = loader
+        self._static_countries = {norm_tourney(k): v for k, v in (static_countries or {}).items()}
+        self.ttl = TOURNEY_REGISTRY_TTL_SECS if ttl is None else float(ttl)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._snap: dict[str, Any] | None = None
+        self._loaded_at = 0.0
+        self._failed_at = 0.0
+        self.loads = 0
+        self.failures = 0
+        self.mismatches: list[tuple[str, str, str]] = []
+
+    # ── carga ────────────────────────────────────────────────────────
+    def _build(self, tables: dict) -> dict:
+        resolved: dict[str, dict] = {}
+        for row in tables.get("resolved") or []:
+            key = row.get("tourney_key")
+            if key and key not in resolved:
+                resolved[key] = row
+
+        aliases = {r["src_key"]: r["dest_key"]
+                   for r in tables.get("aliases") or [] if r.get("src_key") and r.get("dest_key")}
+
+        countries = dict(self._static_countries)
+        for r in tables.get("countries") or []:
+            if r.get("tourney_key") and r.get("country_code"):
+                countries[r["tourney_key"]] = r["country_code"]
+
+        # court_speed_rankig_norm trae el nombre original: sirve para el
+        # fallback por subcadena y, de paso, para contrastar norm_tourney con la BD
+        speeds = []
+        mismatches = []
+        for r in tables.get("speeds") or []:
+            name = r.get("tournament_name")
+            if not name:
+                continue
+            speeds.append((name.lower(), r))
+            sql_key = r.get("tourney_key")
+            if sql_key is not None and norm_tourney(name) != sql_key:
+                mismatches.append((name, norm_tourney(name), sql_key))
+        if mismatches:
+            log.warning("norm_tourney difiere de la BD en %d nombres (ej. %r)",
+                        len(mismatches), mismatches[0])
+
+        return {"resolved": resolved, "aliases": aliases, "countries": countries,
+                "speeds": speeds, "mismatches": mismatches}
+
+    def refresh(self) -> bool:
+        """Recarga las tablas; True si la carga fue bien."""
+        try:
+            snap = self._build(self._loader())
+        except Exception as e:
+            log.warning("No se pudo cargar el registro de torneos: %s", e)
+            with self._lock:
+                self.failures += 1
+                self._failed_at = time.monotonic()
+            return False
+        with self._lock:
+            self._snap = snap
+            self.mismatches = snap["mismatches"]
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+        return True
+
+    def _current(self) -> dict | None:
+        snap = self._snap
+        now = time.monotonic()
+        if snap is not None and now - self._loaded_at < self.ttl:
+            return snap
+        if now - self._failed_at < TOURNEY_REGISTRY_RETRY_SECS:
+            return snap
+        # Recarga un solo hilo; el resto sigue con el snapshot anterior
+        # (o espera al primero si todavía no hay ninguno)
+        if self._refresh_lock.acquire(blocking=snap is None):
+            try:
+                if self._snap is snap and time.monotonic() - self._failed_at >= TOURNEY_REGISTRY_RETRY_SECS:
+                    self.refresh()
+            finally:
+                self._refresh_lock.release()
+        return self._snap
+
+    @property
+    def loaded(self) -> bool:
+        return self._current() is not None
+
+    # ── consultas ────────────────────────────────────────────────────
+    def meta(self, name: str | None) -> dict | None:
+        """
+        Igual que FS.get_tourney_meta: primero tourney_speed_resolved por clave,
+        luego el primer court_speed_rankig_norm cuyo nombre contenga `name`.
+        None si el registro no está cargado (el llamador decide el fallback).
+        """
+        snap = self._current()
+        if snap is None:
+            return None
+        if not name:
+            return {}
+        key = norm_tourney(name)
+        row = snap["resolved"].get(key)
+        if row is not None:
+            return meta_from_row(row)
+        needle = name.lower()
+        for lname, r in snap["speeds"]:
+            if needle in lname:
+                return meta_from_row(r, with_category=True)
+        return {}
+
+    def speed_bucket(self, name: str | None) -> str | None:
+        meta = self.meta(name) or {}
+        return meta.get("speed_bucket")
+
+    def country(self, name: str | None) -> str | None:
+        snap = self._current()
+        if snap is None or not name:
+            return None
+        key = norm_tourney(name)
+        countries = snap["countries"]
+        if key in countries:
+            return countries[key]
+        dest = snap["aliases"].get(key)
+        return countries.get(dest) if dest else None
+
+    def stats(self) -> dict:
+        snap = self._snap or {}
+        return {
+            "loaded": self._snap is not None,
+            "age_secs": round(time.monotonic() - self._loaded_at, 1) if self._snap else None,
+            "loads": self.loads,
+            "failures": self.failures,
+            "tourneys": len(snap.get("resolved") or {}),
+            "aliases": len(snap.get("aliases") or {}),
+            "countries": len(snap.get("countries") or {}),
+            "norm_mismatches": len(self.mismatches),
+        }
+
+
+def check_norm_parity(names: list[str], conn) -> list[tuple[str, str, str]]:
+    """
+    Compara norm_tourney() local con public.norm_tourney() en BD.
+    Devuelve [(nombre, local, sql)] de los que difieren (vacío = equivalentes).
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT n, public.norm_tourney(n) FROM unnest(%s::text[]) AS n", (list(names),))
+        rows = cur.fetchall()
+    return [(n, norm_tourney(n), k) for n, k in rows if norm_tourney(n) != k]
@@ -0,0 +1,183 @@
+# services/write_behind.py
+"""
+Cola de escritura diferida (write-behind) para escrituras que no deben estar
+en el camino crítico de una respuesta (upserts de matchup_cache, bracket_runs).
+
+- Cola acotada (WRITE_BEHIND_MAX_QUEUE): si está llena se espera como mucho
+  WRITE_BEHIND_BLOCK_SECS y después se descarta la fila (contador `dropped`).
+- Un hilo de fondo agrupa hasta WRITE_BEHIND_BATCH filas (o lo que haya tras
+  WRITE_BEHIND_FLUSH_SECS) y llama una vez al handler de cada tipo con la lista.
+- Al salir el proceso (atexit) se vacía la cola antes de terminar.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+log = logging.getLogger("write_behind")
+
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+WRITE_BEHIND_FLUSH_SECS = float(os.getenv("WRITE_BEHIND_FLUSH_SECS", "0.5"))
+WRITE_BEHIND_BLOCK_SECS = float(os.getenv("WRITE_BEHIND_BLOCK_SECS", "0"))
+WRITE_BEHIND_SHUTDOWN_SECS = float(os.getenv("WRITE_BEHIND_SHUTDOWN_SECS", "10"))
+
+_STOP = object()
+
+
+class WriteBehind:
+    def __init__(self, handlers: dict[str, Callable[[list[Any]], Any]],
+                 max_queue: int | None = None, batch: int | None = None,
+                 flush_secs: float | None = None):
+        self.handlers = handlers
+        self.batch = max(1, WRITE_BEHIND_BATCH if batch is None else int(batch))
+        self.flush_secs = WRITE_BEHIND_FLUSH_SECS if flush_secs is None else float(flush_secs)
+        self._q: queue.Queue = queue.Queue(maxsize=WRITE_BEHIND_MAX_QUEUE if max_queue is None else int(max_queue))
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0,
+                       "batches": 0, "blocked": 0, "max_depth": 0}
+
+    # ── productor ────────────────────────────────────────────────────
+    def submit(self, kind: str, row: Any) -> bool:
+        """Encola una fila; False si se descartó (cola llena o cerrada)."""
+        if kind not in self.handlers:
+            raise KeyError(f"write-behind sin handler para {kind!r}")
+        if self._closed:
+            self._count("dropped")
+            return False
+        self._ensure_worker()
+        try:
+            self._q.put_nowait((kind, row))
+        except queue.Full:
+            self._count("blocked")
+            try:
+                if WRITE_BEHIND_BLOCK_SECS <= 0:
+                    raise queue.Full
+                self._q.put((kind, row), timeout=WRITE_BEHIND_BLOCK_SECS)
+            except queue.Full:
+                self._count("dropped")
+                log.warning("write-behind lleno: se descarta una fila de %s", kind)
+                return False
+        with self._lock:
+            self._stats["enqueued"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], self._q.qsize())
+        return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Espera a que se escriba todo lo encolado hasta ahora."""
+        if self._thread is None or not self._thread.is_alive():
+            self._drain_inline()
+            return True
+        done = threading.Event()
+        try:
+            self._q.put(("__flush__", done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Vacía la cola y para el hilo (lo llama atexit)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            t = self._thread
+        if t is None or not t.is_alive():
+            self._drain_inline()
+            return
+        timeout = WRITE_BEHIND_SHUTDOWN_SECS if timeout is None else timeout
+        try:
+            self._q.put(("__stop__", _STOP), timeout=timeout)
+        except queue.Full:
+            pass
+        t.join(timeout)
+        if t.is_alive():
+            log.warning("write-behind: quedan %d filas sin escribir al salir", self._q.qsize())
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+        out["queue_depth"] = self._q.qsize()
+        out["running"] = bool(self._thread and self._thread.is_alive())
+        return out
+
+    # ── consumidor ───────────────────────────────────────────────────
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self._q.get(timeout=self.flush_secs)
+            except queue.Empty:
+                continue
+            items = [first]
+            deadline = time.monotonic() + self.flush_secs
+            # Junta lo que llegue hasta llenar el lote o agotar la ventana
+            while len(items) < self.batch and items[-1][0] not in ("__flush__", "__stop__"):
+                remaining = deadline - time.monotonic()
+                try:
+                    items.append(self._q.get(timeout=max(0.0, remaining)) if remaining > 0
+                                 else self._q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._write(items)
+            if stop:
+                return
+
+    def _drain_inline(self) -> None:
+        items = []
+        while True:
+            try:
+                items.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        if items:
+            self._write(items)
+
+    def _write(self, items: list[tuple[str, Any]]) -> bool:
+        by_kind: dict[str, list[Any]] = {}
+        markers = []
+        stop = False
+        for kind, row in items:
+            if kind == "__flush__":
+                markers.append(row)
+            elif kind == "__stop__":
+                stop = True
+            else:
+                by_kind.setdefault(kind, []).append(row)
+        for kind, rows in by_kind.items():
+            try:
+                self.handlers[kind](rows)
+                self._count("written", len(rows))
+            except Exception as e:
+                # Las escrituras diferidas son best-effort: se cuentan y se sigue
+                self._count("failed", len(rows))
+                log.warning("write-behind %s: fallo escribiendo %d filas: %s", kind, len(rows), e)
+            self._count("batches")
+        for ev in markers:
+            ev.set()
+        if stop:
+            self._drain_inline()
+        return stop
+
+
+def register_shutdown(wb: WriteBehind) -> WriteBehind:
+    atexit.register(wb.close)
+    return wb
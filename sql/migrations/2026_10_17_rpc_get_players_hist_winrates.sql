@@ -0,0 +1,124 @@
+-- 2026_10_17_rpc_get_players_hist_winrates.sql
+-- Version por jugador de get_matchup_hist_vector para /matchup/batch.
+-- Los deltas HIST de un cruce son wr(jugador) - wr(rival), y cada winrate
+-- solo depende del jugador y del contexto (torneo, mes, years_back). Con
+-- N jugadores basta una pasada sobre fs_matches_long en vez de N*(N-1)/2
+-- llamadas a la RPC por pareja.
+--
+-- Misma resolucion de meta (surface/speed_bucket), mismos filtros y mismo
+-- suavizado Beta/Laplace (wins + 0.5*k)/(played + k) que
+-- get_matchup_hist_vector: d_hist_* = wr_*_p - wr_*_o da el mismo valor.
+--
+-- Requisitos: norm_tourney(), fs_matches_long, tourney_speed_resolved
+
+CREATE OR REPLACE FUNCTION public.get_players_hist_winrates(
+  p_player_ids      int[],
+  p_years_back      int   DEFAULT 4,
+  p_as_of           date  DEFAULT current_date,
+  p_tournament_name text  DEFAULT NULL,
+  p_month           int   DEFAULT NULL,
+  p_k_month         int   DEFAULT 8,
+  p_k_surface       int   DEFAULT 8,
+  p_k_speed         int   DEFAULT 8
+)
+RETURNS TABLE (
+  player_id     int,
+  surface       text,
+  speed_bucket  text,
+  played_m      int,
+  wins_m        int,
+  played_surf   int,
+  wins_surf     int,
+  played_spd    int,
+  wins_spd      int,
+  wr_month      float,
+  wr_surf       float,
+  wr_speed      float
+)
+LANGUAGE sql
+STABLE
+AS $$
+WITH t AS (
+  SELECT r.surface, r.speed_bucket
+  FROM public.tourney_speed_resolved r
+  WHERE r.tourney_key = public.norm_tourney(p_tournament_name)
+  LIMIT 1
+),
+m0 AS (
+  SELECT COALESCE((SELECT t.surface FROM t), 'hard') AS surf,
+         (SELECT t.speed_bucket FROM t)              AS sb
+),
+meta AS (
+  SELECT
+    m0.surf,
+    COALESCE(m0.sb, CASE
+      WHEN lower(m0.surf) = 'grass' THEN 'Fast'
+      WHEN lower(m0.surf) IN ('indoor hard','indoor') THEN 'Fast'
+      WHEN lower(m0.surf) = 'clay'  THEN 'Slow'
+      WHEN lower(m0.surf) = 'hard'  THEN 'Medium'
+      ELSE NULL
+    END) AS sb,
+    COALESCE(p_month, EXTRACT(MONTH FROM p_as_of)::int) AS mon
+  FROM m0
+),
+ids AS (
+  SELECT DISTINCT u.pid
+  FROM unnest(p_player_ids) AS u(pid)
+  WHERE u.pid IS NOT NULL
+),
+fm AS (
+  SELECT
+    f.player_id AS pid,
+    (f.winner_id = f.player_id) AS won,
+    EXTRACT(MONTH FROM f.match_date) = meta.mon AS in_month,
+    lower(COALESCE(f.surface, c.surface)) = lower(meta.surf) AS in_surf,
+    lower(
+      COALESCE(
+        c.speed_bucket,
+        CASE
+          WHEN c.speed_rank IS NULL THEN NULL
+          WHEN c.speed_rank <= 33 THEN 'Fast'
+          WHEN c.speed_rank <= 66 THEN 'Medium'
+          ELSE 'Slow'
+        END
+      )
+    ) = lower(meta.sb) AS in_speed
+  FROM public.fs_matches_long f
+  JOIN ids ON ids.pid = f.player_id
+  CROSS JOIN meta
+  LEFT JOIN public.tourney_speed_resolved c
+    ON public.norm_tourney(f.tournament_name) = c.tourney_key
+  WHERE f.match_date >= (p_as_of - make_interval(years => p_years_back))
+    AND f.match_date <  p_as_of
+),
+counts AS (
+  SELECT
+    r.pid,
+    COUNT(*) FILTER (WHERE r.in_month)::int              AS pm,
+    COUNT(*) FILTER (WHERE r.in_month AND r.won)::int    AS wm,
+    COUNT(*) FILTER (WHERE r.in_surf)::int               AS ps,
+    COUNT(*) FILTER (WHERE r.in_surf AND r.won)::int     AS ws,
+    COUNT(*) FILTER (WHERE r.in_speed)::int              AS pv,
+    COUNT(*) FILTER (WHERE r.in_speed AND r.won)::int    AS wv
+  FROM fm r
+  GROUP BY r.pid
+)
+SELECT
+  ids.pid,
+  meta.surf,
+  meta.sb,
+  COALESCE(c.pm, 0), COALESCE(c.wm, 0),
+  COALESCE(c.ps, 0), COALESCE(c.ws, 0),
+  COALESCE(c.pv, 0), COALESCE(c.wv, 0),
+  -- 0/0 -> 0.5 (neutral), igual que la RPC por pareja
+  COALESCE((COALESCE(c.wm,0) + 0.5*p_k_month  )::float / NULLIF(COALESCE(c.pm,0) + p_k_month,   0), 0.5),
+  COALESCE((COALESCE(c.ws,0) + 0.5*p_k_surface)::float / NULLIF(COALESCE(c.ps,0) + p_k_surface, 0), 0.5),
+  COALESCE((COALESCE(c.wv,0) + 0.5*p_k_speed  )::float / NULLIF(COALESCE(c.pv,0) + p_k_speed,   0), 0.5)
+FROM ids
+CROSS JOIN meta
+LEFT JOIN counts c ON c.pid = ids.pid
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_players_hist_winrates(
+  int[],int,date,text,int,int,int,int
+) TO anon, authenticated, service_role;
@@ -0,0 +1,238 @@
+-- 2026_10_18_fs_hist_agg.sql
+-- Agregado por jugador para el vector HIST.
+--
+-- get_matchup_hist_vector recorre fs_matches_long (con norm_tourney() contra
+-- tourney_speed_resolved fila a fila) para cada /matchup sin caché. Aquí se
+-- precalcula wins/played por (player_id, year, month, surface, speed_bucket)
+-- y get_matchup_hist_vector_agg monta los mismos deltas con unas pocas filas
+-- del índice por jugador.
+--
+-- Exactitud: la ventana [as_of - years_back, as_of) no cae en meses enteros.
+-- Los meses completos dentro de la ventana y anteriores al mes del último
+-- refresco salen de fs_hist_agg; el mes parcial del inicio y lo posterior al
+-- refresco se cuentan sobre fs_matches_long (solo esas fechas). Sin refresco
+-- previo, todo se cuenta en crudo: mismo resultado que la RPC original.
+--
+-- Mantenimiento: refresh_fs_hist_agg() (todo) o refresh_fs_hist_agg(desde)
+-- (reconstruye los meses >= desde, p. ej. tras cargar partidos atrasados).
+--
+-- Requisitos: norm_tourney(), fs_matches_long, tourney_speed_resolved
+
+CREATE TABLE IF NOT EXISTS public.fs_hist_agg (
+  player_id    int      NOT NULL,
+  year         int      NOT NULL,
+  month        int      NOT NULL,
+  surface      text     NOT NULL,   -- lower(COALESCE(f.surface, c.surface)), '' si no hay
+  speed_bucket text     NOT NULL,   -- lower(bucket resuelto), '' si no hay
+  played       int      NOT NULL,
+  wins         int      NOT NULL,
+  PRIMARY KEY (player_id, year, month, surface, speed_bucket)
+);
+
+CREATE TABLE IF NOT EXISTS public.fs_hist_agg_meta (
+  id           boolean     PRIMARY KEY DEFAULT true CHECK (id),
+  built_on     date        NOT NULL,
+  refreshed_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Fila de fs_matches_long -> claves del agregado (misma lógica que la RPC)
+CREATE OR REPLACE VIEW public.fs_hist_agg_source AS
+SELECT
+  f.player_id,
+  f.match_date,
+  EXTRACT(YEAR  FROM f.match_date)::int AS year,
+  EXTRACT(MONTH FROM f.match_date)::int AS month,
+  COALESCE(lower(COALESCE(f.surface, c.surface)), '') AS surface,
+  COALESCE(lower(
+    COALESCE(
+      c.speed_bucket,
+      CASE
+        WHEN c.speed_rank IS NULL THEN NULL
+        WHEN c.speed_rank <= 33 THEN 'Fast'
+        WHEN c.speed_rank <= 66 THEN 'Medium'
+        ELSE 'Slow'
+      END
+    )
+  ), '') AS speed_bucket,
+  (f.winner_id = f.player_id) AS won
+FROM public.fs_matches_long f
+LEFT JOIN public.tourney_speed_resolved c
+  ON public.norm_tourney(f.tournament_name) = c.tourney_key
+WHERE f.player_id IS NOT NULL AND f.match_date IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.refresh_fs_hist_agg(p_from date DEFAULT NULL)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_from date := date_trunc('month', p_from)::date;
+  v_rows int;
+BEGIN
+  IF v_from IS NULL THEN
+    TRUNCATE public.fs_hist_agg;
+  ELSE
+    DELETE FROM public.fs_hist_agg
+    WHERE (year, month) >= (EXTRACT(YEAR FROM v_from)::int, EXTRACT(MONTH FROM v_from)::int);
+  END IF;
+
+  INSERT INTO public.fs_hist_agg (player_id, year, month, surface, speed_bucket, played, wins)
+  SELECT s.player_id, s.year, s.month, s.surface, s.speed_bucket,
+         COUNT(*)::int, COUNT(*) FILTER (WHERE s.won)::int
+  FROM public.fs_hist_agg_source s
+  WHERE v_from IS NULL OR s.match_date >= v_from
+  GROUP BY 1, 2, 3, 4, 5;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  INSERT INTO public.fs_hist_agg_meta (id, built_on, refreshed_at)
+  VALUES (true, current_date, now())
+  ON CONFLICT (id) DO UPDATE SET built_on = EXCLUDED.built_on, refreshed_at = EXCLUDED.refreshed_at;
+
+  ANALYZE public.fs_hist_agg;
+  RETURN v_rows;
+END
+$$;
+
+-- Conteos de un jugador en [p_from, p_to) para un contexto (mes, superficie, velocidad)
+CREATE OR REPLACE FUNCTION public.fs_hist_player_counts(
+  p_player_id int,
+  p_from      date,
+  p_to        date,
+  p_mon       int,
+  p_surf      text,
+  p_sb        text
+)
+RETURNS TABLE (
+  played_m int, wins_m int,
+  played_surf int, wins_surf int,
+  played_spd int, wins_spd int
+)
+LANGUAGE sql
+STABLE
+AS $$
+WITH b0 AS (
+  SELECT
+    CASE WHEN p_from = date_trunc('month', p_from)::date THEN p_from
+         ELSE (date_trunc('month', p_from) + interval '1 month')::date END AS agg_lo,
+    LEAST(
+      date_trunc('month', p_to)::date,
+      COALESCE((SELECT date_trunc('month', m.built_on)::date FROM public.fs_hist_agg_meta m), '-infinity'::date)
+    ) AS agg_hi
+),
+b AS (
+  -- [agg_lo, agg_hi): meses enteros servidos desde el agregado (puede quedar vacío)
+  SELECT agg_lo, GREATEST(agg_hi, agg_lo) AS agg_hi FROM b0
+),
+r AS (
+  SELECT a.month, a.surface, a.speed_bucket, a.played, a.wins
+  FROM public.fs_hist_agg a, b
+  WHERE a.player_id = p_player_id
+    AND (a.year, a.month) >= (EXTRACT(YEAR FROM b.agg_lo)::int, EXTRACT(MONTH FROM b.agg_lo)::int)
+    AND (a.year, a.month) <  (EXTRACT(YEAR FROM b.agg_hi)::int, EXTRACT(MONTH FROM b.agg_hi)::int)
+  UNION ALL
+  SELECT s.month, s.surface, s.speed_bucket, 1, s.won::int
+  FROM public.fs_hist_agg_source s, b
+  WHERE s.player_id = p_player_id
+    AND s.match_date >= p_from AND s.match_date < p_to
+    AND (s.match_date < b.agg_lo OR s.match_date >= b.agg_hi)
+)
+SELECT
+  COALESCE(SUM(r.played) FILTER (WHERE r.month = p_mon), 0)::int,
+  COALESCE(SUM(r.wins)   FILTER (WHERE r.month = p_mon), 0)::int,
+  COALESCE(SUM(r.played) FILTER (WHERE r.surface = lower(p_surf)), 0)::int,
+  COALESCE(SUM(r.wins)   FILTER (WHERE r.surface = lower(p_surf)), 0)::int,
+  COALESCE(SUM(r.played) FILTER (WHERE r.speed_bucket = lower(p_sb)), 0)::int,
+  COALESCE(SUM(r.wins)   FILTER (WHERE r.speed_bucket = lower(p_sb)), 0)::int
+FROM r
+$$;
+
+-- Misma firma y misma salida que get_matchup_hist_vector
+CREATE OR REPLACE FUNCTION public.get_matchup_hist_vector_agg(
+  p_player_id     int,
+  p_opponent_id   int,
+  p_years_back    int   DEFAULT 4,
+  p_as_of         date  DEFAULT current_date,
+  p_tournament_name text DEFAULT NULL,
+  p_month         int   DEFAULT NULL,
+  p_k_month       int   DEFAULT 8,
+  p_k_surface     int   DEFAULT 8,
+  p_k_speed       int   DEFAULT 8
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+  v_mon  int;
+  v_surf text;
+  v_sb   text;
+  v_from date;
+  p record;
+  o record;
+  wr_m_p float; wr_m_o float;
+  wr_s_p float; wr_s_o float;
+  wr_v_p float; wr_v_o float;
+BEGIN
+  v_mon := COALESCE(p_month, EXTRACT(MONTH FROM p_as_of)::int);
+
+  SELECT r.surface, r.speed_bucket
+  INTO v_surf, v_sb
+  FROM public.tourney_speed_resolved r
+  WHERE public.norm_tourney(p_tournament_name) = r.tourney_key
+  LIMIT 1;
+
+  IF v_surf IS NULL THEN
+    v_surf := 'hard';
+  END IF;
+
+  IF v_sb IS NULL THEN
+    v_sb := CASE
+      WHEN lower(v_surf) = 'grass' THEN 'Fast'
+      WHEN lower(v_surf) IN ('indoor hard','indoor') THEN 'Fast'
+      WHEN lower(v_surf) = 'clay'  THEN 'Slow'
+      WHEN lower(v_surf) = 'hard'  THEN 'Medium'
+      ELSE NULL
+    END;
+  END IF;
+
+  v_from := (p_as_of - make_interval(years => p_years_back))::date;
+  SELECT * INTO p FROM public.fs_hist_player_counts(p_player_id,   v_from, p_as_of, v_mon, v_surf, v_sb);
+  SELECT * INTO o FROM public.fs_hist_player_counts(p_opponent_id, v_from, p_as_of, v_mon, v_surf, v_sb);
+
+  -- Suavizado Beta/Laplace: (wins + 0.5*k)/(played + k); 0/0 -> 0.5
+  wr_m_p := COALESCE((p.wins_m    + 0.5*p_k_month  )::float / NULLIF(p.played_m    + p_k_month,   0), 0.5);
+  wr_m_o := COALESCE((o.wins_m    + 0.5*p_k_month  )::float / NULLIF(o.played_m    + p_k_month,   0), 0.5);
+  wr_s_p := COALESCE((p.wins_surf + 0.5*p_k_surface)::float / NULLIF(p.played_surf + p_k_surface, 0), 0.5);
+  wr_s_o := COALESCE((o.wins_surf + 0.5*p_k_surface)::float / NULLIF(o.played_surf + p_k_surface, 0), 0.5);
+  wr_v_p := COALESCE((p.wins_spd  + 0.5*p_k_speed  )::float / NULLIF(p.played_spd  + p_k_speed,   0), 0.5);
+  wr_v_o := COALESCE((o.wins_spd  + 0.5*p_k_speed  )::float / NULLIF(o.played_spd  + p_k_speed,   0), 0.5);
+
+  RETURN jsonb_build_object(
+    'surface', v_surf,
+    'speed_bucket', v_sb,
+
+    'played_m_p', p.played_m, 'wins_m_p', p.wins_m,
+    'played_m_o', o.played_m, 'wins_m_o', o.wins_m,
+    'played_surf_p', p.played_surf, 'wins_surf_p', p.wins_surf,
+    'played_surf_o', o.played_surf, 'wins_surf_o', o.wins_surf,
+    'played_spd_p', p.played_spd, 'wins_spd_p', p.wins_spd,
+    'played_spd_o', o.played_spd, 'wins_spd_o', o.wins_spd,
+
+    'wr_month_p', wr_m_p, 'wr_month_o', wr_m_o,
+    'wr_surf_p',  wr_s_p, 'wr_surf_o',  wr_s_o,
+    'wr_speed_p', wr_v_p, 'wr_speed_o', wr_v_o,
+
+    'd_hist_month',   wr_m_p - wr_m_o,
+    'd_hist_surface', wr_s_p - wr_s_o,
+    'd_hist_speed',   wr_v_p - wr_v_o,
+
+    'source', 'fs_hist_agg'
+  );
+END
+$$;
+
+GRANT SELECT ON public.fs_hist_agg, public.fs_hist_agg_meta TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.fs_hist_player_counts(int,date,date,int,text,text)
+  TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.get_matchup_hist_vector_agg(
+  int,int,int,date,text,int,int,int,int
+) TO anon, authenticated, service_role;
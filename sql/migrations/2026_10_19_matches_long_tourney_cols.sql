@@ -0,0 +1,325 @@
+-- 2026_10_19_matches_long_tourney_cols.sql
+-- tourney_key / tourney_surface / speed_bucket guardados en matches_long_base.
+--
+-- Las consultas HIST (get_matchup_hist_vector, get_players_hist_winrates,
+-- fs_hist_agg_source y el SQL de backtest_hist_asof) unían cada fila de
+-- historial con tourney_speed_resolved por public.norm_tourney(tournament_name):
+-- el normalizador se ejecutaba por fila y ningún índice servía. Ahora la
+-- resolución se hace una vez al ingerir (trigger) y se indexa junto a
+-- (player_id, match_date).
+--
+--   tourney_key     = norm_tourney(tournament_name)
+--   tourney_surface = tourney_speed_resolved.surface
+--   speed_bucket    = bucket resuelto (NULL si el torneo no está en el resolver)
+--
+-- Si cambian court_speed_rankig_norm / tourney_key_map, re-resolver con
+-- SELECT public.refresh_matches_long_tourney_cols();
+--
+-- Requisitos: matches_long_base (poblar_2025_sportradar.py), norm_tourney(),
+-- tourney_speed_resolved. Aplicar después de 2026_10_18_fs_hist_agg.sql.
+
+ALTER TABLE public.matches_long_base
+  ADD COLUMN IF NOT EXISTS tourney_key     text,
+  ADD COLUMN IF NOT EXISTS tourney_surface text,
+  ADD COLUMN IF NOT EXISTS speed_bucket    text;
+
+-- Fallback superficie -> velocidad (antes repetido en cada CASE)
+CREATE OR REPLACE FUNCTION public.speed_bucket_from_surface(p_surface text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT CASE
+    WHEN lower(COALESCE(p_surface, '')) = 'grass' THEN 'Fast'
+    WHEN lower(COALESCE(p_surface, '')) IN ('indoor hard', 'indoor') THEN 'Fast'
+    WHEN lower(COALESCE(p_surface, '')) = 'clay'  THEN 'Slow'
+    WHEN lower(COALESCE(p_surface, '')) = 'hard'  THEN 'Medium'
+    ELSE NULL
+  END
+$$;
+
+CREATE OR REPLACE FUNCTION public.matches_long_resolve_tourney()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.tourney_key := public.norm_tourney(NEW.tournament_name);
+  NEW.tourney_surface := NULL;
+  NEW.speed_bucket := NULL;
+  SELECT c.surface,
+         COALESCE(c.speed_bucket, CASE
+           WHEN c.speed_rank IS NULL THEN NULL
+           WHEN c.speed_rank <= 33 THEN 'Fast'
+           WHEN c.speed_rank <= 66 THEN 'Medium'
+           ELSE 'Slow'
+         END)
+  INTO NEW.tourney_surface, NEW.speed_bucket
+  FROM public.tourney_speed_resolved c
+  WHERE c.tourney_key = NEW.tourney_key
+  LIMIT 1;
+  RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS matches_long_base_resolve_tourney ON public.matches_long_base;
+CREATE TRIGGER matches_long_base_resolve_tourney
+  BEFORE INSERT OR UPDATE OF tournament_name ON public.matches_long_base
+  FOR EACH ROW EXECUTE FUNCTION public.matches_long_resolve_tourney();
+
+-- Re-resolución masiva (una llamada a norm_tourney por torneo distinto, no por fila)
+CREATE OR REPLACE FUNCTION public.refresh_matches_long_tourney_cols()
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_rows int;
+BEGIN
+  WITH names AS (
+    SELECT DISTINCT tournament_name FROM public.matches_long_base
+  ),
+  keyed AS (
+    SELECT n.tournament_name, public.norm_tourney(n.tournament_name) AS tourney_key
+    FROM names n
+  ),
+  resolved AS (
+    SELECT DISTINCT ON (k.tournament_name)
+           k.tournament_name, k.tourney_key, c.surface,
+           COALESCE(c.speed_bucket, CASE
+             WHEN c.speed_rank IS NULL THEN NULL
+             WHEN c.speed_rank <= 33 THEN 'Fast'
+             WHEN c.speed_rank <= 66 THEN 'Medium'
+             ELSE 'Slow'
+           END) AS speed_bucket
+    FROM keyed k
+    LEFT JOIN public.tourney_speed_resolved c ON c.tourney_key = k.tourney_key
+    ORDER BY k.tournament_name
+  )
+  UPDATE public.matches_long_base b
+  SET tourney_key = r.tourney_key, tourney_surface = r.surface, speed_bucket = r.speed_bucket
+  FROM resolved r
+  WHERE b.tournament_name IS NOT DISTINCT FROM r.tournament_name
+    AND (b.tourney_key, b.tourney_surface, b.speed_bucket)
+        IS DISTINCT FROM (r.tourney_key, r.surface, r.speed_bucket);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END
+$$;
+
+SELECT public.refresh_matches_long_tourney_cols();
+
+-- Historial por jugador: todas las columnas que leen las consultas HIST en el índice
+CREATE INDEX IF NOT EXISTS matches_long_base_player_date_idx
+  ON public.matches_long_base (player_id, match_date)
+  INCLUDE (winner_id, surface, tourney_surface, speed_bucket, tourney_key);
+CREATE INDEX IF NOT EXISTS matches_long_base_tourney_key_idx
+  ON public.matches_long_base (tourney_key);
+ANALYZE public.matches_long_base;
+
+-- La vista canónica expone las columnas nuevas (al final: CREATE OR REPLACE lo permite)
+CREATE OR REPLACE VIEW public.fs_matches_long AS
+SELECT match_date, player_id, opponent_id, winner_id,
+       tournament_name, surface, ext_season_id, ext_event_id,
+       tourney_key, tourney_surface, speed_bucket
+FROM public.matches_long_base;
+
+-- ─────────────────────────────────────────────────────────────────────────────
+-- Consultas HIST sin join por norm_tourney()
+-- ─────────────────────────────────────────────────────────────────────────────
+
+CREATE OR REPLACE VIEW public.fs_hist_agg_source AS
+SELECT
+  f.player_id,
+  f.match_date,
+  EXTRACT(YEAR  FROM f.match_date)::int AS year,
+  EXTRACT(MONTH FROM f.match_date)::int AS month,
+  COALESCE(lower(COALESCE(f.surface, f.tourney_surface)), '') AS surface,
+  COALESCE(lower(f.speed_bucket), '') AS speed_bucket,
+  (f.winner_id = f.player_id) AS won
+FROM public.fs_matches_long f
+WHERE f.player_id IS NOT NULL AND f.match_date IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.get_matchup_hist_vector(
+  p_player_id     int,
+  p_opponent_id   int,
+  p_years_back    int   DEFAULT 4,
+  p_as_of         date  DEFAULT current_date,
+  p_tournament_name text DEFAULT NULL,
+  p_month         int   DEFAULT NULL,
+  p_k_month       int   DEFAULT 8,
+  p_k_surface     int   DEFAULT 8,
+  p_k_speed       int   DEFAULT 8
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+  v_mon int;
+  v_surf text;
+  v_sb   text;
+  pm_played int; pm_wins int;
+  ps_played int; ps_wins int;
+  pv_played int; pv_wins int;
+  om_played int; om_wins int;
+  os_played int; os_wins int;
+  ov_played int; ov_wins int;
+  wr_m_p float; wr_m_o float;
+  wr_s_p float; wr_s_o float;
+  wr_v_p float; wr_v_o float;
+BEGIN
+  v_mon := COALESCE(p_month, EXTRACT(MONTH FROM p_as_of)::int);
+
+  SELECT r.surface, r.speed_bucket
+  INTO v_surf, v_sb
+  FROM public.tourney_speed_resolved r
+  WHERE public.norm_tourney(p_tournament_name) = r.tourney_key
+  LIMIT 1;
+
+  IF v_surf IS NULL THEN v_surf := 'hard'; END IF;
+  IF v_sb IS NULL THEN v_sb := public.speed_bucket_from_surface(v_surf); END IF;
+
+  -- Un solo recorrido del índice (player_id, match_date) para los dos jugadores
+  SELECT
+    COUNT(*) FILTER (WHERE f.player_id = p_player_id AND EXTRACT(MONTH FROM f.match_date) = v_mon),
+    COUNT(*) FILTER (WHERE f.player_id = p_player_id AND EXTRACT(MONTH FROM f.match_date) = v_mon AND f.winner_id = f.player_id),
+    COUNT(*) FILTER (WHERE f.player_id = p_player_id AND lower(COALESCE(f.surface, f.tourney_surface)) = lower(v_surf)),
+    COUNT(*) FILTER (WHERE f.player_id = p_player_id AND lower(COALESCE(f.surface, f.tourney_surface)) = lower(v_surf) AND f.winner_id = f.player_id),
+    COUNT(*) FILTER (WHERE f.player_id = p_player_id AND lower(f.speed_bucket) = lower(v_sb)),
+    COUNT(*) FILTER (WHERE f.player_id = p_player_id AND lower(f.speed_bucket) = lower(v_sb) AND f.winner_id = f.player_id),
+
+    COUNT(*) FILTER (WHERE f.player_id = p_opponent_id AND EXTRACT(MONTH FROM f.match_date) = v_mon),
+    COUNT(*) FILTER (WHERE f.player_id = p_opponent_id AND EXTRACT(MONTH FROM f.match_date) = v_mon AND f.winner_id = f.player_id),
+    COUNT(*) FILTER (WHERE f.player_id = p_opponent_id AND lower(COALESCE(f.surface, f.tourney_surface)) = lower(v_surf)),
+    COUNT(*) FILTER (WHERE f.player_id = p_opponent_id AND lower(COALESCE(f.surface, f.tourney_surface)) = lower(v_surf) AND f.winner_id = f.player_id),
+    COUNT(*) FILTER (WHERE f.player_id = p_opponent_id AND lower(f.speed_bucket) = lower(v_sb)),
+    COUNT(*) FILTER (WHERE f.player_id = p_opponent_id AND lower(f.speed_bucket) = lower(v_sb) AND f.winner_id = f.player_id)
+  INTO pm_played, pm_wins, ps_played, ps_wins, pv_played, pv_wins,
+       om_played, om_wins, os_played, os_wins, ov_played, ov_wins
+  FROM public.fs_matches_long f
+  WHERE f.player_id IN (p_player_id, p_opponent_id)
+    AND f.match_date >= (p_as_of - make_interval(years => p_years_back))
+    AND f.match_date <  p_as_of;
+
+  wr_m_p := COALESCE((pm_wins + 0.5*p_k_month  )::float / NULLIF(pm_played + p_k_month,   0), 0.5);
+  wr_m_o := COALESCE((om_wins + 0.5*p_k_month  )::float / NULLIF(om_played + p_k_month,   0), 0.5);
+  wr_s_p := COALESCE((ps_wins + 0.5*p_k_surface)::float / NULLIF(ps_played + p_k_surface, 0), 0.5);
+  wr_s_o := COALESCE((os_wins + 0.5*p_k_surface)::float / NULLIF(os_played + p_k_surface, 0), 0.5);
+  wr_v_p := COALESCE((pv_wins + 0.5*p_k_speed  )::float / NULLIF(pv_played + p_k_speed,   0), 0.5);
+  wr_v_o := COALESCE((ov_wins + 0.5*p_k_speed  )::float / NULLIF(ov_played + p_k_speed,   0), 0.5);
+
+  RETURN jsonb_build_object(
+    'surface', v_surf,
+    'speed_bucket', v_sb,
+    'played_m_p', pm_played, 'wins_m_p', pm_wins,
+    'played_m_o', om_played, 'wins_m_o', om_wins,
+    'played_surf_p', ps_played, 'wins_surf_p', ps_wins,
+    'played_surf_o', os_played, 'wins_surf_o', os_wins,
+    'played_spd_p', pv_played, 'wins_spd_p', pv_wins,
+    'played_spd_o', ov_played, 'wins_spd_o', ov_wins,
+    'wr_month_p', wr_m_p, 'wr_month_o', wr_m_o,
+    'wr_surf_p',  wr_s_p, 'wr_surf_o',  wr_s_o,
+    'wr_speed_p', wr_v_p, 'wr_speed_o', wr_v_o,
+    'd_hist_month',   wr_m_p - wr_m_o,
+    'd_hist_surface', wr_s_p - wr_s_o,
+    'd_hist_speed',   wr_v_p - wr_v_o
+  );
+END
+$$;
+
+CREATE OR REPLACE FUNCTION public.get_players_hist_winrates(
+  p_player_ids      int[],
+  p_years_back      int   DEFAULT 4,
+  p_as_of           date  DEFAULT current_date,
+  p_tournament_name text  DEFAULT NULL,
+  p_month           int   DEFAULT NULL,
+  p_k_month         int   DEFAULT 8,
+  p_k_surface       int   DEFAULT 8,
+  p_k_speed         int   DEFAULT 8
+)
+RETURNS TABLE (
+  player_id     int,
+  surface       text,
+  speed_bucket  text,
+  played_m      int,
+  wins_m        int,
+  played_surf   int,
+  wins_surf     int,
+  played_spd    int,
+  wins_spd      int,
+  wr_month      float,
+  wr_surf       float,
+  wr_speed      float
+)
+LANGUAGE sql
+STABLE
+AS $$
+WITH t AS (
+  SELECT r.surface, r.speed_bucket
+  FROM public.tourney_speed_resolved r
+  WHERE r.tourney_key = public.norm_tourney(p_tournament_name)
+  LIMIT 1
+),
+m0 AS (
+  SELECT COALESCE((SELECT t.surface FROM t), 'hard') AS surf,
+         (SELECT t.speed_bucket FROM t)              AS sb
+),
+meta AS (
+  SELECT
+    m0.surf,
+    COALESCE(m0.sb, public.speed_bucket_from_surface(m0.surf)) AS sb,
+    COALESCE(p_month, EXTRACT(MONTH FROM p_as_of)::int) AS mon
+  FROM m0
+),
+ids AS (
+  SELECT DISTINCT u.pid
+  FROM unnest(p_player_ids) AS u(pid)
+  WHERE u.pid IS NOT NULL
+),
+fm AS (
+  SELECT
+    f.player_id AS pid,
+    (f.winner_id = f.player_id) AS won,
+    EXTRACT(MONTH FROM f.match_date) = meta.mon AS in_month,
+    lower(COALESCE(f.surface, f.tourney_surface)) = lower(meta.surf) AS in_surf,
+    lower(f.speed_bucket) = lower(meta.sb) AS in_speed
+  FROM public.fs_matches_long f
+  JOIN ids ON ids.pid = f.player_id
+  CROSS JOIN meta
+  WHERE f.match_date >= (p_as_of - make_interval(years => p_years_back))
+    AND f.match_date <  p_as_of
+),
+counts AS (
+  SELECT
+    r.pid,
+    COUNT(*) FILTER (WHERE r.in_month)::int              AS pm,
+    COUNT(*) FILTER (WHERE r.in_month AND r.won)::int    AS wm,
+    COUNT(*) FILTER (WHERE r.in_surf)::int               AS ps,
+    COUNT(*) FILTER (WHERE r.in_surf AND r.won)::int     AS ws,
+    COUNT(*) FILTER (WHERE r.in_speed)::int              AS pv,
+    COUNT(*) FILTER (WHERE r.in_speed AND r.won)::int    AS wv
+  FROM fm r
+  GROUP BY r.pid
+)
+SELECT
+  ids.pid,
+  meta.surf,
+  meta.sb,
+  COALESCE(c.pm, 0), COALESCE(c.wm, 0),
+  COALESCE(c.ps, 0), COALESCE(c.ws, 0),
+  COALESCE(c.pv, 0), COALESCE(c.wv, 0),
+  COALESCE((COALESCE(c.wm,0) + 0.5*p_k_month  )::float / NULLIF(COALESCE(c.pm,0) + p_k_month,   0), 0.5),
+  COALESCE((COALESCE(c.ws,0) + 0.5*p_k_surface)::float / NULLIF(COALESCE(c.ps,0) + p_k_surface, 0), 0.5),
+  COALESCE((COALESCE(c.wv,0) + 0.5*p_k_speed  )::float / NULLIF(COALESCE(c.pv,0) + p_k_speed,   0), 0.5)
+FROM ids
+CROSS JOIN meta
+LEFT JOIN counts c ON c.pid = ids.pid
+$$;
+
+GRANT EXECUTE ON FUNCTION public.speed_bucket_from_surface(text) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.get_matchup_hist_vector(
+  int,int,int,date,text,int,int,int,int
+) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.get_players_hist_winrates(
+  int[],int,date,text,int,int,int,int
+) TO anon, authenticated, service_role;
+GRANT SELECT ON public.fs_matches_long TO anon, authenticated, service_role;
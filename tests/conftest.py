@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from services import sportradar_now as SR
+from services import supabase_fs as FS
+
+
+@pytest.fixture(autouse=True)
+def _clear_sr_cache():
+    # La caché de respuestas SR es de proceso: cada test parte de vacío
+    SR.RESP_CACHE.clear()
+    yield
+    SR.RESP_CACHE.clear()
+
+
+@pytest.fixture(autouse=True)
+def _clear_matchup_l1():
+    FS.MATCHUP_L1.clear()
+    yield
+    FS.MATCHUP_L1.clear()
@@ -0,0 +1,109 @@
+import math
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from utils import backtest_core as BC
+
+
+def _df(n=300, seed=7):
+    rng = np.random.default_rng(seed)
+    data = {"player_id": np.arange(n), "winner_id": np.where(rng.random(n) < 0.55, np.arange(n), -1)}
+    for dim in BC.DIMENSIONS:
+        for wins, played in (dim[:2], dim[2:]):
+            # conteos pequeños: muchos empates en p_hat, como en los datos reales
+            p = rng.integers(0, 6, n)
+            data[played] = p
+            data[wins] = rng.integers(0, p + 1)
+    return pd.DataFrame(data)
+
+
+def _reference(df, w, k):
+    """La implementación fila a fila de antes (smooth + sigmoid + métricas por pares)."""
+    def smooth(wins, played, kk):
+        return (wins + 0.5 * kk) / (played + kk)
+
+    p = []
+    for _, r in df.iterrows():
+        d = [smooth(r[dim[0]], r[dim[1]], kk) - smooth(r[dim[2]], r[dim[3]], kk)
+             for dim, kk in zip(BC.DIMENSIONS, k)]
+        z = sum(wi * di for wi, di in zip(w, d)) / max(1.0, sum(abs(x) for x in w))
+        p.append(1.0 / (1.0 + math.exp(-z)))
+    p = np.array(p)
+    y = (df["winner_id"] == df["player_id"]).to_numpy().astype(int)
+    ll = -np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))
+    pos, neg = p[y == 1], p[y == 0]
+    auc = np.mean([0.5 if abs(a - b) < 1e-12 else float(a > b) for a in pos for b in neg])
+    return ll, auc, np.mean(p >= 0.5), p.mean()
+
+
+def test_grid_matches_row_by_row_reference():
+    df = _df()
+    data = BC.BacktestData(df)
+    ws = [(0.5, 1.0, 2.0), (1.0, 1.0, 1.0), (2.0, 0.0, -1.0)]
+    ks = [(8, 8, 8), (2, 16, 4)]
+    rows = BC.evaluate_grid(data, ws, ks)
+    assert len(rows) == len(ws) * len(ks)
+    for r in rows:
+        ll, auc, acc, avg = _reference(df, (r["W_MONTH"], r["W_SURF"], r["W_SPEED"]),
+                                       (r["K_MONTH"], r["K_SURF"], r["K_SPEED"]))
+        assert abs(r["log_loss"] - ll) < 1e-12
+        assert abs(r["auc"] - auc) < 1e-12
+        assert r["accuracy@0.5"] == acc and abs(r["avg_p"] - avg) < 1e-12
+
+
+def test_auc_is_nan_with_one_class_and_grid_parsing():
+    p = np.array([[0.2, 0.8, 0.5]])
+    assert np.isnan(BC.metrics(p, np.ones(3))["auc"][0])
+    assert BC.parse_grid("0:1:0.25", [9]) == [0.0, 0.25, 0.5, 0.75, 1.0]
+    assert BC.parse_grid("0.5, 2", [9]) == [0.5, 2.0]
+    assert BC.parse_grid("", [9]) == [9]
+    assert len(BC.product3([1, 2])) == 8
+
+
+def test_large_grid_runs_in_one_pass():
+    data = BC.BacktestData(_df(n=1500))
+    weights = BC.product3(BC.parse_grid("0:3:0.25", []))     # 13^3 = 2197
+    rows = BC.evaluate_grid(data, weights, [(8, 8, 8)])
+    assert len(rows) == 2197
+    assert all(0.0 <= r["auc"] <= 1.0 for r in rows)
+
+
+def test_streaming_accumulator_matches_in_memory_grid():
+    df = _df(n=1000, seed=11)
+    ws = BC.product3([0.5, 1.0, 2.0])
+    ks = [(8, 8, 8), (2, 16, 4)]
+    full = BC.evaluate_grid(BC.BacktestData(df), ws, ks)
+    acc = BC.GridAccumulator(ws, ks, bins=10000)
+    for i in range(0, len(df), 333):   # bloques desiguales
+        acc.update(BC.BacktestData(df.iloc[i:i + 333]))
+    for a, b in zip(full, acc.rows()):
+        assert a["rows"] == b["rows"] == 1000
+        assert abs(a["log_loss"] - b["log_loss"]) < 1e-12
+        assert a["accuracy@0.5"] == b["accuracy@0.5"] and abs(a["avg_p"] - b["avg_p"]) < 1e-12
+        # AUC por histograma: aproximado al ancho de cubo
+        assert abs(a["auc"] - b["auc"]) < 2e-3
+
+
+def test_parallel_grid_uses_shared_memory_and_matches_serial():
+    from utils import grid_search as GS
+
+    data = BC.BacktestData(_df(n=600, seed=5))
+    values = [0.0, 1.0, 2.0]
+    ks = [(8, 8, 8), (4, 4, 4)]
+    seen = []
+    par = GS.search(data, values, ks, strategy="grid", workers=2, on_rows=seen.append)
+    ser = sorted(BC.evaluate_grid(data, BC.product3(values), ks), key=GS._rank_key)
+    assert len(par) == len(ser) == 54 and sum(len(r) for r in seen) == 54
+    key = lambda r: (r["W_MONTH"], r["W_SURF"], r["W_SPEED"], r["K_MONTH"])
+    assert {key(r): r["log_loss"] for r in par} == {key(r): r["log_loss"] for r in ser}
+    assert par[0]["log_loss"] == min(r["log_loss"] for r in ser)
+
+    refined = GS.search(data, values, ks[:1], strategy="refine", workers=1, rounds=2, top=3)
+    coarse_best = min(r["log_loss"] for r in ser if r["K_MONTH"] == 8)
+    assert len(refined) > 27 and refined[0]["log_loss"] <= coarse_best
+    assert len(GS.search(data, values, ks[:1], strategy="random", samples=50, seed=1)) == 50
@@ -0,0 +1,95 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from apps_script import bracket_engine as BE
+
+# Fuerza por jugador -> P(i gana a j) = s_i / (s_i + s_j)
+STRENGTH = np.array([4.0, 1.0, 2.0, 3.0])
+P4 = STRENGTH[:, None] / (STRENGTH[:, None] + STRENGTH[None, :])
+ENTRANTS = [{"id": str(i), "name": n} for i, n in enumerate("ABCD")]
+
+
+def _champion_4(P, order):
+    a, b, c, d = order
+    semi = {a: P[a, b], b: P[b, a], c: P[c, d], d: P[d, c]}
+    return {
+        x: semi[x] * sum(semi[y] * P[x, y] for y in (rivals))
+        for pair, rivals in (((a, b), (c, d)), ((c, d), (a, b)))
+        for x in pair
+    }
+
+
+def test_mc_converges_to_analytic_champion_odds():
+    order = [0, 1, 2, 3]
+    res = BE.simulate(P4, order, 200_000, seed=7)
+    exact = _champion_4(P4, order)
+    for i, p in exact.items():
+        assert abs(res["champion"][i] - p) < 0.01
+
+
+def test_reach_rows_sum_to_matches_per_round():
+    rng = np.random.default_rng(0)
+    s = rng.normal(size=16)
+    P = 1 / (1 + np.exp(-(s[:, None] - s[None, :])))
+    res = BE.simulate(P, list(range(16)), 3000, seed=1)
+
+    assert res["reach"].shape == (16, 4)
+    assert np.allclose(res["reach"].sum(axis=0), [8, 4, 2, 1])
+    # Ganar una ronda implica haber ganado la anterior
+    assert np.all(np.diff(res["reach"], axis=1) <= 1e-12)
+
+
+def test_chunks_keep_same_totals(monkeypatch):
+    monkeypatch.setattr(BE, "CHUNK_RUNS", 999)
+    res = BE.simulate(P4, [0, 1, 2, 3], 5000, seed=3)
+    assert res["runs"] == 5000
+    assert abs(res["champion"].sum() - 1.0) < 1e-12
+
+
+def test_sample_bracket_uses_bracket_json_schema():
+    order = BE.seeded_order([{"seed": 1}, {"seed": 4}, {"seed": 2}, {"seed": 3}], use_seeds=True)
+    assert order == [0, 1, 2, 3]
+
+    res = BE.simulate(P4, order, 10, seed=0)
+    rounds = BE.bracket_rounds(P4, order, res["sample"], ENTRANTS)
+    assert [r["round"] for r in rounds] == [1, 2]
+    m = rounds[0]["matches"][0]
+    assert set(m) == {"a", "b", "a_id", "b_id", "a_id_resolved", "b_id_resolved",
+                      "a_sr_id", "b_sr_id", "prob_a", "winner"}
+    assert m["prob_a"] == round(P4[0, 1], 6)
+    assert rounds[1]["matches"][0]["winner"] in "ABCD"
+
+
+def test_deterministic_advances_favourites():
+    assert BE.deterministic(P4, [0, 1, 2, 3]) == [[0, 3], [0]]
+
+
+def test_draw_size_must_be_power_of_two():
+    with pytest.raises(ValueError):
+        BE.simulate(np.full((6, 6), 0.5), list(range(6)), 10)
+
+
+def test_exact_matches_analytic_four_player_draw():
+    order = [0, 1, 2, 3]
+    res = BE.exact(P4, order)
+    for i, p in _champion_4(P4, order).items():
+        assert abs(res["champion"][i] - p) < 1e-12
+    assert np.allclose(res["reach"][:, 0], [P4[0, 1], P4[1, 0], P4[2, 3], P4[3, 2]])
+
+
+def test_exact_agrees_with_monte_carlo_on_larger_draw():
+    rng = np.random.default_rng(5)
+    s = rng.normal(size=32)
+    P = 1 / (1 + np.exp(-(s[:, None] - s[None, :])))
+    order = list(rng.permutation(32))
+
+    ex = BE.exact(P, order)
+    mc = BE.simulate(P, order, 100_000, seed=2)
+
+    assert np.allclose(ex["reach"].sum(axis=0), [16, 8, 4, 2, 1])
+    assert np.max(np.abs(ex["reach"] - mc["reach"])) < 0.01
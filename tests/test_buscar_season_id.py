@@ -29,7 +29,7 @@ def test_buscar_season_id_por_nombre_con_ano(monkeypatch):
     def mock_get(url, headers=None, timeout=None):
         return MockResp(sample)
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
 
     assert main.buscar_season_id_por_nombre("toronto 2024") == "sr:season:1"
 
@@ -46,7 +46,7 @@ def test_buscar_season_id_por_nombre_mas_reciente(monkeypatch):
     def mock_get(url, headers=None, timeout=None):
         return MockResp(sample)
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
 
     assert main.buscar_season_id_por_nombre("toronto") == "sr:season:3"
 
@@ -61,6 +61,6 @@ def test_buscar_season_id_por_nombre_not_found(monkeypatch):
     def mock_get(url, headers=None, timeout=None):
         return MockResp(sample)
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
 
     assert main.buscar_season_id_por_nombre("madrid") is None
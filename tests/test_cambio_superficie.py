@@ -33,7 +33,7 @@ def test_viene_de_cambio_de_superficie_true(monkeypatch):
     def mock_get(url, headers=None, timeout=None):
         return MockResp(sample)
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
 
     assert main.viene_de_cambio_de_superficie("player", "hard") is True
 
@@ -52,7 +52,7 @@ def test_viene_de_cambio_de_superficie_false(monkeypatch):
     def mock_get(url, headers=None, timeout=None):
         return MockResp(sample)
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
 
     assert main.viene_de_cambio_de_superficie("player", "Clay") is False
 
@@ -37,8 +37,11 @@ def test_get_defense_prev_year_by_sr_returns_mapping():
 
 
 def test_enrich_resp_with_extras_uses_int_sr_and_sets_extras(monkeypatch):
-    def fake_get_player_meta(pid, conn=None):
-        return {"ext_sportradar_id": f"sr:competitor:{225050 if pid == 1 else 407573}"}
+    def fake_get_players_meta(players, conn=None):
+        return [
+            {"ext_sportradar_id": f"sr:competitor:{225050 if pid == 1 else 407573}"}
+            for pid in players
+        ]
 
     captured = {}
 
@@ -50,7 +53,7 @@ def test_enrich_resp_with_extras_uses_int_sr_and_sets_extras(monkeypatch):
             407573: {"points": 600, "title_code": "runner"},
         }
 
-    monkeypatch.setattr(main.FS, "get_player_meta", fake_get_player_meta)
+    monkeypatch.setattr(main.FS, "get_players_meta", fake_get_players_meta)
     monkeypatch.setattr(main.FS, "get_defense_prev_year_by_sr", fake_get_defense_prev_year_by_sr)
     monkeypatch.setattr(main.FS, "get_tourney_country", lambda name: None)
 
@@ -23,7 +23,7 @@ def test_evaluar_includes_superficie_favorita(monkeypatch):
     def mock_get(url, timeout=None, headers=None):
         return MockResp({})
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
     monkeypatch.setattr(
         main,
         "obtener_estadisticas_jugador",
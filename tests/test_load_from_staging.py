@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from apps_script import load_from_staging as LFS
+from services.player_index import PlayerIndex
+
+
+class Resp:
+    def __init__(self, data=None):
+        self.ok, self.status_code, self.text = True, 200, ""
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+def test_draw_migration_is_one_post_and_one_patch(monkeypatch, tmp_path):
+    calls = []
+    staging = [
+        {"pos": 1, "player_name": "Alcaraz, Carlos", "seed": 1},
+        {"pos": 2, "player_name": "Qualifier", "tag": "Q"},
+        {"pos": 3, "player_name": "Desconocido, Fulano"},
+    ]
+    monkeypatch.setattr(LFS, "_PLAYERS_MIN", PlayerIndex.from_rows(players_min=[(10, "Alcaraz, Carlos")]))
+    monkeypatch.setattr(LFS.requests, "delete", lambda url, **kw: calls.append(("DELETE", url)) or Resp())
+    monkeypatch.setattr(LFS.requests, "get", lambda url, **kw: calls.append(("GET", url)) or Resp(staging))
+    monkeypatch.setattr(LFS.requests, "post", lambda url, **kw: calls.append(("POST", url, kw["data"])) or Resp())
+    monkeypatch.setattr(LFS.requests, "patch", lambda url, **kw: calls.append(("PATCH", url)) or Resp())
+    monkeypatch.setattr(sys, "argv", ["load_from_staging.py", "T1"])
+    monkeypatch.setenv("DRAW_SUMMARY_JSON", str(tmp_path / "summary.json"))
+
+    LFS.main()
+
+    verbs = [c[0] for c in calls]
+    assert verbs == ["DELETE", "DELETE", "GET", "POST", "PATCH"]
+    body = json.loads(calls[3][2])
+    assert [(e["pos"], e["player_id"], e["tag"]) for e in body] == [(1, 10, None), (2, None, "Q"), (3, None, "UNRESOLVED")]
+    assert calls[4][1].endswith("tourney_id=eq.T1&pos=in.(1,2,3)")
+
+    summary = json.loads((tmp_path / "summary.json").read_text(encoding="utf-8"))
+    assert summary["resolved"] == 1 and summary["tagged"] == 1
+    assert summary["unresolved"] == [{"pos": 3, "player_name": "Desconocido, Fulano",
+                                      "reason": "sin coincidencias en players_min"}]
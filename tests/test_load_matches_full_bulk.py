@@ -0,0 +1,82 @@
+import os
+import re
+import sys
+from decimal import Decimal
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from apps_script import load_matches_full_improved as L
+from services.player_index import PlayerIndex
+
+# Entradas compartidas por las réplicas SQL y los parsers de Python
+INT_INPUTS = [None, "", " ", "NA", "N/A", "abc", "12", " 12 ", "+5", "-3", "12.7", "-3.9",
+              ".5", "5.", "1e3", "2.5E1", "0", "007", "1.2.3", "12a", "--1"]
+HAND_INPUTS = [None, "", " ", "R", " r ", "Right", "RH", "L", "left", "lh", "A", "Ambidextrous",
+               "ambidextroxo", "Ambidextro", "U", "unknown", "NA", "n/a", "X", "righty"]
+SURFACE_INPUTS = [None, "", " ", "Hard", "hard", "HARD", " Clay ", "grass", "Carpet", "unknown",
+                  "Indoor Hard", "hard indoor", "HARD INDOOR", "Hard (i)", "Acrylic"]
+
+
+def test_bulk_exprs_cover_upsert_columns():
+    # --bulk debe rellenar exactamente las mismas columnas que la carga fila a fila
+    cols = [c.lower() for c in L.MATCHES_FULL_COLUMNS]
+    assert len(set(cols)) == len(cols)
+    assert list(L.BULK_MATCH_EXPRS) == cols
+    assert L.BULK_CSV_COLUMNS == cols
+
+
+def test_upsert_tuples_match_column_list(monkeypatch):
+    captured = []
+
+    class Cur:
+        def execute(self, sql, params=None):
+            pass
+
+        def fetchall(self):
+            return []
+
+    def fake_execute_values(cur, sql, rows, page_size=None):
+        captured.append((sql, rows))
+
+    monkeypatch.setattr(L, "execute_values", fake_execute_values)
+    index = PlayerIndex.from_rows(players=[(1, "Uno, Jugador", None), (2, "Dos, Jugador", None)])
+    row = {c: "" for c in L.MATCHES_FULL_COLUMNS}
+    row.update(tourney_id="2026-0001", tourney_name="Test", tourney_date="20260105", match_num="1",
+               winner_id="1", winner_name="Uno, Jugador", loser_id="2", loser_name="Dos, Jugador")
+    ins, skipped, already = L.upsert_matches_full(Cur(), [row], index)
+    assert (ins, skipped, already) == (1, 0, 0)
+    sql, rows = next(c for c in captured if "matches_full" in c[0])
+    assert len(rows[0]) == len(L.MATCHES_FULL_COLUMNS)
+    assert ", ".join(L.MATCHES_FULL_COLUMNS) in sql
+
+
+def test_as_int_regex_matches_python():
+    # pg_temp.as_int: regex + trunc(numeric); se reproduce aquí con el mismo patrón
+    pattern = re.search(r"btrim\(t\) ~ '([^']+)'", L.BULK_FUNCS_SQL).group(1)
+
+    def sql_as_int(t):
+        if t is None or not re.search(pattern, t.strip(" ")):
+            return None
+        return int(Decimal(t.strip(" ")))
+
+    for t in INT_INPUTS:
+        assert sql_as_int(t) == L.as_int(t), t
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL no definido")
+def test_sql_replicas_match_python():
+    conn = L.connect(os.environ["TEST_DATABASE_URL"])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(L.BULK_FUNCS_SQL)
+            for fn, py, inputs in (("as_int", L.as_int, INT_INPUTS),
+                                   ("norm_hand", L.norm_hand, HAND_INPUTS),
+                                   ("norm_surface", L.norm_surface, SURFACE_INPUTS)):
+                for t in inputs:
+                    cur.execute(f"SELECT pg_temp.{fn}(%s)", (t,))
+                    assert cur.fetchone()[0] == py(t), (fn, t)
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,243 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import main
+
+WR = {1: 0.70, 2: 0.55, 3: 0.40, 4: 0.50}
+
+
+def _patch_backends(monkeypatch, calls, bulk=True):
+    lock = threading.Lock()
+
+    def count(name):
+        with lock:
+            calls[name] = calls.get(name, 0) + 1
+
+    def hist_vector(p_id, o_id, **kw):
+        count("hist_pair")
+        d = WR[p_id] - WR[o_id]
+        return {"surface": "clay", "speed_bucket": "Slow",
+                "d_hist_month": d, "d_hist_surface": d, "d_hist_speed": d}
+
+    def hist_bulk(ids, yrs, tname, month):
+        count("hist_bulk")
+        if not bulk:
+            return None
+        return {"surface": "clay", "speed_bucket": "Slow",
+                "players": {i: {"wr_month": WR[i], "wr_surf": WR[i], "wr_speed": WR[i]} for i in ids}}
+
+    def profile(sid):
+        count("profile")
+        return {"competitor_rankings": [{"rank": int(sid.rsplit(":", 1)[1]) * 10}]}
+
+    monkeypatch.setattr(main.FS, "get_tourney_meta", lambda name: {"surface": "clay", "speed_bucket": "Slow"})
+    monkeypatch.setattr(main.FS, "get_matchup_cache_json", lambda **kw: (None, None))
+    monkeypatch.setattr(main.FS, "queue_matchup_cache_json", lambda **kw: None)
+    monkeypatch.setattr(main.FS, "get_matchup_hist_vector", hist_vector)
+    monkeypatch.setattr(main.FS, "get_players_hist_winrates", hist_bulk)
+    monkeypatch.setattr(main.FS, "get_sr_id_from_player_int", lambda pid: f"sr:competitor:{pid}")
+    monkeypatch.setattr(main.SR, "get_profile", profile)
+    monkeypatch.setattr(main.SR, "get_last10", lambda sid: [])
+    monkeypatch.setattr(main.SR, "get_ytd_record", lambda sid: {"wins": 5, "losses": 5})
+    monkeypatch.setattr(main.SR, "get_h2h", lambda p, o: (2, 1) if p < o else (1, 2))
+
+
+TOURNEY = {"name": "Roland Garros", "month": 6}
+PAIRS = [
+    {"player_id": 1, "opponent_id": 2},
+    {"player_id": 3, "opponent_id": 4},
+    {"player_id": 1, "opponent_id": 3},
+    {"player_id": 2, "opponent_id": 4},
+]
+
+
+def test_batch_matches_single_matchup_per_pair(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls)
+
+    out = main._compute_matchup_batch({"tournament": TOURNEY, "pairs": PAIRS})
+
+    assert out["stats"]["hist_source"] == "bulk"
+    for pair, res in zip(PAIRS, out["results"]):
+        single = main._compute_matchup_payload({**pair, "tournament": TOURNEY})
+        assert abs(res["prob_player"] - single["prob_player"]) < 1e-12
+        assert res["features"] == single["features"]
+
+
+def test_batch_deduplicates_players(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls)
+
+    out = main._compute_matchup_batch({"tournament": TOURNEY, "pairs": PAIRS})
+
+    assert out["stats"]["players"] == 4
+    assert calls["profile"] == 4       # un perfil por jugador, no por pareja
+    assert calls["hist_bulk"] == 1
+    assert "hist_pair" not in calls
+
+
+def test_batch_falls_back_to_pair_hist_rpc(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls, bulk=False)
+
+    out = main._compute_matchup_batch({"tournament": TOURNEY, "pairs": PAIRS + PAIRS[:1]})
+
+    assert out["stats"]["hist_source"] == "pairs"
+    assert calls["hist_pair"] == 4     # parejas únicas
+    assert out["results"][0]["prob_player"] == out["results"][-1]["prob_player"]
+
+
+def test_batch_marks_pairs_with_late_inputs_as_degraded(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls)
+    fast_profile = main.SR.get_profile
+
+    def profile(sid):
+        if sid.endswith(":4"):
+            time.sleep(1.0)
+        return fast_profile(sid)
+
+    monkeypatch.setattr(main.SR, "get_profile", profile)
+    monkeypatch.setattr(main, "MATCHUP_FANOUT_DEADLINE_SECS", 0.2)
+    monkeypatch.setattr(main, "MATCHUP_BULK_SECS_PER_ROUND", 0.0)
+
+    out = main._compute_matchup_batch({"tournament": TOURNEY, "pairs": PAIRS})
+
+    flags = [(r["ok"], r["degraded"], r["fallbacks"]) for r in out["results"]]
+    assert flags == [(True, False, []), (True, True, ["now"]), (True, False, []), (True, True, ["now"])]
+    assert out["stats"]["degraded_pairs"] == 2
+
+
+def test_bulk_endpoints_use_their_own_pool(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls)
+    threads = set()
+    fast_profile = main.SR.get_profile
+
+    def profile(sid):
+        threads.add(threading.current_thread().name.rsplit("_", 1)[0])
+        return fast_profile(sid)
+
+    monkeypatch.setattr(main.SR, "get_profile", profile)
+    main._compute_matchup_batch({"tournament": TOURNEY, "pairs": PAIRS})
+    main.MATRIX_CACHE.clear()
+    main._compute_matchup_matrix({"tournament": TOURNEY, "entrants": ENTRANTS})
+    assert threads == {"matchup-bulk"}
+
+    # /matchup sigue en su pool
+    threads.clear()
+    monkeypatch.setattr(main, "MATCHUP_FANOUT", True)
+    main._compute_matchup_payload({**PAIRS[0], "tournament": TOURNEY})
+    assert threads == {"matchup-fanout"}
+
+
+def test_bulk_deadline_grows_with_calls(monkeypatch):
+    monkeypatch.setattr(main, "MATCHUP_FANOUT_DEADLINE_SECS", 10.0)
+    monkeypatch.setattr(main, "MATCHUP_BULK_WORKERS", 16)
+    monkeypatch.setattr(main, "MATCHUP_BULK_SECS_PER_ROUND", 2.0)
+    monkeypatch.setattr(main, "MATCHUP_BULK_DEADLINE_MAX_SECS", 120.0)
+    now = time.monotonic()
+    assert 10.0 <= main._bulk_deadline(0) - now < 10.5
+    assert 14.0 <= main._bulk_deadline(32) - now < 14.5
+    assert 120.0 <= main._bulk_deadline(5 * 256 + 2 * 1024) - now < 120.5
+
+
+def test_batch_endpoint_validates_pairs():
+    client = main.app.test_client()
+    r = client.post("/matchup/batch", json={"tournament": TOURNEY, "pairs": []})
+    assert r.status_code == 400
+
+
+ENTRANTS = [{"player_id": 1}, {"player_id": 2}, {"player_id": 3}, {"player_id": 4}]
+
+
+def test_matrix_matches_batch_for_every_pair(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls)
+    monkeypatch.setattr(main.SR, "get_last10", lambda sid: [{"winner": sid.endswith(":1")}])
+    main.MATRIX_CACHE.clear()
+
+    out = main._compute_matchup_matrix({"tournament": TOURNEY, "entrants": ENTRANTS, "h2h": True})
+    pairs = [{"player_id": i + 1, "opponent_id": j + 1} for i in range(4) for j in range(4) if i != j]
+    batch = main._compute_matchup_batch({"tournament": TOURNEY, "pairs": pairs})
+
+    m = out["matrix"]
+    for pr, res in zip(pairs, batch["results"]):
+        i, j = pr["player_id"] - 1, pr["opponent_id"] - 1
+        assert abs(m[i][j] - res["prob_player"]) < 1e-12
+    for i in range(4):
+        assert m[i][i] == 0.5
+        for j in range(4):
+            assert abs(m[i][j] + m[j][i] - 1.0) < 1e-12
+
+
+def test_matrix_fetches_per_player_and_is_cached(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls)
+    main.MATRIX_CACHE.clear()
+
+    out = main._compute_matchup_matrix({"tournament": TOURNEY, "entrants": ENTRANTS})
+    assert calls["profile"] == 4
+    assert out["stats"]["h2h_calls"] == 0
+    assert out["cached"] is False
+
+    # Mismo conjunto en otro orden: sale de caché y se reordena
+    again = main._compute_matchup_matrix({"tournament": TOURNEY, "entrants": ENTRANTS[::-1]})
+    assert again["cached"] is True
+    assert calls["profile"] == 4
+    assert again["matrix"][0][3] == out["matrix"][3][0]
+    assert [e["player_id"] for e in again["entrants"]] == [4, 3, 2, 1]
+
+
+def test_degraded_matrix_is_reported_and_not_kept(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls)
+    fast_profile = main.SR.get_profile
+
+    def profile(sid):
+        if sid.endswith(":4"):
+            time.sleep(1.0)
+        return fast_profile(sid)
+
+    monkeypatch.setattr(main.SR, "get_profile", profile)
+    monkeypatch.setattr(main, "MATCHUP_FANOUT_DEADLINE_SECS", 0.2)
+    monkeypatch.setattr(main, "MATCHUP_BULK_SECS_PER_ROUND", 0.0)
+    monkeypatch.setattr(main, "MATCHUP_MATRIX_DEGRADED_TTL_SECS", 0.0)
+    main.MATRIX_CACHE.clear()
+
+    out = main._compute_matchup_matrix({"tournament": TOURNEY, "entrants": ENTRANTS})
+    assert out["stats"]["degraded"] is True
+    assert out["stats"]["fallbacks"] == {"meta": 0, "ids": 0, "now": 1, "hist": 0, "h2h": 0}
+
+    # No se cachea: la siguiente petición vuelve a pedir las señales
+    monkeypatch.setattr(main.SR, "get_profile", fast_profile)
+    again = main._compute_matchup_matrix({"tournament": TOURNEY, "entrants": ENTRANTS})
+    assert again["cached"] is False and again["stats"]["degraded"] is False
+
+
+def test_matrix_fallback_matches_batch_fallback(monkeypatch):
+    calls = {}
+    _patch_backends(monkeypatch, calls, bulk=False)
+
+    def vector_rpc(payload):
+        # RPC del vector con el jugador contra sí mismo: wr_*_p suavizadas
+        wr = WR[payload["p_player_id"]]
+        assert payload["p_opponent_id"] == payload["p_player_id"]
+        return {"surface": "clay", "speed_bucket": "Slow",
+                "wr_month_p": wr, "wr_surf_p": wr, "wr_speed_p": wr}
+
+    monkeypatch.setattr(main.FS, "_hist_vector_rpc", vector_rpc)
+    main.MATRIX_CACHE.clear()
+
+    out = main._compute_matchup_matrix({"tournament": TOURNEY, "entrants": ENTRANTS, "h2h": True})
+    pairs = [{"player_id": i + 1, "opponent_id": j + 1} for i in range(4) for j in range(4) if i != j]
+    batch = main._compute_matchup_batch({"tournament": TOURNEY, "pairs": pairs})
+
+    assert out["stats"]["hist_source"] == "players" and out["stats"]["degraded"] is False
+    assert batch["stats"]["hist_source"] == "pairs"
+    for pr, res in zip(pairs, batch["results"]):
+        assert abs(out["matrix"][pr["player_id"] - 1][pr["opponent_id"] - 1] - res["prob_player"]) < 1e-12
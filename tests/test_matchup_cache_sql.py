@@ -0,0 +1,50 @@
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from services import supabase_fs as FS
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                         "sql", "migrations", "2025_08_29_matchup_cache.sql")
+
+
+def _fn_body(name):
+    with open(MIGRATION, encoding="utf-8") as f:
+        sql = f.read()
+    return re.search(rf"FUNCTION public\.{name}\(.*?AS \$\$(.*?)\$\$", sql, re.S).group(1)
+
+
+def _squash(s):
+    return re.sub(r"\s+", "", s)
+
+
+def _group(pattern, s):
+    return re.search(pattern, s, re.S).group(1)
+
+
+def test_get_sql_matches_get_matchup_cache_json():
+    # _MATCHUP_CACHE_GET_SQL es una copia de la función con ttl_left añadido
+    fn, inline = _fn_body("get_matchup_cache_json"), FS._MATCHUP_CACHE_GET_SQL
+    assert _squash(_group(r"SELECT (prob_player.*?)\s+FROM public\.matchup_cache", fn)) == \
+        _squash(_group(r"SELECT (prob_player.*?),\s*EXTRACT", inline))
+
+    def preds(where, params):
+        return [_squash(re.sub(params, "%s", p)) for p in re.split(r"\s+AND\s+", where.strip())]
+
+    assert preds(_group(r"WHERE (.*?)LIMIT 1", fn), r"p_\w+") == \
+        preds(_group(r"WHERE (.*?)LIMIT 1", inline), r"%s")
+
+
+def test_upsert_sql_matches_put_matchup_cache_json():
+    fn, inline = _fn_body("put_matchup_cache_json"), FS._MATCHUP_CACHE_UPSERT_SQL
+    cols = _squash(_group(r"INSERT INTO public\.matchup_cache\s*\((.*?)\)", fn))
+    assert cols == _squash(_group(r"INSERT INTO public\.matchup_cache\s*\((.*?)\)", inline))
+    # el SELECT sobre VALUES rellena las columnas en el mismo orden (ttl -> expires_at)
+    select = _group(r"SELECT (.*?)FROM \(VALUES", inline)
+    exprs = [re.sub(r"^v\.|::jsonb$", "", e.strip()) for e in select.split(",")]
+    assert exprs[:-1] == cols.split(",")[:-1]
+    assert _squash(exprs[-1]) == "CASEWHENv.ttlISNULLTHENNULLELSEnow()+make_interval(secs=>v.ttl)END"
+    assert "CASEWHENp_ttl_secondsISNULLTHENNULLELSEnow()+make_interval(secs=>p_ttl_seconds)END" in _squash(fn)
+    assert _squash(_group(r"(ON CONFLICT.*?);", fn)) == _squash(_group(r"(ON CONFLICT.*)", inline))
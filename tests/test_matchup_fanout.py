@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import main
+
+
+def _patch_backends(monkeypatch, h2h):
+    monkeypatch.setattr(main.FS, "get_tourney_meta", lambda name: {"surface": "clay", "speed_bucket": "Slow"})
+    monkeypatch.setattr(main.FS, "get_matchup_cache_json", lambda **kw: (None, None))
+    monkeypatch.setattr(main.FS, "queue_matchup_cache_json", lambda **kw: None)
+    monkeypatch.setattr(main.FS, "get_matchup_hist_vector", lambda **kw: {
+        "surface": "clay", "speed_bucket": "Slow",
+        "d_hist_month": 0.1, "d_hist_surface": 0.1, "d_hist_speed": 0.1,
+    })
+    monkeypatch.setattr(main.FS, "get_sr_id_from_player_int", lambda pid: f"sr:competitor:{pid}")
+    monkeypatch.setattr(main.SR, "get_profile", lambda sid: {
+        "competitor_rankings": [{"rank": 1 if sid.endswith(":1") else 50}]
+    })
+    monkeypatch.setattr(main.SR, "get_last10", lambda sid: [])
+    monkeypatch.setattr(main.SR, "get_ytd_record", lambda sid: {"wins": 5, "losses": 5})
+    monkeypatch.setattr(main.SR, "get_h2h", h2h)
+
+
+BODY = {"player_id": 1, "opponent_id": 2, "tournament": {"name": "Roland Garros", "month": 6}}
+
+
+def test_fanout_matches_sequential_result(monkeypatch):
+    _patch_backends(monkeypatch, lambda p, o: (3, 1))
+
+    monkeypatch.setattr(main, "MATCHUP_FANOUT", False)
+    seq = main._compute_matchup_payload(dict(BODY))
+    monkeypatch.setattr(main, "MATCHUP_FANOUT", True)
+    par = main._compute_matchup_payload(dict(BODY))
+
+    assert par["prob_player"] == seq["prob_player"]
+    assert par["features"] == seq["features"]
+    assert par["inputs"]["player_sr_id"] == "sr:competitor:1"
+
+
+def test_fanout_degrades_only_failed_calls(monkeypatch):
+    def broken_h2h(p, o):
+        raise RuntimeError("SR caído")
+
+    _patch_backends(monkeypatch, broken_h2h)
+
+    monkeypatch.setattr(main, "MATCHUP_FANOUT", True)
+    out = main._compute_matchup_payload(dict(BODY))
+    deltas = out["features"]["deltas"]
+    assert deltas["h2h"] == 0.0
+    assert deltas["rank_norm"] > 0  # el perfil sí llegó
+
+    # En modo secuencial un fallo devuelve todo NOW a neutro
+    monkeypatch.setattr(main, "MATCHUP_FANOUT", False)
+    out = main._compute_matchup_payload(dict(BODY))
+    assert out["features"]["deltas"]["rank_norm"] == 0.0
+
+
+def test_fanout_deadline_uses_neutral_defaults(monkeypatch):
+    def slow_h2h(p, o):
+        time.sleep(1.0)
+        return (9, 0)
+
+    _patch_backends(monkeypatch, slow_h2h)
+
+    monkeypatch.setattr(main, "MATCHUP_FANOUT", True)
+    monkeypatch.setattr(main, "MATCHUP_FANOUT_DEADLINE_SECS", 0.2)
+    t0 = time.monotonic()
+    out = main._compute_matchup_payload(dict(BODY))
+
+    assert time.monotonic() - t0 < 0.9
+    assert out["features"]["deltas"]["h2h"] == 0.0
+    assert out["features"]["deltas"]["hist_month"] == 0.1
+    assert out["degraded"] is True and out["fallbacks"] == ["h2h"]
+
+
+def test_degraded_matchup_is_not_cached(monkeypatch):
+    writes = []
+
+    def broken_h2h(p, o):
+        raise RuntimeError("SR caído")
+
+    _patch_backends(monkeypatch, broken_h2h)
+    monkeypatch.setattr(main.FS, "queue_matchup_cache_json", lambda **kw: writes.append(kw))
+
+    for fanout in (True, False):
+        monkeypatch.setattr(main, "MATCHUP_FANOUT", fanout)
+        out = main._compute_matchup_payload(dict(BODY))
+        assert out["degraded"] is True
+    assert writes == []
+
+    _patch_backends(monkeypatch, lambda p, o: (3, 1))
+    monkeypatch.setattr(main.FS, "queue_matchup_cache_json", lambda **kw: writes.append(kw))
+    out = main._compute_matchup_payload(dict(BODY))
+    assert out["degraded"] is False and out["fallbacks"] == []
+    assert len(writes) == 1
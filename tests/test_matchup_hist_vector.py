@@ -5,6 +5,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 import services.supabase_fs as fs
 import pytest
+import requests
 
 
 def test_get_matchup_hist_vector_missing_data(monkeypatch):
@@ -17,7 +18,7 @@ def test_get_matchup_hist_vector_missing_data(monkeypatch):
 
 def test_get_matchup_hist_vector_rpc_missing_data(monkeypatch):
     def fake_rpc(name, payload):
-        assert name == "get_matchup_hist_vector"
+        assert name in ("get_matchup_hist_vector_agg", "get_matchup_hist_vector")
         return {
             "surface": "hard",
             "speed_bucket": "Medium",
@@ -39,3 +40,24 @@ def test_get_matchup_hist_vector_returns_deltas(monkeypatch):
     assert res["d_hist_month"] == pytest.approx(0.2)
     assert res["d_hist_surface"] == pytest.approx(0.6)
     assert res["d_hist_speed"] == pytest.approx(-0.2)
+
+
+def test_hist_vector_prefers_agg_rpc_and_falls_back_when_missing(monkeypatch):
+    calls = []
+
+    def fake_rpc(name, payload):
+        calls.append(name)
+        if name == "get_matchup_hist_vector_agg":
+            r = requests.Response()
+            r.status_code = 404
+            raise requests.HTTPError(response=r)
+        return {"surface": "clay", "speed_bucket": "Slow",
+                "d_hist_month": 0.1, "d_hist_surface": 0.2, "d_hist_speed": 0.3}
+
+    monkeypatch.setattr(fs, "_rpc", fake_rpc)
+    monkeypatch.setattr(fs, "_HIST_RPC_MISSING", False)
+    res = fs.get_matchup_hist_vector(1, 2, 3, "Roland Garros", 6)
+    assert res["d_hist_speed"] == pytest.approx(0.3) and res["surface"] == "clay"
+    fs.get_matchup_hist_vector(1, 2, 3, "Roland Garros", 6)
+    # la RPC agregada no desplegada solo se intenta una vez
+    assert calls == ["get_matchup_hist_vector_agg", "get_matchup_hist_vector", "get_matchup_hist_vector"]
@@ -0,0 +1,126 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from services import supabase_fs as FS
+
+STORED = {
+    "prob_player": 0.7,
+    "features": {
+        "deltas": {"rank_norm": 0.2, "h2h": -0.05},
+        "flags": {"surf_change_p": 1, "surf_change_o": 0, "mot_p": 2, "mot_o": 0},
+    },
+    "flags": {"surf_change_p": 1, "surf_change_o": 0, "mot_p": 2, "mot_o": 0},
+    "weights_hist": None,
+    "sources": None,
+}
+
+
+class CountingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.last = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def connection(self):
+        return self.conn
+
+    def mogrify(self, template, args):
+        return repr(args).encode()
+
+    def execute(self, sql, params=None):
+        if isinstance(sql, bytes):  # execute_values
+            sql = sql.decode()
+        self.conn.executed.append(sql.strip().split("(")[0])
+        self.last = sql
+
+    def fetchone(self):
+        if "FROM public.matchup_cache" in self.last and self.conn.value is not None:
+            return (self.conn.value, self.conn.ttl_left)
+        return None
+
+
+class CountingConn:
+    encoding = "UTF8"
+
+    def __init__(self, value=None, ttl_left=None):
+        self.executed = []
+        self.value = value
+        self.ttl_left = ttl_left
+
+    def cursor(self):
+        return CountingCursor(self)
+
+    def commit(self):
+        pass
+
+
+ARGS = dict(tournament_name="Roland Garros", mon=6, speed_bucket="Slow", years_back=4, using_sr=True)
+
+
+def test_second_lookup_is_served_from_l1(monkeypatch):
+    monkeypatch.setattr(FS, "DISABLE_DB_CACHE", False)
+    conn = CountingConn(STORED)
+
+    tkey, val = FS.get_matchup_cache_json(player_id=1, opponent_id=2, conn=conn, **ARGS)
+    assert tkey == "roland garros" and val == STORED
+    assert len(conn.executed) == 1
+
+    tkey, val = FS.get_matchup_cache_json(player_id=1, opponent_id=2, conn=conn, **ARGS)
+    assert val == STORED
+    assert len(conn.executed) == 1  # sin ida y vuelta a BD
+
+
+def test_symmetric_pair_is_flipped(monkeypatch):
+    monkeypatch.setattr(FS, "DISABLE_DB_CACHE", False)
+    conn = CountingConn(STORED)
+    FS.get_matchup_cache_json(player_id=1, opponent_id=2, conn=conn, **ARGS)
+
+    _tkey, val = FS.get_matchup_cache_json(player_id=2, opponent_id=1, conn=conn, **ARGS)
+
+    assert len(conn.executed) == 1
+    assert abs(val["prob_player"] - 0.3) < 1e-12
+    assert val["features"]["deltas"] == {"rank_norm": -0.2, "h2h": 0.05}
+    assert val["features"]["flags"] == {"surf_change_o": 1, "surf_change_p": 0, "mot_o": 2, "mot_p": 0}
+    assert STORED["prob_player"] == 0.7  # la entrada original no se toca
+
+
+def test_put_fills_l1_and_db_miss_is_not_cached(monkeypatch):
+    monkeypatch.setattr(FS, "DISABLE_DB_CACHE", False)
+    conn = CountingConn(None)
+
+    assert FS.get_matchup_cache_json(player_id=3, opponent_id=4, conn=conn, **ARGS)[1] is None
+    assert FS.get_matchup_cache_json(player_id=3, opponent_id=4, conn=conn, **ARGS)[1] is None
+    assert conn.executed.count("SELECT to_jsonb") == 2
+
+    FS.put_matchup_cache_json(
+        player_id=3, opponent_id=4, surface="clay", prob_player=0.6,
+        features=STORED["features"], flags=STORED["flags"], weights_hist=None,
+        sources=None, ttl_seconds=60, conn=conn, **ARGS,
+    )
+    n = len(conn.executed)
+    _tkey, val = FS.get_matchup_cache_json(player_id=3, opponent_id=4, conn=conn, **ARGS)
+    assert val["prob_player"] == 0.6
+    assert len(conn.executed) == n
+
+
+def test_l1_expires_with_the_db_row(monkeypatch):
+    monkeypatch.setattr(FS, "DISABLE_DB_CACHE", False)
+    clock = [1000.0]
+    monkeypatch.setattr("utils.ttl_cache.time.monotonic", lambda: clock[0])
+    conn = CountingConn(STORED, ttl_left=30.0)
+
+    FS.get_matchup_cache_json(player_id=5, opponent_id=6, conn=conn, **ARGS)
+    clock[0] += 29
+    FS.get_matchup_cache_json(player_id=5, opponent_id=6, conn=conn, **ARGS)
+    assert len(conn.executed) == 1
+    clock[0] += 2   # la fila ya caducó en BD: L1 tampoco la sirve
+    FS.get_matchup_cache_json(player_id=5, opponent_id=6, conn=conn, **ARGS)
+    assert len(conn.executed) == 2
@@ -0,0 +1,177 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import psycopg2
+import psycopg2.extensions
+
+from services import supabase_fs as FS
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.closed:
+            raise psycopg2.OperationalError("server closed the connection")
+        self.conn.executed.append(sql)
+        if not sql.startswith("SET"):
+            self.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+    def fetchone(self):
+        return {"rank": 7, "points": 100}
+
+
+class FakeConn:
+    def __init__(self):
+        self.closed = 0
+        self.executed = []
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    @property
+    def info(self):
+        return type("Info", (), {"transaction_status": self.status})()
+
+    def commit(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def _fresh_pool(monkeypatch, max_conns=4):
+    created = []
+
+    def fake_connect(*a, **kw):
+        c = FakeConn()
+        created.append(c)
+        return c
+
+    monkeypatch.setattr(psycopg2, "connect", fake_connect)
+    monkeypatch.setattr(FS, "PG_POOL_MIN", 0)
+    monkeypatch.setattr(FS, "PG_POOL_MAX", max_conns)
+    monkeypatch.setattr(FS, "_PG_POOL", None)
+    monkeypatch.setattr(FS, "_PG_LAST_USED", {})
+    return created
+
+
+def test_connections_are_reused_and_prepared(monkeypatch):
+    created = _fresh_pool(monkeypatch)
+
+    assert FS._get_rank_from_db_view(1) == (7, 100)
+    assert FS._get_rank_from_db_view(2) == (7, 100)
+
+    assert len(created) == 1
+    conn = created[0]
+    assert conn.executed[0].startswith("SET statement_timeout")
+    assert sum(sql.startswith("SET") for sql in conn.executed) == 1
+    # Se devolvió sin transacción abierta
+    assert conn.status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    FS._pg_pool_close()
+
+
+def test_dead_connection_is_replaced(monkeypatch):
+    created = _fresh_pool(monkeypatch)
+    monkeypatch.setattr(FS, "PG_POOL_PING_SECS", 0.0)
+
+    FS._get_rank_from_db_view(1)
+    created[0].closed = 1  # el servidor la cortó mientras estaba ociosa
+
+    assert FS._get_rank_from_db_view(1) == (7, 100)
+    assert len(created) == 2
+    assert FS.pg_pool_stats()["discarded"] >= 1
+    FS._pg_pool_close()
+
+
+def test_pool_blocks_instead_of_failing_when_exhausted(monkeypatch):
+    created = _fresh_pool(monkeypatch, max_conns=2)
+
+    held = [FS._pg_conn_or_env()[0] for _ in range(2)]
+    got = []
+    t = threading.Thread(target=lambda: got.append(FS._pg_conn_or_env()[0]))
+    t.start()
+    t.join(0.2)
+    assert not got  # esperando una conexión libre
+
+    FS._pg_release(held[0])
+    t.join(2)
+    assert got == [held[0]]
+    assert len(created) == 2
+
+    FS._pg_release(held[1])
+    FS._pg_release(got[0])
+    FS._pg_pool_close()
+
+
+def test_players_meta_single_query_aligned_with_input(monkeypatch):
+    executed = []
+
+    class MetaCursor:
+        def __init__(self):
+            self.rows = []
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, sql, params=None):
+            executed.append((sql, params))
+            if "information_schema" in sql:
+                self.rows = [("ytd_wr",)]
+            else:
+                self.rows = [
+                    {"ord": 2, "player_id": 20, "name": None, "country_code": None,
+                     "ext_sportradar_id": "sr:competitor:900", "rank": 3, "points": 5000,
+                     "wr": 0.8, "snap_name": "B", "snap_country": "ESP"},
+                    {"ord": 1, "player_id": 10, "name": "A", "country_code": "ARG",
+                     "ext_sportradar_id": "225050", "rank": None, "points": None,
+                     "wr": None, "snap_name": None, "snap_country": None},
+                ]
+                self.rows = [r for r in self.rows if r["ord"] <= len(params[0])]
+
+        def fetchall(self):
+            return self.rows
+
+    class MetaConn:
+        def cursor(self, cursor_factory=None):
+            return MetaCursor()
+
+    monkeypatch.setattr(FS, "_ytd_column_checked", False)
+    metas = FS.get_players_meta([10, "sr:competitor:900", None], conn=MetaConn())
+
+    assert len(executed) == 2  # detección de columna + una única consulta
+    sql, params = executed[1]
+    assert "ytd_wr::float8 as wr" in sql
+    assert params == ([10, None, None], [None, "sr:competitor:900", None])
+
+    assert metas[0]["name"] == "A"
+    assert metas[0]["ext_sportradar_id"] == "sr:competitor:225050"
+    assert metas[0]["rank"] is None
+    assert metas[1]["player_id"] == 20
+    assert metas[1]["name"] == "B" and metas[1]["country_code"] == "ESP"
+    assert metas[1]["rank"] == 3 and metas[1]["ytd_wr"] == 0.8
+    assert metas[2]["player_id"] is None
+
+    # La columna ya está detectada: la siguiente llamada es una sola consulta
+    FS.get_players_meta([10], conn=MetaConn())
+    assert len(executed) == 3
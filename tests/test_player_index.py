@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from services.player_index import PlayerIndex
+from apps_script import load_from_staging as LFS
+from apps_script import load_matches_full_improved as LMF
+
+
+class Cur:
+    """Solo registra escrituras: las lecturas deben salir del índice."""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        assert not sql.lstrip().upper().startswith("SELECT"), sql
+        self.executed.append((" ".join(sql.split()), params))
+
+
+def _index():
+    return PlayerIndex.from_rows(
+        players=[(1, "Felix Auger Aliassime", None), (2, "Carlos Alcaraz", "A0E2"),
+                 (3, "Juan Martinez", None), (4, "Juan Martinez", None)],
+        mappings=[("S0AG", 7), ("XXXX", None)],
+    )
+
+
+def test_match_cascade_ext_map_name_and_ambiguous():
+    idx, cur = _index(), Cur()
+    assert LMF.resolve_from_mapping(cur, "A0E2", "Carlos Alcaraz", idx) == 2
+    assert LMF.resolve_from_mapping(cur, "XXXX", "Carlos Alcaraz", idx) is None   # fila con id NULL
+    assert LMF.resolve_from_mapping(cur, "S0AG", "Sinner", idx) == 7
+    assert idx.ext("S0AG") == 7
+    # guion = espacio; crea mapping y rellena ext_atp_id
+    assert LMF.resolve_from_mapping(cur, "AG37", " Felix Auger-Aliassime ", idx) == 1
+    assert idx.mapping("AG37") == (True, 1) and idx.ext("AG37") == 1
+    assert LMF.resolve_from_mapping(cur, "M999", "Juan Martinez", idx) is None
+    assert idx.ambiguous_names() == {"Juan Martinez": [3, 4]}
+    assert sum("player_name_map" in q for q, _ in cur.executed) == 1
+
+
+def test_upserted_players_are_visible_by_new_name():
+    idx = _index()
+    idx.add_player(3, "Juanjo Martinez", "MJ01")
+    assert idx.by_name("juanjo martinez") == [3]
+    assert idx.by_name("Juan Martinez") == [4]
+    idx.add_player(3, "Juanjo Martinez", "OTRO")       # COALESCE: se queda el primero
+    assert idx.ext("MJ01") == 3 and idx.ext("OTRO") is None
+    assert LMF.resolve_player_id("2", "x", idx, Cur()) == 2     # name_id_map
+    assert LMF.resolve_player_id("3", "Juanjo Martinez", idx, Cur()) == 3
+
+
+def test_staging_resolution_uses_ilike_semantics():
+    idx = PlayerIndex.from_rows(players_min=[
+        (10, "Alcaraz, Carlos"), (11, "Davidovich Fokina, Alejandro"),
+        (12, "Cerundolo, Francisco"), (13, "Cerundolo, Juan Manuel"),
+    ])
+    assert LFS.resolve_player_id("ALCARAZ, Carlos 63 64", idx) == (10, None)
+    assert LFS.resolve_player_id("Carlos Alcaraz", idx) == (10, None)   # "Apellido, Nombre"
+    assert LFS.resolve_player_id("Fokina, Alejandro Davidovich", idx) == (11, None)
+    pid, reason = LFS.resolve_player_id("Cerundolo", idx)
+    assert pid is None and reason.startswith("coincidencias múltiples")
+    assert LFS.resolve_player_id("Nadie, Nobody", idx) == (None, "sin coincidencias en players_min")
+    assert idx.ilike("cerundolo, j_an%") == [13]
@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import main
+from utils import replay_engine as RE
+
+
+def _row(tid, d, rnd, w, l, wr=None, lr=None, surface="Hard", name="T", mnum=1, wioc=None, lioc=None):
+    return (tid, name, surface, d, mnum, rnd, w, l, wr, lr, wioc, lioc)
+
+
+def test_asof_now_features_follow_history():
+    rows = [
+        # desordenado a propósito: la final va después de la semifinal
+        _row("A", date(2023, 12, 1), "F", 2, 1, wr=5, lr=None, mnum=2),
+        _row("A", date(2023, 12, 1), "SF", 1, 3, wr=None, lr=40, mnum=1),
+        _row("B", date(2024, 1, 10), "R32", 1, 2, wr=None, lr=None, surface="Clay",
+             name="Madrid", wioc="ESP", lioc="SRB"),
+    ]
+    f = RE.replay_features(rows, years_back=1, country_of=lambda t: "ESP" if t == "Madrid" else None)
+    assert f["n"] == 3
+    # SF (1 vs 3): nada previo
+    assert (f["player_id"][0], f["opponent_id"][0], f["y"][0]) == (3, 1, 0.0)
+    assert f["rank_p"][0] == 40 and f["rank_o"][0] == RE.NO_RANK and f["last10_p"][0] == 0.0
+    # F (2 vs 1): 1 ya ganó la SF el mismo día -> NOW sí, HIST no (ventana estricta)
+    assert f["last10_o"][1] == 1.0 and f["ytd_o"][1] == 1.0 and f["inactive_o"][1] == 0.0
+    assert f["wr_surf_o"][1] == 0.5
+    # 2024: YTD a cero, last10 e inactividad arrastran, rank del último conocido,
+    # h2h 1-0 para el 2, cambio de superficie y local en Madrid
+    i = 2
+    assert (f["player_id"][i], f["opponent_id"][i]) == (2, 1)
+    assert f["ytd_p"][i] == 0.0 and f["last10_p"][i] == 1.0 and f["last10_o"][i] == 0.5
+    assert f["inactive_p"][i] == 40.0 and f["rank_p"][i] == 5 and f["rank_o"][i] == RE.NO_RANK
+    assert (f["h2h_p"][i], f["h2h_o"][i]) == (1, 0)
+    assert f["surf_change_p"][i] == f["surf_change_o"][i] == 1.0
+    assert (f["local_p"][i], f["local_o"][i]) == (0.0, 1.0)
+    # HIST (k=8): el 1 tiene 1-1 en pista dura, nada en tierra
+    assert f["wr_month_o"][i] == 0.5 and f["wr_surf_o"][i] == 0.5
+
+
+def test_batched_score_matches_scalar_matchup_formula():
+    rng = random.Random(4)
+    rows, d = [], date(2021, 1, 4)
+    for i in range(300):
+        d += timedelta(days=rng.choice([0, 7]))
+        a, b = rng.sample(range(1, 15), 2)
+        rows.append(_row(f"T{d}", d, rng.choice(["R32", "QF", "F"]), a, b,
+                         wr=rng.choice([None, rng.randint(1, 300)]), lr=rng.randint(1, 300),
+                         surface=rng.choice(["Hard", "Clay", "Grass"]), mnum=i,
+                         wioc=rng.choice(["ESP", "USA"]), lioc="ESP"))
+    f = RE.replay_features(rows, years_back=2, country_of=lambda t: "ESP")
+    p, _ = RE.score(f, hist_weights=(main.HIST_W_MONTH, main.HIST_W_SURF, main.HIST_W_SPEED))
+    assert 0 < f["y"].mean() < 1
+    for i in range(f["n"]):
+        side = lambda s: {
+            "ranking_now": f[f"rank_{s}"][i], "winrate_ytd": f[f"ytd_{s}"][i],
+            "winrate_last10": f[f"last10_{s}"][i], "days_inactive": f[f"inactive_{s}"][i],
+            "last_surface": "other" if f[f"surf_change_{s}"][i] else None,
+        }
+        hist = {"surface": "this",
+                "d_hist_month": f["wr_month_p"][i] - f["wr_month_o"][i],
+                "d_hist_surface": f["wr_surf_p"][i] - f["wr_surf_o"][i],
+                "d_hist_speed": f["wr_speed_p"][i] - f["wr_speed_o"][i]}
+        body = {"country": "ESP",
+                "player_country": "ESP" if f["local_p"][i] else None,
+                "opponent_country": "ESP" if f["local_o"][i] else None}
+        ref = main._score_matchup(body, hist, side("p"), side("o"), (f["h2h_p"][i], f["h2h_o"][i]))
+        assert abs(ref["prob_player"] - p[i]) < 1e-12
+    m = RE.evaluate(f, p)
+    assert m["rows"] == f["n"] and 0.0 <= m["auc"] <= 1.0
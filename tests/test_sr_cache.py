@@ -0,0 +1,178 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import main
+from services import sportradar_now as SR
+from utils.ttl_cache import TTLCache
+
+
+class MockResp:
+    def __init__(self, data, status_code=200):
+        self._data = data
+        self.status_code = status_code
+        self.ok = status_code == 200
+        self.headers = {}
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+def test_profile_fetched_once_for_profile_and_ytd(monkeypatch):
+    calls = []
+
+    def mock_get(url, timeout=None, headers=None):
+        calls.append(url)
+        return MockResp({"periods": [], "competitor_rankings": [{"rank": 3}]})
+
+    monkeypatch.setattr(SR.HTTP, "get", mock_get)
+
+    SR.get_profile("sr:competitor:1")
+    SR.get_ytd_record("sr:competitor:1")
+    main.get_player_profile("sr:competitor:1")
+
+    assert len(calls) == 1
+    stats = SR.cache_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_error_responses_are_not_cached(monkeypatch):
+    calls = []
+
+    def mock_get(url, timeout=None, headers=None):
+        calls.append(url)
+        return MockResp({}, status_code=429)
+
+    monkeypatch.setattr(SR.HTTP, "get", mock_get)
+
+    SR.get_last10("sr:competitor:1")
+    SR.get_last10("sr:competitor:1")
+
+    assert len(calls) == 2
+
+
+def test_cache_ttl_per_endpoint():
+    assert SR.cache_ttl("competitors/sr:competitor:1/profile.json") == SR.SR_CACHE_TTL_PROFILE
+    assert SR.cache_ttl("competitors/sr:competitor:1/summaries.json") == SR.SR_CACHE_TTL_SUMMARIES
+    assert SR.cache_ttl("seasons/sr:season:1/summaries.json") == SR.SR_CACHE_TTL_SUMMARIES
+    assert SR.cache_ttl("seasons.json") == SR.SR_CACHE_TTL_SEASONS
+    assert SR.cache_ttl("rankings.json") == SR.SR_CACHE_TTL_DEFAULT
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_entries=2, default_ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_identical_fetches_are_coalesced(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def mock_get(url, timeout=None, headers=None):
+        calls.append(url)
+        release.wait(2)
+        return MockResp({"competitor": {"id": "sr:competitor:7"}})
+
+    monkeypatch.setattr(SR.HTTP, "get", mock_get)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(SR.get_profile("sr:competitor:7")))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(r == {"competitor": {"id": "sr:competitor:7"}} for r in results)
+
+
+def test_single_flight_propagates_errors_to_waiters(monkeypatch):
+    release = threading.Event()
+
+    def mock_get(url, timeout=None, headers=None):
+        release.wait(2)
+        raise SR.requests.ConnectionError("boom")
+
+    monkeypatch.setattr(SR.HTTP, "get", mock_get)
+
+    errors = []
+
+    def worker():
+        try:
+            SR.get_last10("sr:competitor:9")
+        except SR.requests.ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 4
+    assert SR.cache_stats()["in_flight"] == 0
+
+
+def test_http_client_retries_429_honouring_retry_after(monkeypatch):
+    from services import http_client as HTTP
+
+    sleeps = []
+    responses = [
+        MockResp({}, status_code=429),
+        MockResp({}, status_code=503),
+        MockResp({"ok": True}),
+    ]
+    responses[0].headers = {"Retry-After": "2"}
+
+    class FakeSession:
+        def request(self, method, url, timeout=None, **kw):
+            return responses.pop(0)
+
+    monkeypatch.setattr(HTTP, "session_for", lambda url: FakeSession())
+    monkeypatch.setattr(HTTP.time, "sleep", sleeps.append)
+
+    r = HTTP.get("https://api.sportradar.com/tennis/x.json")
+
+    assert r.json() == {"ok": True}
+    assert sleeps[0] == 2.0
+    assert len(sleeps) == 2
+
+
+def test_http_client_does_not_retry_plain_post(monkeypatch):
+    from services import http_client as HTTP
+
+    calls = []
+
+    class FakeSession:
+        def request(self, method, url, timeout=None, **kw):
+            calls.append(method)
+            return MockResp({}, status_code=503)
+
+    monkeypatch.setattr(HTTP, "session_for", lambda url: FakeSession())
+    monkeypatch.setattr(HTTP.time, "sleep", lambda s: None)
+
+    assert HTTP.post("https://x.supabase.co/rest/v1/draw_entries").status_code == 503
+    assert calls == ["POST"]
@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import requests
+
+from services import sr_disk_cache as SRDC
+
+BASE = "https://api.sportradar.com/tennis/trial/v3/en"
+
+
+def _resp(status, body=None, headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(body).encode() if body is not None else b""
+    r.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    return r
+
+
+class Fetcher:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, headers):
+        self.calls.append(headers)
+        return self.responses.pop(0)
+
+
+def test_canonical_key_ignores_api_key_and_encoding():
+    a = SRDC.canonical_key(f"{BASE}/competitors/sr%3Acompetitor%3A1/profile.json?api_key=XYZ")
+    b = SRDC.canonical_key(f"{BASE}/competitors/sr:competitor:1/profile.json")
+    assert a == b
+    assert SRDC.freshness(a) == SRDC.DAY
+
+
+def test_fresh_entry_is_served_from_disk(tmp_path):
+    cache = SRDC.SRDiskCache(str(tmp_path / "sr.sqlite"))
+    url = f"{BASE}/seasons/sr:season:1/summaries.json"
+    fetch = Fetcher(_resp(200, {"summaries": [1, 2]}, {"ETag": '"v1"'}))
+
+    r, src = cache.get(url, fetch)
+    assert src == "network" and r.json() == {"summaries": [1, 2]}
+
+    # otra instancia sobre el mismo fichero (otra ejecución del loader)
+    again = SRDC.SRDiskCache(str(tmp_path / "sr.sqlite"))
+    r, src = again.get(url + "?api_key=otra", fetch)
+    assert src == "hit" and r.ok and r.json() == {"summaries": [1, 2]}
+    assert len(fetch.calls) == 1
+
+
+def test_stale_entry_is_revalidated_with_etag(tmp_path, monkeypatch):
+    cache = SRDC.SRDiskCache(str(tmp_path / "sr.sqlite"))
+    url = f"{BASE}/rankings.json"
+    fetch = Fetcher(
+        _resp(200, {"rankings": []}, {"ETag": '"v1"', "Last-Modified": "Mon, 01 Sep 2025 10:00:00 GMT"}),
+        _resp(304),
+        _resp(200, {"rankings": ["nuevo"]}, {"ETag": '"v2"'}),
+    )
+    cache.get(url, fetch)
+
+    monkeypatch.setattr(SRDC, "SR_DISK_MAX_AGE", "0")
+    r, src = cache.get(url, fetch)
+    assert src == "revalidated" and r.json() == {"rankings": []}
+    assert fetch.calls[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Sep 2025 10:00:00 GMT"}
+
+    r, src = cache.get(url, fetch)
+    assert src == "network" and r.json() == {"rankings": ["nuevo"]}
+    assert cache.stats()["blobs"] == 1   # el cuerpo viejo se borra
+
+
+def test_errors_are_not_stored_and_bodies_are_shared(tmp_path):
+    cache = SRDC.SRDiskCache(str(tmp_path / "sr.sqlite"))
+    fetch = Fetcher(_resp(429, {}), _resp(200, {"x": 1}), _resp(200, {"x": 1}))
+
+    assert cache.get(f"{BASE}/competitions.json", fetch)[0].status_code == 429
+    cache.get(f"{BASE}/competitions.json", fetch)
+    cache.get(f"{BASE}/seasons.json", fetch)
+
+    st = cache.stats()
+    assert st["resources"] == 2 and st["blobs"] == 1
+
+
+def test_default_cache_respects_flag(monkeypatch):
+    monkeypatch.setenv("SR_DISK_CACHE", "0")
+    assert SRDC.default_cache(enabled_by_default=True) is None
+    monkeypatch.delenv("SR_DISK_CACHE")
+    assert SRDC.default_cache(enabled_by_default=False) is None
@@ -35,7 +35,7 @@ def test_calcular_superficie_favorita(monkeypatch):
     def mock_get(url, timeout=None, headers=None):
         return MockResp(sample)
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
 
     superficie, porcentaje = main.calcular_superficie_favorita("player")
     assert superficie == "grass"
@@ -57,7 +57,7 @@ def test_calcular_superficie_favorita_zero(monkeypatch):
     def mock_get(url, timeout=None, headers=None):
         return MockResp(sample)
 
-    monkeypatch.setattr(main.requests, "get", mock_get)
+    monkeypatch.setattr(main.HTTP, "get", mock_get)
 
     superficie, porcentaje = main.calcular_superficie_favorita("player")
     assert superficie == "hard"
@@ -0,0 +1,42 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.token_bucket import TokenBucket
+
+
+def test_rate_is_respected_across_threads():
+    tb = TokenBucket(rate=50, burst=1)
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=lambda: [tb.acquire() for _ in range(5)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 20 tokens a 50/s con ráfaga 1: ~0.38 s como mínimo
+    assert time.monotonic() - t0 >= 0.35
+
+
+def test_throttle_halves_rate_pauses_and_recovers():
+    tb = TokenBucket(rate=100, burst=5, recover_step=50)
+    tb.throttle(retry_after=0.2)
+    assert tb.rate == 50
+
+    t0 = time.monotonic()
+    tb.acquire()
+    assert time.monotonic() - t0 >= 0.19   # respeta Retry-After
+
+    tb.success()
+    tb.success()
+    assert tb.rate == 100                 # nunca por encima del objetivo
+    assert tb.stats()["throttled"] == 1
+
+
+def test_rate_never_drops_below_min():
+    tb = TokenBucket(rate=8, min_rate=2)
+    for _ in range(10):
+        tb.throttle(retry_after=0)
+    assert tb.rate == 2
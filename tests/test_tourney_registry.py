@@ -0,0 +1,138 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from services import supabase_fs as FS
+from services import tourney_registry as TR
+
+
+# Salidas de public.norm_tourney() en Postgres (unaccent + regexp)
+@pytest.mark.parametrize("name,key", [
+    ("Roland Garros", "roland garros"),
+    ("  Monte-Carlo  ", "monte carlo"),
+    ("Queen's Club / London", "queen s club london"),
+    ("'s-Hertogenbosch", "s hertogenbosch"),
+    ("Kitzbühel", "kitzbuhel"),
+    ("Båstad", "bastad"),
+    ("São Paulo", "sao paulo"),
+    ("Łódź Open", "lodz open"),
+    ("Øresund", "oresund"),
+    ("Straße", "strasse"),
+    ("ATP 500 - Halle", "atp 500 halle"),
+    ("!!!", ""),
+])
+def test_norm_tourney_matches_sql(name, key):
+    assert TR.norm_tourney(name) == key
+
+
+def test_norm_tourney_none():
+    assert TR.norm_tourney(None) is None
+    assert FS.norm_tourney("") is None
+
+
+TABLES = {
+    "resolved": [
+        {"tourney_key": "roland garros", "surface": "Clay", "speed_rank": 80, "speed_bucket": "Slow"},
+        {"tourney_key": "rg", "surface": "Clay", "speed_rank": 80, "speed_bucket": "Slow"},
+        {"tourney_key": "halle", "surface": "grass", "speed_rank": 10, "speed_bucket": None},
+    ],
+    "aliases": [{"src_key": "rg", "dest_key": "roland garros"}],
+    "countries": [{"tourney_key": "halle", "country_code": "DEU"}],
+    "speeds": [
+        {"tournament_name": "Roland Garros", "tourney_key": "roland garros",
+         "surface": "clay", "speed_rank": 80, "speed_bucket": "Slow", "category": "GS"},
+        {"tournament_name": "Mutua Madrid Open", "tourney_key": "mutua madrid open",
+         "surface": "clay", "speed_rank": 40, "speed_bucket": None, "category": "1000"},
+    ],
+}
+
+
+def _registry(loader=lambda: TABLES, **kw):
+    return TR.TourneyRegistry(loader, static_countries={"roland garros": "FRA", "halle": "GER"}, **kw)
+
+
+def test_registry_meta_country_from_memory():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return TABLES
+
+    reg = _registry(loader)
+    assert reg.meta("Roland-Garros") == {"surface": "clay", "speed_rank": 80, "speed_bucket": "Slow"}
+    assert reg.speed_bucket("Halle") == "Fast"  # derivado de speed_rank
+    # Fallback por subcadena, con category como la consulta ILIKE
+    assert reg.meta("madrid") == {"surface": "clay", "speed_rank": 40,
+                                  "speed_bucket": "Medium", "category": "1000"}
+    assert reg.meta("Nowhere") == {}
+    assert reg.country("RG") == "FRA"        # alias -> clave canónica
+    assert reg.country("Halle") == "DEU"     # tourney_country_map manda sobre el mapa estático
+    assert len(calls) == 1
+    assert reg.stats()["norm_mismatches"] == 0
+
+
+def test_registry_keeps_last_snapshot_and_backs_off(monkeypatch):
+    state = {"fail": False, "calls": 0}
+
+    def loader():
+        state["calls"] += 1
+        if state["fail"]:
+            raise RuntimeError("PostgREST caído")
+        return TABLES
+
+    reg = _registry(loader, ttl=0)
+    assert reg.country("Roland Garros") == "FRA"
+    state["fail"] = True
+    assert reg.country("Roland Garros") == "FRA"
+    assert reg.country("Roland Garros") == "FRA"
+    assert state["calls"] == 2   # tras el fallo espera TOURNEY_REGISTRY_RETRY_SECS
+    assert reg.stats()["failures"] == 1
+
+
+def test_registry_reports_norm_mismatches():
+    tables = dict(TABLES, speeds=[{"tournament_name": "Roland Garros", "tourney_key": "roland-garros"}])
+    reg = _registry(lambda: tables)
+    assert reg.loaded
+    assert reg.mismatches == [("Roland Garros", "roland garros", "roland-garros")]
+
+
+def test_fs_lookups_use_registry(monkeypatch):
+    def no_rest(*a, **kw):
+        raise AssertionError("no debería consultar PostgREST")
+
+    monkeypatch.setattr(FS, "TOURNEYS", _registry())
+    monkeypatch.setattr(FS, "_get", no_rest)
+    assert FS.get_tourney_meta("Roland Garros")["speed_bucket"] == "Slow"
+    assert FS.get_tourney_country("rg") == "FRA"
+
+
+def test_fs_falls_back_to_rest_when_registry_unavailable(monkeypatch):
+    def broken():
+        raise RuntimeError("sin credenciales")
+
+    monkeypatch.setattr(FS, "TOURNEYS", _registry(broken))
+    monkeypatch.setattr(FS, "_get", lambda table, params=None, select="*": [
+        {"tourney_key": "roland garros", "surface": "clay", "speed_rank": 80, "speed_bucket": "Slow"}
+    ])
+    assert FS.get_tourney_meta("Roland Garros")["surface"] == "clay"
+    assert FS.get_tourney_country("Roland Garros") == "FRA"
+
+
+def test_load_tourney_tables_pages_past_max_rows(monkeypatch):
+    names = [f"t{i:03d}" for i in range(7)]
+    calls = []
+
+    def fake_get(table, params=None, select="*"):
+        calls.append((table, params["offset"]))
+        if table != "tourney_key_map":
+            return []
+        return [{"src_key": n, "dest_key": n} for n in names[params["offset"]:params["offset"] + params["limit"]]]
+
+    monkeypatch.setattr(FS, "SB_PAGE_SIZE", 3)
+    monkeypatch.setattr(FS, "_get", fake_get)
+    tables = FS._load_tourney_tables()
+    assert [a["src_key"] for a in tables["aliases"]] == names
+    assert [o for t, o in calls if t == "tourney_key_map"] == [0, 3, 6]
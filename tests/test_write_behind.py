@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from services import supabase_fs as FS
+from services import write_behind as WB
+
+
+def test_rows_are_batched_per_kind():
+    calls = []
+    wb = WB.WriteBehind({"a": lambda rows: calls.append(("a", rows)),
+                         "b": lambda rows: calls.append(("b", rows))},
+                        batch=100, flush_secs=0.05)
+    for i in range(5):
+        wb.submit("a", i)
+    wb.submit("b", "x")
+    assert wb.flush(timeout=2)
+
+    assert sorted(calls) == [("a", [0, 1, 2, 3, 4]), ("b", ["x"])]
+    st = wb.stats()
+    assert st["written"] == 6 and st["enqueued"] == 6 and st["batches"] == 2
+    wb.close(timeout=2)
+
+
+def test_full_queue_drops_and_counts():
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow(rows):
+        started.set()
+        release.wait(2)
+
+    wb = WB.WriteBehind({"a": slow}, max_queue=2, batch=1, flush_secs=0.01)
+    wb.submit("a", 0)
+    started.wait(2)          # el hilo está ocupado con la fila 0
+    assert wb.submit("a", 1) and wb.submit("a", 2)
+    assert wb.submit("a", 3) is False
+
+    st = wb.stats()
+    assert st["dropped"] == 1 and st["blocked"] == 1 and st["queue_depth"] == 2
+    release.set()
+    wb.close(timeout=2)
+    assert wb.stats()["written"] == 3
+
+
+def test_close_flushes_pending_rows_and_failures_are_counted():
+    written = []
+
+    def handler(rows):
+        if "boom" in rows:
+            raise RuntimeError("BD caída")
+        written.extend(rows)
+
+    wb = WB.WriteBehind({"a": handler}, batch=1, flush_secs=0.01)
+    wb.submit("a", "boom")
+    wb.submit("a", 1)
+    wb.submit("a", 2)
+    wb.close(timeout=2)
+
+    assert written == [1, 2]
+    assert wb.stats()["failed"] == 1
+    assert wb.submit("a", 3) is False   # cerrada
+
+
+def test_queue_matchup_cache_fills_l1_and_upserts_in_one_statement(monkeypatch):
+    executed = []
+
+    class Cur:
+        connection = type("C", (), {"encoding": "UTF8"})()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def mogrify(self, template, args):
+            return repr(args).encode()
+
+        def execute(self, sql, params=None):
+            executed.append(sql.decode())
+
+    class Conn:
+        def cursor(self):
+            return Cur()
+
+        def commit(self):
+            pass
+
+    monkeypatch.setattr(FS, "DISABLE_DB_CACHE", False)
+    monkeypatch.setattr(FS, "WRITE_BEHIND", True)
+    monkeypatch.setattr(FS, "_pg_conn_or_env", lambda conn: (Conn(), True))
+    monkeypatch.setattr(FS, "_pg_release", lambda pg: None)
+    wb = WB.WriteBehind({"matchup_cache": FS.put_matchup_cache_rows}, flush_secs=0.05)
+    monkeypatch.setattr(FS, "WRITES", wb)
+
+    base = dict(tournament_name="Roland Garros", mon=6, surface="Clay", speed_bucket="Slow",
+                years_back=4, using_sr=True, features={"deltas": {}}, flags={},
+                weights_hist=None, sources=None, ttl_seconds=60)
+    FS.queue_matchup_cache_json(player_id=1, opponent_id=2, prob_player=0.6, **base)
+    FS.queue_matchup_cache_json(player_id=1, opponent_id=2, prob_player=0.7, **base)
+    FS.queue_matchup_cache_json(player_id=3, opponent_id=4, prob_player=0.4, **base)
+
+    # L1 ya responde antes de que se escriba nada
+    hit = FS._matchup_l1_get(1, 2, "roland garros", 6, "Slow", 4, True)
+    assert hit["prob_player"] == 0.7
+
+    assert wb.flush(timeout=2)
+    assert len(executed) == 1
+    sql = executed[0]
+    assert "ON CONFLICT" in sql
+    # La clave repetida se colapsa a la última fila del lote
+    assert sql.count("'roland garros'") == 2 and "0.6" not in sql
+    wb.close(timeout=2)
@@ -0,0 +1,181 @@
+# utils/asof_builder.py
+"""
+Constructor as-of de una sola pasada para el backtest HIST.
+
+El SQL de backtest_hist_asof.py une cada participante con todo su historial
+previo (O(partidos × historial)). Aquí las filas de fs_matches_long se leen
+una vez en orden de fecha y cada jugador lleva contadores por mes /
+superficie / velocidad sobre una ventana deslizante de `years_back` años:
+al llegar a un partido se expulsa lo anterior a la ventana y se leen los
+contadores. Coste O(filas) amortizado.
+
+Misma semántica que el SQL:
+  - un partido canónico por (fecha, torneo, superficie, p_low, p_high), con
+    player = p_high y opponent = p_low; winner y speed_bucket = MAX;
+  - historial estricto [fecha - years_back, fecha): los partidos del mismo
+    día no se ven entre sí;
+  - superficie del historial = COALESCE(surface, tourney_surface) y
+    velocidad = COALESCE(speed_bucket, speed_bucket_from_surface(surface)),
+    comparadas en minúsculas; NULL no coincide con nada.
+"""
+from __future__ import annotations
+
+from collections import deque
+from datetime import date
+from typing import Iterable, Iterator, Optional
+
+# Columnas que espera build_asof (en este orden)
+STREAM_COLUMNS = ("player_id", "opponent_id", "winner_id", "match_date",
+                  "tournament_name", "surface", "tourney_surface", "speed_bucket")
+
+STREAM_SQL = f"""
+SELECT {", ".join(STREAM_COLUMNS)}
+FROM public.fs_matches_long
+WHERE player_id IS NOT NULL AND match_date IS NOT NULL
+ORDER BY match_date
+"""
+
+# Conteos por lado, con el mismo nombre que las columnas del SQL (+ _p / _o)
+HIST_COLUMNS = ("played_m", "wins_m", "played_surf", "wins_surf", "played_spd", "wins_spd")
+
+
+def speed_bucket_from_surface(surface: Optional[str]) -> Optional[str]:
+    """Igual que public.speed_bucket_from_surface()."""
+    s = (surface or "").lower()
+    if s in ("grass", "indoor hard", "indoor"):
+        return "Fast"
+    if s == "clay":
+        return "Slow"
+    if s == "hard":
+        return "Medium"
+    return None
+
+
+def years_before(d: date, years: int) -> date:
+    """d - make_interval(years => n) de Postgres (29/02 -> 28/02)."""
+    try:
+        return d.replace(year=d.year - years)
+    except ValueError:
+        return d.replace(year=d.year - years, day=28)
+
+
+def _lower(s: Optional[str]) -> Optional[str]:
+    return s.lower() if s else None
+
+
+class PlayerWindow:
+    """Ventana deslizante de un jugador: cola por fecha + contadores [played, wins]."""
+
+    __slots__ = ("rows", "month", "surf", "speed")
+
+    def __init__(self):
+        self.rows = deque()
+        self.month = {}
+        self.surf = {}
+        self.speed = {}
+
+    @staticmethod
+    def _bump(counter, key, won, sign):
+        if key is None:
+            return
+        c = counter.get(key)
+        if c is None:
+            c = counter[key] = [0, 0]
+        c[0] += sign
+        c[1] += sign * won
+
+    def add(self, d, surf, speed, won):
+        self.rows.append((d, surf, speed, won))
+        self._bump(self.month, d.month, won, 1)
+        self._bump(self.surf, surf, won, 1)
+        self._bump(self.speed, speed, won, 1)
+
+    def evict(self, lo):
+        rows = self.rows
+        while rows and rows[0][0] < lo:
+            d, surf, speed, won = rows.popleft()
+            self._bump(self.month, d.month, won, -1)
+            self._bump(self.surf, surf, won, -1)
+            self._bump(self.speed, speed, won, -1)
+
+    def counts(self, mon, surf, speed):
+        m = self.month.get(mon, (0, 0))
+        s = self.surf.get(surf, (0, 0)) if surf is not None else (0, 0)
+        v = self.speed.get(speed, (0, 0)) if speed is not None else (0, 0)
+        return (m[0], m[1], s[0], s[1], v[0], v[1])
+
+
+def _max(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+def build_asof(rows: Iterable[tuple], years_back: int,
+               since: Optional[date] = None) -> Iterator[dict]:
+    """
+    Recorre `rows` (tuplas en el orden de STREAM_COLUMNS, ordenadas por
+    match_date) y emite un dict por partido canónico con match_date,
+    tournament_name, surface, mon, player_id, opponent_id, winner_id y los
+    conteos HIST de ambos lados. Con `since`, solo emite partidos desde esa
+    fecha (el historial anterior se sigue acumulando).
+    """
+    hist: dict = {}
+    day: Optional[date] = None
+    day_rows: list = []
+    day_matches: dict = {}
+    rid = 0
+
+    def flush():
+        nonlocal rid
+        if day is None:
+            return
+        lo = years_before(day, years_back)
+        if since is None or day >= since:
+            for (tname, surface, p_low, p_high), (winner, speed) in day_matches.items():
+                surf_key = _lower(surface)
+                speed_key = _lower(speed or speed_bucket_from_surface(surface))
+                rid += 1
+                out = {
+                    "match_date": day, "tournament_name": tname, "surface": surface,
+                    "mon": day.month, "player_id": p_high, "opponent_id": p_low,
+                    "winner_id": winner, "rid": rid,
+                }
+                for side, pid in (("p", p_high), ("o", p_low)):
+                    h = hist.get(pid)
+                    if h is not None:
+                        h.evict(lo)
+                        vals = h.counts(day.month, surf_key, speed_key)
+                    else:
+                        vals = (0,) * len(HIST_COLUMNS)
+                    for col, v in zip(HIST_COLUMNS, vals):
+                        out[f"{col}_{side}"] = v
+                yield out
+        # el día entra en el historial después de emitir sus partidos
+        for pid, winner, surface, tsurface, speed in day_rows:
+            h = hist.get(pid)
+            if h is None:
+                h = hist[pid] = PlayerWindow()
+            else:
+                h.evict(lo)
+            h.add(day, _lower(surface or tsurface),
+                  _lower(speed or speed_bucket_from_surface(surface)),
+                  int(winner is not None and winner == pid))
+
+    for pid, oid, winner, d, tname, surface, tsurface, speed in rows:
+        if pid is None or d is None:
+            continue
+        if d != day:
+            if day is not None and d < day:
+                raise ValueError(f"filas fuera de orden: {d} después de {day}")
+            yield from flush()
+            day, day_rows, day_matches = d, [], {}
+        day_rows.append((pid, winner, surface, tsurface, speed))
+        if oid is None:
+            continue
+        key = (tname, surface, min(pid, oid), max(pid, oid))
+        prev = day_matches.get(key)
+        day_matches[key] = (winner, speed) if prev is None else (_max(prev[0], winner), _max(prev[1], speed))
+    yield from flush()
@@ -0,0 +1,242 @@
+# utils/backtest_core.py
+"""
+Núcleo vectorizado del backtest histórico as-of (backtest_hist_asof.py).
+
+Las columnas de conteos se pasan a arrays NumPy una sola vez y todo lo demás
+(suavizado, z, probabilidades y métricas) son operaciones sobre arrays. Una
+rejilla de pesos se evalúa de una pasada: para cada K las diferencias de
+winrate forman una matriz (3, n) y z = W @ D para todas las W a la vez.
+
+log_loss, AUC (Mann-Whitney con rangos medios en empates) y accuracy se
+calculan en forma cerrada por fila de la rejilla, sin scikit-learn.
+
+Para backtests sin límite de filas, GridAccumulator recibe los datos por
+bloques y acumula sumas y, para el AUC, histogramas de p por clase: la
+memoria no depende del número de partidos.
+"""
+from __future__ import annotations
+
+import itertools
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from utils.scoring import logistic_np
+
+# (wins, played) de jugador y rival para mes / superficie / velocidad
+DIMENSIONS = (
+    ("wins_m_p", "played_m_p", "wins_m_o", "played_m_o"),
+    ("wins_surf_p", "played_surf_p", "wins_surf_o", "played_surf_o"),
+    ("wins_spd_p", "played_spd_p", "wins_spd_o", "played_spd_o"),
+)
+
+# Clip de probabilidades en log_loss (el eps de float64, como scikit-learn)
+EPS = np.finfo(np.float64).eps
+
+# Filas de rejilla evaluadas por bloque (acota la memoria: bloque × n floats)
+CHUNK = 2048
+# Tope de bloque × n para muestras grandes (~32 MB de float64 por matriz)
+BLOCK_ELEMS = 1 << 22
+
+# Cubos del histograma de p para el AUC incremental (error <= 1/AUC_BINS aprox.)
+AUC_BINS = 2000
+
+
+class BacktestData:
+    """Conteos y etiqueta de un DataFrame del backtest, ya como arrays."""
+
+    def __init__(self, df):
+        def col(name):
+            return np.nan_to_num(df[name].to_numpy(dtype=float, na_value=0.0), nan=0.0)
+
+        # (3 dimensiones, 4 columnas, n filas)
+        self.counts = np.stack([np.stack([col(c) for c in dim]) for dim in DIMENSIONS])
+        self.y = (df["winner_id"].to_numpy() == df["player_id"].to_numpy()).astype(np.float64)
+        self.n = len(self.y)
+
+    @classmethod
+    def from_arrays(cls, counts: np.ndarray, y: np.ndarray) -> "BacktestData":
+        """Sin copiar: p. ej. vistas sobre memoria compartida (utils/grid_search.py)."""
+        self = cls.__new__(cls)
+        self.counts, self.y, self.n = counts, y, len(y)
+        return self
+
+    def deltas(self, k_month: float, k_surf: float, k_speed: float) -> np.ndarray:
+        """Diferencias de winrate suavizada (wins + k/2)/(played + k), forma (3, n)."""
+        k = np.array([k_month, k_surf, k_speed], dtype=float)[:, None]
+        c = self.counts
+        wr_p = (c[:, 0] + 0.5 * k) / (c[:, 1] + k)
+        wr_o = (c[:, 2] + 0.5 * k) / (c[:, 3] + k)
+        return wr_p - wr_o
+
+
+def probabilities(deltas: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """p_hat para cada fila de `weights` (G, 3) -> (G, n)."""
+    w = np.atleast_2d(np.asarray(weights, dtype=float))
+    denom = np.maximum(1.0, np.abs(w).sum(axis=1, keepdims=True))
+    return logistic_np((w @ deltas) / denom)
+
+
+def _auc(p: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """AUC por fila de p (G, n) con rangos medios para los empates."""
+    n_pos = y.sum()
+    n_neg = len(y) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return np.full(p.shape[0], np.nan)
+    # redondeo: empates exactos en teoría pueden diferir en el último bit según el orden de las sumas
+    p = np.round(p, 12)
+    order = np.argsort(p, axis=1, kind="mergesort")
+    s = np.take_along_axis(p, order, axis=1)
+    ys = y[order]
+    n = p.shape[1]
+    idx = np.broadcast_to(np.arange(n), s.shape)
+    new = np.ones_like(s, dtype=bool)
+    new[:, 1:] = s[:, 1:] != s[:, :-1]
+    last = np.ones_like(s, dtype=bool)
+    last[:, :-1] = new[:, 1:]
+    start = np.maximum.accumulate(np.where(new, idx, 0), axis=1)
+    end = np.minimum.accumulate(np.where(last, idx, n - 1)[:, ::-1], axis=1)[:, ::-1]
+    ranks = 0.5 * (start + end) + 1.0
+    return ((ranks * ys).sum(axis=1) - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg)
+
+
+def metrics(p: np.ndarray, y: np.ndarray) -> dict:
+    """log_loss, auc, accuracy@0.5 y avg_p por fila de p (G, n)."""
+    p = np.atleast_2d(p)
+    if p.shape[1] == 0:
+        nan = np.full(p.shape[0], np.nan)
+        return {"log_loss": nan, "auc": nan, "accuracy@0.5": nan, "avg_p": nan}
+    pc = np.clip(p, EPS, 1.0 - EPS)
+    ll = -(y * np.log(pc) + (1.0 - y) * np.log1p(-pc)).mean(axis=1)
+    return {
+        "log_loss": ll,
+        "auc": _auc(p, y),
+        "accuracy@0.5": (p >= 0.5).mean(axis=1),
+        "avg_p": p.mean(axis=1),
+    }
+
+
+def block_size(n: int) -> int:
+    """Filas de rejilla por bloque para n partidos (CHUNK, o menos si n es grande)."""
+    return max(1, min(CHUNK, BLOCK_ELEMS // max(n, 1)))
+
+
+def _result_rows(w: np.ndarray, k: Sequence[float], n: int, m: dict) -> list[dict]:
+    km, ks_, kv = k
+    return [{
+        "W_MONTH": float(wm), "W_SURF": float(ws), "W_SPEED": float(wv),
+        "K_MONTH": km, "K_SURF": ks_, "K_SPEED": kv,
+        "rows": int(n), "log_loss": float(m["log_loss"][j]),
+        "auc": float(m["auc"][j]), "accuracy@0.5": float(m["accuracy@0.5"][j]),
+        "avg_p": float(m["avg_p"][j]),
+    } for j, (wm, ws, wv) in enumerate(w)]
+
+
+def evaluate_grid(data: BacktestData, weights: Iterable[Sequence[float]],
+                  ks: Iterable[Sequence[float]]) -> list[dict]:
+    """
+    Evalúa todas las combinaciones (W_MONTH, W_SURF, W_SPEED) × (K_MONTH,
+    K_SURF, K_SPEED). Devuelve una fila por combinación, con las mismas
+    claves que backtest_hist_asof.evaluate.
+    """
+    w = np.atleast_2d(np.asarray(list(weights), dtype=float))
+    step = block_size(data.n)
+    rows = []
+    for k in ks:
+        d = data.deltas(*k)
+        for i in range(0, len(w), step):
+            wc = w[i:i + step]
+            rows += _result_rows(wc, k, data.n, metrics(probabilities(d, wc), data.y))
+    return rows
+
+
+class StreamingMetrics:
+    """
+    log_loss, accuracy@0.5, avg_p y AUC de G configuraciones acumulados por
+    bloques de filas. El AUC sale de histogramas de p por clase (empates
+    dentro de un cubo cuentan 1/2), así que es aproximado a 1/bins.
+    """
+
+    def __init__(self, n_configs: int, bins: int = AUC_BINS):
+        self.bins = bins
+        self.n = 0
+        self.n_pos = 0
+        self.ll = np.zeros(n_configs)
+        self.correct = np.zeros(n_configs)
+        self.p_sum = np.zeros(n_configs)
+        self.pos = np.zeros((n_configs, bins), dtype=np.int64)
+        self.neg = np.zeros((n_configs, bins), dtype=np.int64)
+
+    def update(self, p: np.ndarray, y: np.ndarray, start: int = 0) -> None:
+        """Suma un bloque p (g, n) para las configuraciones start..start+g."""
+        p = np.atleast_2d(p)
+        g = slice(start, start + p.shape[0])
+        pc = np.clip(p, EPS, 1.0 - EPS)
+        self.ll[g] -= (y * np.log(pc) + (1.0 - y) * np.log1p(-pc)).sum(axis=1)
+        self.correct[g] += (p >= 0.5).sum(axis=1)
+        self.p_sum[g] += p.sum(axis=1)
+        idx = np.minimum((p * self.bins).astype(np.int64), self.bins - 1)
+        offs = np.arange(p.shape[0])[:, None] * self.bins
+        size = p.shape[0] * self.bins
+        pos = y == 1
+        self.pos[g] += np.bincount((idx[:, pos] + offs).ravel(), minlength=size).reshape(-1, self.bins)
+        self.neg[g] += np.bincount((idx[:, ~pos] + offs).ravel(), minlength=size).reshape(-1, self.bins)
+        if start == 0:
+            self.n += p.shape[1]
+            self.n_pos += int(pos.sum())
+
+    def result(self) -> dict:
+        n, n_pos = self.n, self.n_pos
+        n_neg = n - n_pos
+        if n == 0:
+            nan = np.full(len(self.ll), np.nan)
+            return {"log_loss": nan, "auc": nan, "accuracy@0.5": nan, "avg_p": nan}
+        if n_pos == 0 or n_neg == 0:
+            auc = np.full(len(self.ll), np.nan)
+        else:
+            below = np.cumsum(self.neg, axis=1) - self.neg
+            auc = (self.pos * (below + 0.5 * self.neg)).sum(axis=1) / (n_pos * n_neg)
+        return {"log_loss": self.ll / n, "auc": auc,
+                "accuracy@0.5": self.correct / n, "avg_p": self.p_sum / n}
+
+
+class GridAccumulator:
+    """evaluate_grid por bloques de datos: update(BacktestData) por bloque y rows() al final."""
+
+    def __init__(self, weights: Iterable[Sequence[float]], ks: Iterable[Sequence[float]],
+                 bins: int = AUC_BINS):
+        self.w = np.atleast_2d(np.asarray(list(weights), dtype=float))
+        self.ks = [tuple(k) for k in ks]
+        self.acc = [StreamingMetrics(len(self.w), bins) for _ in self.ks]
+
+    def update(self, data: BacktestData) -> None:
+        step = block_size(data.n)
+        for k, acc in zip(self.ks, self.acc):
+            d = data.deltas(*k)
+            for i in range(0, len(self.w), step):
+                acc.update(probabilities(d, self.w[i:i + step]), data.y, start=i)
+
+    def rows(self) -> list[dict]:
+        out = []
+        for k, acc in zip(self.ks, self.acc):
+            out += _result_rows(self.w, k, acc.n, acc.result())
+        return out
+
+
+def parse_grid(spec: str | None, default: Sequence[float]) -> list[float]:
+    """
+    "0.5,1,1.5" -> lista; "0:2:0.1" -> de 0 a 2 (incluido) en pasos de 0.1.
+    Vacío -> default.
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return list(default)
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        n = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 10) for i in range(max(n, 0))]
+    return [float(x) for x in spec.split(",") if x.strip()]
+
+
+def product3(values: Sequence[float]) -> list[tuple[float, float, float]]:
+    return list(itertools.product(values, values, values))
@@ -0,0 +1,174 @@
+# utils/grid_search.py
+"""
+Búsqueda de pesos y K del backtest HIST repartida entre procesos.
+
+Los conteos (3, 4, n) y la etiqueta se copian una sola vez a memoria
+compartida (multiprocessing.shared_memory). Cada proceso del pool se
+engancha por nombre y monta BacktestData sobre esas vistas, sin copiar ni
+serializar el DataFrame. Por la cola solo viajan tareas pequeñas (una K y un
+bloque de pesos) y vuelven filas de resultados.
+
+Estrategias (search):
+  grid    producto completo W × K
+  random  `samples` ternas de pesos uniformes en el rango de la rejilla, × K
+  refine  rejilla gruesa y `rounds` rondas alrededor de las `top` mejores
+          configuraciones, con la mitad de paso cada vez
+"""
+from __future__ import annotations
+
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Callable, Iterable, Optional, Sequence
+
+import numpy as np
+
+from utils import backtest_core as BC
+
+STRATEGIES = ("grid", "random", "refine")
+
+# Tareas por proceso: reparte mejor la carga que un bloque por proceso
+TASKS_PER_WORKER = 4
+
+# Estado del proceso hijo (se rellena en _init_worker)
+_WORKER: dict = {}
+
+
+def _rank_key(row: dict):
+    # mismo orden que el CSV: log_loss asc, auc desc (NaN al final)
+    auc = row["auc"]
+    return (row["log_loss"], -(auc if auc == auc else -math.inf))
+
+
+def _init_worker(spec: dict) -> None:
+    arrays = {}
+    for name, (shm_name, shape) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _WORKER.setdefault("shm", []).append(shm)   # mantener vivo el mapeo
+        arrays[name] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _WORKER["data"] = BC.BacktestData.from_arrays(arrays["counts"], arrays["y"])
+
+
+def _run_task(task) -> list[dict]:
+    k, w = task
+    return BC.evaluate_grid(_WORKER["data"], w, [k])
+
+
+class ParallelGrid:
+    """
+    Pool de procesos con los datos en memoria compartida. Uso:
+
+        with ParallelGrid(data, workers=8) as pg:
+            rows = pg.run(weights, ks, on_rows=...)
+
+    Con workers <= 1 evalúa en el propio proceso (sin pool ni memoria compartida).
+    """
+
+    def __init__(self, data: BC.BacktestData, workers: int):
+        self.data = data
+        self.workers = max(1, int(workers))
+        self._shm: list = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "ParallelGrid":
+        if self.workers > 1:
+            spec = {}
+            for name, arr in (("counts", self.data.counts), ("y", self.data.y)):
+                arr = np.ascontiguousarray(arr, dtype=np.float64)
+                shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                np.ndarray(arr.shape, dtype=np.float64, buffer=shm.buf)[...] = arr
+                self._shm.append(shm)
+                spec[name] = (shm.name, arr.shape)
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(spec,))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def _tasks(self, weights: np.ndarray, ks: Sequence[tuple]):
+        per_k = max(1, math.ceil(self.workers * TASKS_PER_WORKER / len(ks)))
+        step = max(1, min(BC.block_size(self.data.n), math.ceil(len(weights) / per_k)))
+        for k in ks:
+            for i in range(0, len(weights), step):
+                yield k, weights[i:i + step]
+
+    def run(self, weights: Iterable[Sequence[float]], ks: Iterable[Sequence[float]],
+            on_rows: Optional[Callable[[list], None]] = None) -> list[dict]:
+        """Evalúa W × K; `on_rows` recibe cada bloque de filas según termina."""
+        w = np.atleast_2d(np.asarray(list(weights), dtype=float))
+        ks = [tuple(k) for k in ks]
+        if w.size == 0 or not ks:
+            return []
+        out: list = []
+        if self._pool is None:
+            results = (BC.evaluate_grid(self.data, wc, [k]) for k, wc in self._tasks(w, ks))
+        else:
+            futs = [self._pool.submit(_run_task, t) for t in self._tasks(w, ks)]
+            results = (f.result() for f in as_completed(futs))
+        for rows in results:
+            out += rows
+            if on_rows is not None:
+                on_rows(rows)
+        return out
+
+
+def random_weights(values: Sequence[float], n: int, seed: Optional[int] = None) -> np.ndarray:
+    """n ternas uniformes en [min(values), max(values)]^3."""
+    lo, hi = (min(values), max(values)) if values else (0.0, 1.0)
+    return np.random.default_rng(seed).uniform(lo, hi, size=(max(int(n), 0), 3))
+
+
+def _step(values: Sequence[float]) -> float:
+    v = sorted(set(float(x) for x in values))
+    diffs = [b - a for a, b in zip(v, v[1:]) if b > a]
+    return min(diffs) if diffs else 0.5
+
+
+def refine_around(rows: Sequence[dict], step: float, seen: set) -> dict:
+    """Vecinos w ± step (3^3 por configuración) no evaluados aún, agrupados por K."""
+    out: dict = {}
+    for r in rows:
+        k = (r["K_MONTH"], r["K_SURF"], r["K_SPEED"])
+        base = (r["W_MONTH"], r["W_SURF"], r["W_SPEED"])
+        for delta in itertools.product((-step, 0.0, step), repeat=3):
+            w = tuple(round(b + d, 10) for b, d in zip(base, delta))
+            if (k, w) not in seen:
+                seen.add((k, w))
+                out.setdefault(k, []).append(w)
+    return out
+
+
+def search(data: BC.BacktestData, weight_values: Sequence[float], ks: Sequence[Sequence[float]],
+           strategy: str = "grid", workers: int = 1, samples: int = 1000, rounds: int = 3,
+           top: int = 10, seed: Optional[int] = None,
+           on_rows: Optional[Callable[[list], None]] = None) -> list[dict]:
+    """
+    Ejecuta la estrategia y devuelve todas las filas evaluadas, ordenadas
+    (log_loss asc, auc desc). `weight_values` son los valores por dimensión
+    (como GRID_WEIGHTS); `ks` las ternas de K.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"estrategia desconocida: {strategy!r} (usa {', '.join(STRATEGIES)})")
+    ks = [tuple(k) for k in ks]
+    with ParallelGrid(data, workers) as pg:
+        if strategy == "random":
+            rows = pg.run(random_weights(weight_values, samples, seed), ks, on_rows)
+        else:
+            coarse = BC.product3(weight_values)
+            rows = pg.run(coarse, ks, on_rows)
+            if strategy == "refine":
+                seen = {(k, tuple(round(x, 10) for x in w)) for k in ks for w in coarse}
+                step = _step(weight_values)
+                for _ in range(max(int(rounds), 0)):
+                    step /= 2.0
+                    best = sorted(rows, key=_rank_key)[:max(int(top), 1)]
+                    for k, ws in refine_around(best, step, seen).items():
+                        rows += pg.run(ws, [k], on_rows)
+    return sorted(rows, key=_rank_key)
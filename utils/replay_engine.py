@@ -0,0 +1,248 @@
+# utils/replay_engine.py
+"""
+Replay offline del modelo completo de /matchup (NOW + HIST + ajustes).
+
+En producción la mitad NOW sale de Sportradar (perfil, last10, YTD, H2H) y
+solo se puede evaluar en vivo. Aquí se reconstruye as-of para cada partido
+histórico de matches_full, recorriéndolos una vez en orden
+(tourney_date, torneo, ronda, match_num) con estado por jugador:
+
+  ranking_now     rank del propio partido (rankings_snapshot_v2 / matches_full);
+                  si no hay, el último conocido; si tampoco, 999 como /matchup
+  winrate_last10  últimos 10 partidos previos (0 si no hay, como SR)
+  winrate_ytd     partidos previos del mismo año natural
+  days_inactive   días desde el torneo del partido anterior
+  last_surface    superficie del partido anterior (flag surf_change)
+  h2h             victorias previas de cada uno en el cara a cara
+
+La mitad HIST se cuenta igual que get_matchup_hist_vector (ventana
+[fecha - years_back, fecha), mes / superficie / velocidad del torneo,
+suavizado (wins + k/2)/(played + k)) sobre los propios partidos de
+matches_full, con PlayerWindow de utils/asof_builder.py.
+
+El scoring es el de /matchup/matrix: utils.scoring.matchup_deltas_np,
+adjust_np, matchup_z_np y logistic_np, para todos los partidos a la vez.
+Sin HTTP. mot_points no existe en el histórico y vale 0 en ambos lados.
+"""
+from __future__ import annotations
+
+from collections import deque
+from datetime import date, datetime
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from utils import asof_builder as AB
+from utils import backtest_core as BC
+from utils.scoring import (
+    HIST_W_MONTH, HIST_W_SPEED, HIST_W_SURF, adjust_np, logistic_np,
+    matchup_deltas_np, matchup_z_np,
+)
+
+# Columnas que espera replay_features (en este orden)
+REPLAY_COLUMNS = ("tourney_id", "tourney_name", "surface", "tourney_date", "match_num", "round",
+                  "winner_id", "loser_id", "winner_rank", "loser_rank", "winner_ioc", "loser_ioc")
+
+# Orden de las rondas dentro de un torneo (matches_full solo trae la fecha de inicio)
+ROUND_ORDER = {
+    "Q1": 0, "Q2": 1, "Q3": 2, "Q4": 3,
+    "R128": 10, "R64": 11, "R32": 12, "R16": 13, "RR": 14,
+    "QF": 15, "SF": 16, "BR": 17, "F": 18,
+}
+
+# Rank de un jugador sin ranking (igual que _score_matchup)
+NO_RANK = 999.0
+
+
+def _as_date(v) -> Optional[date]:
+    if v is None or isinstance(v, date):
+        return v
+    s = str(v).strip().replace("-", "")
+    try:
+        return datetime.strptime(s[:8], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _int_or_none(v) -> Optional[int]:
+    try:
+        return int(v) if v is not None and str(v).strip() != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def match_order_key(row: tuple):
+    tid, _, _, tdate, mnum, rnd = row[:6]
+    return (tdate, str(tid or ""), ROUND_ORDER.get(str(rnd or "").upper(), 9), _int_or_none(mnum) or 0)
+
+
+class _PlayerNow:
+    __slots__ = ("last10", "year", "ytd_w", "ytd_l", "last_date", "last_surface", "rank")
+
+    def __init__(self):
+        self.last10 = deque(maxlen=10)
+        self.year = None
+        self.ytd_w = self.ytd_l = 0
+        self.last_date = None
+        self.last_surface = None
+        self.rank = None
+
+    def features(self, d: date, rank):
+        """(ranking_now, winrate_ytd, winrate_last10, days_inactive, last_surface) antes del partido."""
+        rank = rank if rank is not None else self.rank
+        wr_last10 = sum(self.last10) / max(1, len(self.last10))
+        wr_ytd = self.ytd_w / max(1, self.ytd_w + self.ytd_l) if self.year == d.year else 0.0
+        inactive = max(0.0, float((d - self.last_date).days)) if self.last_date else 0.0
+        return rank, wr_ytd, wr_last10, inactive, self.last_surface
+
+    def record(self, d: date, surface, won: bool, rank):
+        self.last10.append(1 if won else 0)
+        if self.year != d.year:
+            self.year, self.ytd_w, self.ytd_l = d.year, 0, 0
+        if won:
+            self.ytd_w += 1
+        else:
+            self.ytd_l += 1
+        self.last_date = d
+        self.last_surface = surface
+        if rank is not None:
+            self.rank = rank
+
+
+def _smooth(wins, played, k):
+    # (wins + 0.5k)/(played + k); 0/0 -> 0.5 como la RPC
+    return (wins + 0.5 * k) / (played + k) if played + k else 0.5
+
+
+def replay_features(rows: Iterable[tuple], years_back: int = 4,
+                    k: tuple[float, float, float] = (8, 8, 8),
+                    meta_of: Optional[Callable[[str], Optional[dict]]] = None,
+                    country_of: Optional[Callable[[str], Optional[str]]] = None,
+                    since: Optional[date] = None) -> dict[str, np.ndarray]:
+    """
+    Recorre los partidos (tuplas en el orden de REPLAY_COLUMNS, en cualquier
+    orden) y devuelve arrays por partido: ids, etiqueta `y` y las entradas
+    del modelo de ambos lados. player = el id mayor (como el backtest HIST).
+
+    `meta_of(tourney_name)` -> {"surface", "speed_bucket"} (p. ej.
+    FS.TOURNEYS.meta); sin él, superficie del partido y velocidad por
+    superficie. `country_of(tourney_name)` -> código IOC para el flag local.
+    """
+    k_month, k_surf, k_speed = k
+    now_of: dict = {}
+    hist_of: dict = {}
+    h2h: dict = {}
+    meta_memo: dict = {}
+    pending: list = []       # HIST del día en curso: entra al cambiar de fecha
+    day = None
+    cols: dict = {c: [] for c in (
+        "player_id", "opponent_id", "y", "tourney_date", "month",
+        "rank_p", "rank_o", "ytd_p", "ytd_o", "last10_p", "last10_o",
+        "inactive_p", "inactive_o", "h2h_p", "h2h_o",
+        "wr_month_p", "wr_month_o", "wr_surf_p", "wr_surf_o", "wr_speed_p", "wr_speed_o",
+        "surf_change_p", "surf_change_o", "local_p", "local_o",
+    )}
+
+    def meta(tname, surface):
+        key = (tname, surface)
+        if key not in meta_memo:
+            m = (meta_of(tname) if meta_of and tname else None) or {}
+            surf = (m.get("surface") or surface or "hard").lower()
+            sb = m.get("speed_bucket") or AB.speed_bucket_from_surface(surf)
+            country = country_of(tname) if country_of and tname else None
+            meta_memo[key] = (surf, sb.lower() if sb else None, country)
+        return meta_memo[key]
+
+    def flush_hist():
+        for pid, d, surf, sb, won in pending:
+            w = hist_of.get(pid)
+            if w is None:
+                w = hist_of[pid] = AB.PlayerWindow()
+            w.add(d, surf, sb, won)
+        pending.clear()
+
+    parsed = []
+    for r in rows:
+        r = tuple(r)
+        d = _as_date(r[3])
+        wid, lid = _int_or_none(r[6]), _int_or_none(r[7])
+        if d is None or wid is None or lid is None or wid == lid:
+            continue
+        parsed.append((r[0], r[1], r[2], d, r[4], r[5], wid, lid,
+                       _int_or_none(r[8]), _int_or_none(r[9]), r[10], r[11]))
+    parsed.sort(key=match_order_key)
+
+    for tid, tname, surface, d, mnum, rnd, wid, lid, wrank, lrank, wioc, lioc in parsed:
+        if d != day:
+            flush_hist()
+            day = d
+        surf, sb, country = meta(tname, surface)
+        match_surf = (surface or "").lower() or None
+        pid, oid = max(wid, lid), min(wid, lid)
+        side = {wid: (wrank, wioc), lid: (lrank, lioc)}
+        lo = AB.years_before(d, years_back)
+
+        if since is None or d >= since:
+            cols["player_id"].append(pid)
+            cols["opponent_id"].append(oid)
+            cols["y"].append(1.0 if wid == pid else 0.0)
+            cols["tourney_date"].append(d)
+            cols["month"].append(d.month)
+            for suffix, who, other in (("p", pid, oid), ("o", oid, pid)):
+                st = now_of.get(who) or _PlayerNow()
+                rank, wr_ytd, wr_l10, inactive, last_surf = st.features(d, side[who][0])
+                cols[f"rank_{suffix}"].append(float(rank) if rank is not None else NO_RANK)
+                cols[f"ytd_{suffix}"].append(wr_ytd)
+                cols[f"last10_{suffix}"].append(wr_l10)
+                cols[f"inactive_{suffix}"].append(inactive)
+                cols[f"h2h_{suffix}"].append(h2h.get((who, other), 0))
+                cols[f"surf_change_{suffix}"].append(1.0 if last_surf and last_surf != surf else 0.0)
+                ioc = side[who][1]
+                cols[f"local_{suffix}"].append(1.0 if country and ioc and country == ioc else 0.0)
+
+                w = hist_of.get(who)
+                if w is not None:
+                    w.evict(lo)
+                    pm, wm, ps, ws, pv, wv = w.counts(d.month, surf, sb)
+                else:
+                    pm = wm = ps = ws = pv = wv = 0
+                cols[f"wr_month_{suffix}"].append(_smooth(wm, pm, k_month))
+                cols[f"wr_surf_{suffix}"].append(_smooth(ws, ps, k_surf))
+                cols[f"wr_speed_{suffix}"].append(_smooth(wv, pv, k_speed))
+
+        # el partido pasa al estado de ambos jugadores
+        for who, won in ((wid, True), (lid, False)):
+            st = now_of.get(who)
+            if st is None:
+                st = now_of[who] = _PlayerNow()
+            st.record(d, match_surf, won, side[who][0])
+            pending.append((who, d, match_surf or surf, sb, int(won)))
+        h2h[(wid, lid)] = h2h.get((wid, lid), 0) + 1
+
+    out = {}
+    for c, v in cols.items():
+        if c == "tourney_date":
+            out[c] = np.array(v, dtype=object)
+        else:
+            out[c] = np.asarray(v, dtype=np.int64 if c in ("player_id", "opponent_id", "month") else float)
+    out["n"] = len(cols["y"])
+    return out
+
+
+def score(feats: dict, hist_weights: tuple[float, float, float] = (HIST_W_MONTH, HIST_W_SURF, HIST_W_SPEED),
+          mot_diff=0.0) -> tuple[np.ndarray, dict]:
+    """p del jugador para todos los partidos, con el código de scoring de /matchup."""
+    f = feats
+    d = matchup_deltas_np(
+        f["rank_p"] - f["rank_o"], f["ytd_p"] - f["ytd_o"], f["last10_p"] - f["last10_o"],
+        f["h2h_p"], f["h2h_o"], f["inactive_p"] - f["inactive_o"],
+        f["wr_month_p"] - f["wr_month_o"], f["wr_surf_p"] - f["wr_surf_o"], f["wr_speed_p"] - f["wr_speed_o"],
+    )
+    adj = adjust_np(f["surf_change_p"] - f["surf_change_o"], f["local_p"] - f["local_o"], mot_diff)
+    return logistic_np(matchup_z_np(d, hist_weights, adj)), d
+
+
+def evaluate(feats: dict, p: np.ndarray) -> dict:
+    """log_loss, auc, accuracy@0.5 y avg_p (mismas métricas que el backtest HIST)."""
+    m = BC.metrics(p, feats["y"])
+    return {"rows": int(feats["n"]), **{k: float(v[0]) for k, v in m.items()}}
@@ -1,4 +1,10 @@
 import math
+import os
+
+import numpy as np
+
+# Versión del modelo (entra en las claves de caché de probabilidades)
+MODEL_VERSION = "v1"
 
 WEIGHTS = {
     "rank_norm": 1.6,
@@ -11,6 +17,11 @@ WEIGHTS = {
     "inactive": 0.5,
 }
 
+# Pesos HIST calibrados de /matchup (se pueden sobreescribir por ENV)
+HIST_W_MONTH = float(os.getenv("HIST_W_MONTH", "0.5"))
+HIST_W_SURF  = float(os.getenv("HIST_W_SURF",  "2.0"))
+HIST_W_SPEED = float(os.getenv("HIST_W_SPEED", "2.0"))
+
 ADJUSTS = {
     "surf_change": -0.05,
     "local": 0.03,
@@ -25,3 +36,53 @@ def logistic(x: float) -> float:
 
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
+
+def logistic_np(z: np.ndarray) -> np.ndarray:
+    # Igual que `logistic` pero elemento a elemento y sin overflow
+    return 0.5 * (1.0 + np.tanh(0.5 * np.asarray(z, dtype=float)))
+
+# ── Forma vectorizada de _score_matchup (main.py) ───────────────────
+# La usan /matchup/matrix (parejas i, j) y el replay offline
+# (utils/replay_engine.py, un partido por posición): mismos clamps,
+# WEIGHTS, pesos HIST y ADJUSTS que la versión escalar.
+
+def matchup_deltas_np(rank_diff, ytd_diff, last10_diff, h2h_w, h2h_l, inactive_diff,
+                      hist_month_diff, hist_surf_diff, hist_speed_diff) -> dict[str, np.ndarray]:
+    """Deltas del modelo a partir de diferencias jugador - rival (h2h: victorias de cada uno)."""
+    w = np.asarray(h2h_w, dtype=float)
+    l = np.asarray(h2h_l, dtype=float)
+    return {
+        "rank_norm":    np.clip(-np.asarray(rank_diff, dtype=float) / 100.0, -1, 1),
+        "ytd":          np.clip(ytd_diff,    -0.25, 0.25),
+        "last10":       np.clip(last10_diff, -0.25, 0.25),
+        "h2h":          np.clip(((w + 5) - (l + 5)) / np.maximum(1, w + l + 10), -0.25, 0.25),
+        "inactive":     np.clip(-np.asarray(inactive_diff, dtype=float) / 30.0, -0.25, 0.25),
+        "hist_month":   np.clip(hist_month_diff, -0.25, 0.25),
+        "hist_surface": np.clip(hist_surf_diff,  -0.25, 0.25),
+        "hist_speed":   np.clip(hist_speed_diff, -0.25, 0.25),
+    }
+
+def adjust_np(surf_change_diff, local_diff, mot_diff) -> np.ndarray:
+    return (
+        ADJUSTS["surf_change"] * np.asarray(surf_change_diff, dtype=float) +
+        ADJUSTS["local"]       * np.asarray(local_diff, dtype=float) +
+        ADJUSTS["mot_points"]  * np.asarray(mot_diff, dtype=float)
+    )
+
+def matchup_z_np(d: dict[str, np.ndarray], hist_weights: tuple[float, float, float],
+                 adj=0.0) -> np.ndarray:
+    """z = NOW (WEIGHTS) + HIST (pesos mes/superficie/velocidad normalizados) + ajustes."""
+    w_month, w_surf, w_speed = hist_weights
+    now_linear = (
+        WEIGHTS["rank_norm"]   * d["rank_norm"]   +
+        WEIGHTS["ytd"]         * d["ytd"]         +
+        WEIGHTS["last10"]      * d["last10"]      +
+        WEIGHTS["h2h"]         * d["h2h"]         +
+        WEIGHTS["inactive"]    * d["inactive"]
+    )
+    hist_linear = (
+        w_month * d["hist_month"] +
+        w_surf  * d["hist_surface"] +
+        w_speed * d["hist_speed"]
+    ) / max(1.0, abs(w_month) + abs(w_surf) + abs(w_speed))
+    return now_linear + hist_linear + adj
@@ -0,0 +1,69 @@
+# utils/token_bucket.py
+from __future__ import annotations
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Limitador token-bucket thread-safe con ajuste adaptativo (AIMD):
+    - `acquire()` bloquea hasta que hay un token (ritmo `rate`/s, ráfaga `burst`).
+    - `throttle(retry_after)` ante un 429: divide el ritmo entre 2 (sin bajar
+      de `min_rate`) y pausa a todos los hilos `retry_after` segundos.
+    - `success()` recupera el ritmo poco a poco hasta el objetivo.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, min_rate: float | None = None,
+                 recover_step: float | None = None):
+        self.target = float(rate)
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.min_rate = float(min_rate) if min_rate is not None else self.target / 16
+        self.recover_step = float(recover_step) if recover_step is not None else self.target / 20
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waited = 0.0
+        self.throttled = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> float:
+        """Toma un token; devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    self.waited += waited
+                    return waited
+                delay = max(self._paused_until - now, (1.0 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def throttle(self, retry_after: float | None = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._paused_until = max(self._paused_until, now + pause)
+            self.throttled += 1
+
+    def success(self) -> None:
+        with self._lock:
+            if self.rate < self.target:
+                self._refill(time.monotonic())
+                self.rate = min(self.target, self.rate + self.recover_step)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rate": round(self.rate, 3), "target": self.target,
+                    "throttled": self.throttled, "waited_secs": round(self.waited, 2)}